@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Totais por FECHAMENTO / fornecedor / projeto mantidos em memória (/api/relatorio-fechamento)
+
+Em vez de um GROUP BY sobre PEDIDOS a cada relatório, os totais ficam num dicionário por grupo:
+- carga inicial e reconciliação periódica: um GROUP BY limitado a ID <= MAX(ID) do momento
+- cada pedido gravado (individual, lote ou write-behind) entra como incremento
+
+FECHAMENTO é preenchido pela TRIGGER do SQL, então o incremento não sabe o período na hora do
+INSERT: os pedidos novos ficam pendentes e a thread busca o FECHAMENTO deles em lote
+(SELECT ... WHERE ID IN) antes de somar. Incrementos com ID acima do corte da reconciliação são
+reaplicados sobre o resultado novo, então nada é contado duas vezes nem perdido. Alterações
+feitas direto no banco aparecem na próxima reconciliação.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime
+
+FECHAMENTO_RECONCILIAR = float(os.getenv('FECHAMENTO_RECONCILIAR', 900))   # segundos entre GROUP BY completos
+FECHAMENTO_INTERVALO_PENDENTES = float(os.getenv('FECHAMENTO_INTERVALO_PENDENTES', 5))
+FECHAMENTO_LOTE_PENDENTES = 200
+
+QUERY_CORTE = "SELECT MAX(ID) AS ID FROM PEDIDOS"
+QUERY_AGREGADOS = """
+SELECT FECHAMENTO, FORNECEDOR, PROJETO, TIPO_REFEICAO,
+       COUNT(*) AS PEDIDOS,
+       SUM(CAST(TOTAL_COLABORADORES AS BIGINT)) AS REFEICOES,
+       SUM(CAST(TOTAL_PAGAR AS DECIMAL(18, 2))) AS TOTAL_PAGAR
+FROM PEDIDOS
+WHERE ID <= %s
+GROUP BY FECHAMENTO, FORNECEDOR, PROJETO, TIPO_REFEICAO
+"""
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor).strip()
+
+
+def _numero(valor):
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _somar(grupos, chave, tipo, pedidos, refeicoes, total_pagar):
+    grupo = grupos.get(chave)
+    if grupo is None:
+        grupo = grupos[chave] = {"pedidos": 0, "refeicoes": 0, "total_pagar": 0.0, "por_tipo": {}}
+    grupo["pedidos"] += pedidos
+    grupo["refeicoes"] += refeicoes
+    grupo["total_pagar"] += total_pagar
+    grupo["por_tipo"][tipo] = grupo["por_tipo"].get(tipo, 0) + pedidos
+
+
+class AgregadosFechamento:
+    """(fechamento, fornecedor, projeto) -> pedidos, refeições, total a pagar e pedidos por tipo"""
+
+    def __init__(self, intervalo=FECHAMENTO_RECONCILIAR, intervalo_pendentes=FECHAMENTO_INTERVALO_PENDENTES):
+        self.intervalo = intervalo
+        self.intervalo_pendentes = intervalo_pendentes
+        self._lock = threading.Lock()
+        self._grupos = {}
+        self._corte = None            # MAX(ID) da última reconciliação (None = ainda não carregado)
+        self._pendentes = []          # (id, fornecedor, projeto, tipo, refeicoes, total_pagar) sem FECHAMENTO
+        self._aplicados = []          # (id, chave, tipo, refeicoes, total_pagar) acima do corte
+        self._parar = threading.Event()
+        self._thread = None
+        self.reconciliado_em = None
+        self.atualizado_em = None
+        self.ultima_divergencia = 0.0
+        self.reconciliacoes = 0
+
+    def registrar(self, pedido_id, pedido):
+        """Pedido recém-gravado (colunas de COLUNAS_PEDIDO_INSERT); somado quando o FECHAMENTO for lido"""
+        with self._lock:
+            self._pendentes.append((
+                int(pedido_id), _texto(pedido.get('FORNECEDOR')), _texto(pedido.get('PROJETO')),
+                _texto(pedido.get('TIPO_REFEICAO')), int(_numero(pedido.get('TOTAL_COLABORADORES'))),
+                _numero(pedido.get('TOTAL_PAGAR')),
+            ))
+
+    def processar_pendentes(self, consultar):
+        """Busca o FECHAMENTO dos pedidos novos e soma nos grupos; retorna quantos foram aplicados"""
+        with self._lock:
+            if self._corte is None or not self._pendentes:
+                return 0
+            lote = self._pendentes[:FECHAMENTO_LOTE_PENDENTES]
+            del self._pendentes[:FECHAMENTO_LOTE_PENDENTES]
+
+        marcadores = ', '.join(['%s'] * len(lote))
+        linhas = consultar(f"SELECT ID, FECHAMENTO FROM PEDIDOS WHERE ID IN ({marcadores})",
+                           [item[0] for item in lote])
+        if linhas is None:
+            with self._lock:
+                self._pendentes[:0] = lote  # Tenta de novo na próxima rodada
+            return 0
+        fechamentos = {int(linha['ID']): _texto(linha['FECHAMENTO']) for linha in linhas}
+
+        aplicados = 0
+        with self._lock:
+            for pedido_id, fornecedor, projeto, tipo, refeicoes, total_pagar in lote:
+                # Já contado pela reconciliação, ou apagado do banco antes de ser lido
+                if pedido_id <= self._corte or pedido_id not in fechamentos:
+                    continue
+                chave = (fechamentos[pedido_id], fornecedor, projeto)
+                _somar(self._grupos, chave, tipo, 1, refeicoes, total_pagar)
+                self._aplicados.append((pedido_id, chave, tipo, refeicoes, total_pagar))
+                aplicados += 1
+            if aplicados:
+                self.atualizado_em = time.time()
+        return aplicados
+
+    def reconciliar(self, consultar):
+        """Recalcula todos os grupos no SQL (até o MAX(ID) atual) e reaplica os incrementos mais novos"""
+        corte = consultar(QUERY_CORTE, [])
+        if corte is None:
+            return False
+        corte = int(corte[0]['ID'] or 0) if corte else 0
+        linhas = consultar(QUERY_AGREGADOS, [corte])
+        if linhas is None:
+            return False
+
+        grupos = {}
+        for linha in linhas:
+            chave = (_texto(linha['FECHAMENTO']), _texto(linha['FORNECEDOR']), _texto(linha['PROJETO']))
+            _somar(grupos, chave, _texto(linha['TIPO_REFEICAO']), int(linha['PEDIDOS'] or 0),
+                   int(linha['REFEICOES'] or 0), _numero(linha['TOTAL_PAGAR']))
+
+        with self._lock:
+            if self._corte is not None:
+                # Quanto os incrementos tinham se afastado do banco (edições/exclusões diretas no SQL)
+                total_memoria = sum(g["total_pagar"] for g in self._grupos.values())
+                total_memoria -= sum(item[4] for item in self._aplicados if item[0] > corte)
+                total_memoria += sum(item[5] for item in self._pendentes if item[0] <= corte)
+                self.ultima_divergencia = round(sum(g["total_pagar"] for g in grupos.values()) - total_memoria, 2)
+            aplicados = [item for item in self._aplicados if item[0] > corte]
+            for _, chave, tipo, refeicoes, total_pagar in aplicados:
+                _somar(grupos, chave, tipo, 1, refeicoes, total_pagar)
+            self._grupos = grupos
+            self._aplicados = aplicados
+            self._corte = corte
+            self.reconciliado_em = self.atualizado_em = time.time()
+            self.reconciliacoes += 1
+        print(f"📊 Agregados de fechamento reconciliados: {len(grupos)} grupo(s) até o pedido {corte}"
+              f" (divergência R$ {self.ultima_divergencia:.2f})")
+        return True
+
+    @property
+    def carregado(self):
+        return self._corte is not None
+
+    def relatorio(self, fechamento=None, fornecedor=None, projeto=None):
+        """Grupos filtrados (O(grupos), sem consulta ao banco), do período mais recente para o mais antigo"""
+        with self._lock:
+            itens = [
+                (chave, dict(grupo, por_tipo=dict(grupo["por_tipo"])))
+                for chave, grupo in self._grupos.items()
+                if (fechamento is None or chave[0] == fechamento)
+                and (fornecedor is None or chave[1] == fornecedor)
+                and (projeto is None or chave[2] == projeto)
+            ]
+        itens.sort(key=lambda item: item[0][1:])                    # fornecedor, projeto
+        itens.sort(key=lambda item: item[0][0], reverse=True)       # fechamento mais recente primeiro
+        return [
+            {
+                "fechamento": chave[0],
+                "fornecedor": chave[1],
+                "projeto": chave[2],
+                "pedidos": grupo["pedidos"],
+                "refeicoes": grupo["refeicoes"],
+                "total_pagar": round(grupo["total_pagar"], 2),
+                "pedidos_por_tipo": grupo["por_tipo"],
+            }
+            for chave, grupo in itens
+        ]
+
+    def iniciar(self, consultar):
+        """Carga inicial e thread de incrementos/reconciliação"""
+        if self._thread is not None:
+            return
+
+        def trabalhar():
+            proxima_reconciliacao = 0
+            while not self._parar.is_set():
+                try:
+                    if time.monotonic() >= proxima_reconciliacao:
+                        ok = self.reconciliar(consultar)
+                        # Falha na carga/reconciliação: tenta de novo em 1 minuto
+                        proxima_reconciliacao = time.monotonic() + (self.intervalo if ok else 60)
+                    while self.processar_pendentes(consultar) >= FECHAMENTO_LOTE_PENDENTES:
+                        pass
+                except Exception as e:
+                    print(f"❌ Erro nos agregados de fechamento: {e}")
+                # Sem acordar a cada pedido: os pedidos de uma rajada são lidos num único SELECT
+                self._parar.wait(self.intervalo_pendentes)
+
+        self._thread = threading.Thread(target=trabalhar, name='agregados-fechamento', daemon=True)
+        self._thread.start()
+
+    def encerrar(self, timeout=5):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "carregado": self._corte is not None,
+                "grupos": len(self._grupos),
+                "corte_id": self._corte,
+                "pendentes": len(self._pendentes),
+                "incrementos_desde_reconciliacao": len(self._aplicados),
+                "reconciliacoes": self.reconciliacoes,
+                "ultima_divergencia": self.ultima_divergencia,
+                "reconciliado_em": self.reconciliado_em,
+            }
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Minificação conservadora de CSS/JS/HTML e separação de CSS crítico (usado pelo build_assets.py)
+
+Sem dependências externas. As transformações só removem comentários e espaços que não
+mudam o significado do código - nada de renomear variáveis ou reescrever expressões.
+"""
+import re
+
+# ---------------------------------------------------------------------------
+# CSS
+# ---------------------------------------------------------------------------
+
+_PADRAO_STRING_OU_COMENTARIO_CSS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.DOTALL)
+
+
+def _proteger_strings_css(css):
+    """Remove comentários e troca strings por marcadores (para não mexer no conteúdo delas)"""
+    strings = []
+
+    def substituir(m):
+        if m.group(1) is None:
+            return ' '
+        strings.append(m.group(1))
+        return f'\x00{len(strings) - 1}\x00'
+
+    return _PADRAO_STRING_OU_COMENTARIO_CSS.sub(substituir, css), strings
+
+
+def _restaurar_strings_css(css, strings):
+    return re.sub(r'\x00(\d+)\x00', lambda m: strings[int(m.group(1))], css)
+
+
+def _dividir_regras(css):
+    """Divide o CSS (sem comentários/strings) em [(prelúdio, corpo)] de nível superior
+
+    corpo é None para at-rules sem bloco (ex: @import ...;).
+    """
+    regras = []
+    i = 0
+    inicio = 0
+    tamanho = len(css)
+    while i < tamanho:
+        c = css[i]
+        if c == ';' and css[inicio:i].strip().startswith('@'):
+            regras.append((css[inicio:i].strip(), None))
+            inicio = i + 1
+        elif c == '{':
+            profundidade = 1
+            j = i + 1
+            while j < tamanho and profundidade:
+                if css[j] == '{':
+                    profundidade += 1
+                elif css[j] == '}':
+                    profundidade -= 1
+                j += 1
+            regras.append((css[inicio:i].strip(), css[i + 1:j - 1]))
+            i = j
+            inicio = j
+            continue
+        i += 1
+    return regras
+
+
+def _minificar_prelude(prelude):
+    prelude = re.sub(r'\s+', ' ', prelude).strip()
+    return re.sub(r'\s*,\s*', ',', prelude)
+
+
+def _minificar_declaracoes(corpo):
+    corpo = re.sub(r'\s+', ' ', corpo).strip()
+    corpo = re.sub(r'\s*([;:,{}])\s*', r'\1', corpo)
+    return corpo.rstrip(';')
+
+
+def _serializar(regras):
+    partes = []
+    for prelude, corpo in regras:
+        prelude = _minificar_prelude(prelude)
+        if corpo is None:
+            partes.append(prelude + ';')
+        elif '{' in corpo:
+            partes.append(prelude + '{' + _serializar(_dividir_regras(corpo)) + '}')
+        else:
+            partes.append(prelude + '{' + _minificar_declaracoes(corpo) + '}')
+    return ''.join(partes)
+
+
+def minificar_css(css):
+    """Remove comentários e espaços desnecessários do CSS"""
+    css, strings = _proteger_strings_css(css)
+    return _restaurar_strings_css(_serializar(_dividir_regras(css)), strings)
+
+
+_PADRAO_CLASSE_ID = re.compile(r'([.#])(-?[_a-zA-Z][\w-]*)')
+_PADRAO_PSEUDO_FUNCAO = re.compile(r':(?:not|is|where|has)\([^)]*\)')
+# At-rules que são sempre críticas (pequenas e usadas pelo overlay de loading)
+_AT_RULES_CRITICAS = ('@keyframes', '@-webkit-keyframes', '@font-face', '@charset', '@import')
+
+
+def _seletor_critico(seletor, classes, ids):
+    """Um seletor é crítico se todas as classes/ids dele existem no HTML estático"""
+    seletor = _PADRAO_PSEUDO_FUNCAO.sub('', seletor)
+    for tipo, nome in _PADRAO_CLASSE_ID.findall(seletor):
+        if tipo == '.' and nome not in classes:
+            return False
+        if tipo == '#' and nome not in ids:
+            return False
+    return True
+
+
+def _filtrar_criticas(regras, classes, ids):
+    criticas = []
+    for prelude, corpo in regras:
+        if prelude.startswith(_AT_RULES_CRITICAS):
+            criticas.append((prelude, corpo))
+        elif prelude.startswith('@'):
+            if corpo is not None and '{' in corpo:
+                internas = _filtrar_criticas(_dividir_regras(corpo), classes, ids)
+                if internas:
+                    criticas.append((prelude, _serializar(internas)))
+        elif any(_seletor_critico(s, classes, ids) for s in prelude.split(',')):
+            criticas.append((prelude, corpo))
+    return criticas
+
+
+def extrair_css_critico(css, html_estatico):
+    """Retorna o CSS (minificado) necessário para o HTML estático da página
+
+    Critério: regras cujas classes/ids aparecem no markup estático (elementos criados via JS
+    ficam de fora). O CSS completo continua sendo carregado depois, na ordem original, então
+    a cascata final é a mesma - o crítico só antecipa a primeira pintura.
+    """
+    classes = set()
+    for valor in re.findall(r'\bclass\s*=\s*["\']([^"\']*)["\']', html_estatico):
+        classes.update(valor.split())
+    ids = set(re.findall(r'\bid\s*=\s*["\']([^"\']+)["\']', html_estatico))
+
+    css, strings = _proteger_strings_css(css)
+    criticas = _filtrar_criticas(_dividir_regras(css), classes, ids)
+    return _restaurar_strings_css(_serializar(criticas), strings)
+
+
+# ---------------------------------------------------------------------------
+# JavaScript
+# ---------------------------------------------------------------------------
+
+# Depois destes caracteres/palavras, "/" inicia uma regex (e não uma divisão)
+_ANTES_DE_REGEX = set('(,=:[!&|?{};+-*%<>~^')
+_PALAVRAS_ANTES_DE_REGEX = ('return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                            'throw', 'case', 'do', 'else', 'yield', 'await')
+
+
+def _regex_permitida(saida):
+    """Decide se um "/" na posição atual começa uma regex, olhando o que já foi emitido"""
+    anterior = ''.join(saida[-20:]).rstrip()
+    if not anterior:
+        return True
+    if anterior[-1] in _ANTES_DE_REGEX:
+        return True
+    palavra = re.search(r'([A-Za-z_$][\w$]*)$', anterior)
+    return bool(palavra) and palavra.group(1) in _PALAVRAS_ANTES_DE_REGEX
+
+
+def _remover_comentarios_js(codigo):
+    """Remove comentários do JS respeitando strings, template literals e regex
+
+    Retorna (código, linhas_em_template, linhas_terminam_em_template): índices das linhas que
+    começam/terminam dentro de um template literal (ali os espaços são texto e não podem mudar).
+    """
+    saida = []
+    linhas_em_template = set()
+    linhas_terminam_em_template = set()
+    linha = 0
+    i = 0
+    n = len(codigo)
+    pilha_template = []  # profundidade de ${ } dentro de cada template aberto
+
+    while i < n:
+        c = codigo[i]
+        em_template = bool(pilha_template) and pilha_template[-1] == 0
+
+        if em_template:
+            if c == '\\':
+                saida.append(codigo[i:i + 2])
+                linha += codigo[i:i + 2].count('\n')
+                i += 2
+                continue
+            if c == '`':
+                pilha_template.pop()
+            elif c == '$' and codigo[i + 1:i + 2] == '{':
+                pilha_template[-1] += 1
+                saida.append('${')
+                i += 2
+                continue
+            elif c == '\n':
+                linhas_terminam_em_template.add(linha)
+                linha += 1
+                linhas_em_template.add(linha)
+            saida.append(c)
+            i += 1
+            continue
+
+        if c == '\n':
+            linha += 1
+            saida.append(c)
+            i += 1
+        elif c in '"\'':
+            j = i + 1
+            while j < n and codigo[j] != c and codigo[j] != '\n':
+                j += 2 if codigo[j] == '\\' else 1
+            saida.append(codigo[i:j + 1])
+            linha += codigo[i:j + 1].count('\n')
+            i = j + 1
+        elif c == '`':
+            pilha_template.append(0)
+            saida.append(c)
+            i += 1
+        elif c == '{' and pilha_template:
+            pilha_template[-1] += 1
+            saida.append(c)
+            i += 1
+        elif c == '}' and pilha_template:
+            pilha_template[-1] -= 1
+            saida.append(c)
+            i += 1
+        elif c == '/' and codigo[i + 1:i + 2] == '/':
+            j = codigo.find('\n', i)
+            i = n if j == -1 else j
+        elif c == '/' and codigo[i + 1:i + 2] == '*':
+            j = codigo.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            quebras = codigo[i:j].count('\n')
+            linha += quebras
+            saida.append('\n' * quebras if quebras else ' ')
+            i = j
+        elif c == '/' and _regex_permitida(saida):
+            j = i + 1
+            em_classe = False
+            while j < n and codigo[j] != '\n':
+                if codigo[j] == '\\':
+                    j += 2
+                    continue
+                if codigo[j] == '[':
+                    em_classe = True
+                elif codigo[j] == ']':
+                    em_classe = False
+                elif codigo[j] == '/' and not em_classe:
+                    break
+                j += 1
+            saida.append(codigo[i:j + 1])
+            i = j + 1
+        else:
+            saida.append(c)
+            i += 1
+
+    return ''.join(saida), linhas_em_template, linhas_terminam_em_template
+
+
+def minificar_js(codigo):
+    """Remove comentários, indentação e linhas vazias (mantém quebras de linha por causa do ASI)"""
+    codigo, linhas_em_template, linhas_terminam_em_template = _remover_comentarios_js(codigo)
+    linhas = []
+    for indice, linha in enumerate(codigo.split('\n')):
+        if indice in linhas_em_template:
+            linhas.append(linha)
+            continue
+        linha = linha.lstrip() if indice in linhas_terminam_em_template else linha.strip()
+        if linha:
+            linhas.append(linha)
+    return '\n'.join(linhas) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# HTML
+# ---------------------------------------------------------------------------
+
+_PADRAO_COMENTARIO_HTML = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+
+
+def minificar_html(html):
+    """Remove comentários HTML e linhas vazias (indentação mantida por causa de <textarea>/<pre>)"""
+    html = _PADRAO_COMENTARIO_HTML.sub('', html)
+    return '\n'.join(linha.rstrip() for linha in html.split('\n') if linha.strip()) + '\n'
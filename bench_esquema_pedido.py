@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: montagem dos parâmetros do pedido (esquema compilado x código antigo)
+
+Compara ESQUEMA_PEDIDO.montar() com a montagem campo a campo que existia em server.py
+(~25 .get(), import re e três re.sub por requisição, e os prints de diagnóstico). Os prints
+do código antigo vão para um buffer em memória, então o custo medido é só CPU (sem I/O de
+terminal/log do Railway, que na prática é maior). Também confere que os dois produzem os
+mesmos parâmetros.
+
+Uso:
+    python bench_esquema_pedido.py --repeticoes 50000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from esquema_pedido import ESQUEMA_PEDIDO
+
+PEDIDO_EXEMPLO = {
+    'data_retirada': '2026-10-19',
+    'projeto': '700',
+    'coordenador': 'COORDENADOR TESTE',
+    'supervisor': 'SUPERVISOR TESTE',
+    'equipe': '700AA',
+    'nome_lider_organograma': 'LIDER TESTE',
+    'fazenda_digitada': '  FAZENDA SANTA RITA  ',
+    'tipo_refeicao': 'MARMITEX',
+    'cidade_prestacao_servico': 'UBERABA',
+    'fornecedor': 'RESTAURANTE BOM PRATO',
+    'valor_pago': '23.50',
+    'colaboradores_nomes_limpos': '👷 JOÃO DA SILVA,   MARIA   SOUZA 🧑‍🌾, JOSÉ  PEREIRA ✅',
+    'total_colaboradores': '12',
+    'a_contratar': '2',
+    'responsavel_cartao': 'LIDER TESTE',
+    'pagcorp_numero': '123456',
+    'hospedado_real': 'NÃO',
+    'nome_hotel_real': '',
+    'valor_diaria_real': 0,
+    'observacoes': 'Sem observações',
+    'aferiu_temperatura': 'NAO',
+}
+
+
+def montar_pedido_antigo(pedido_data):
+    """Cópia da montagem anterior (server.py) para comparação"""
+    data_retirada = pedido_data.get('data_retirada')
+    projeto = pedido_data.get('projeto', '')
+    coordenador = pedido_data.get('coordenador', '')
+    supervisor = pedido_data.get('supervisor', '')
+    lider = pedido_data.get('equipe', '')
+    nome_lider = pedido_data.get('nome_lider_organograma', pedido_data.get('solicitante', 'N/A'))
+    fazenda = pedido_data.get('fazenda_digitada', '').strip()
+    tipo_refeicao = pedido_data.get('tipo_refeicao', 'N/A')
+    cidade = pedido_data.get('cidade_prestacao_servico', '')
+    fornecedor = pedido_data.get('fornecedor', 'N/A')
+    valor_pago = float(pedido_data.get('valor_pago', 0))
+    colaboradores_nomes = pedido_data.get('colaboradores_nomes_limpos', '')
+    import re
+    if colaboradores_nomes:
+        colaboradores_nomes = re.sub(r'[\uD800-\uDFFF]', '', colaboradores_nomes)
+        colaboradores_nomes = re.sub(r'[^\x00-\x7F\u00C0-\u017F\u0020-\u007E]', '', colaboradores_nomes)
+        colaboradores_nomes = re.sub(r'\s+', ' ', colaboradores_nomes).strip()
+    total_colaboradores = int(pedido_data.get('total_colaboradores', 1))
+    a_contratar = int(pedido_data.get('a_contratar', 0))
+    responsavel_cartao = pedido_data.get('responsavel_cartao', '')
+    pagcorp = pedido_data.get('pagcorp_numero', '')
+    hospedado = pedido_data.get('hospedado_real', 'NÃO')
+    nome_hotel = pedido_data.get('nome_hotel_real', '')
+    valor_diaria = float(pedido_data.get('valor_diaria_real', 0))
+    aprovado_por = 'ELAINE KLUG'
+    aferiu_temperatura_frontend = pedido_data.get('aferiu_temperatura', '')
+    observacoes = pedido_data.get('observacoes', '')
+    total_pessoas = total_colaboradores
+    total_refeicao = valor_pago * total_pessoas
+    total_pagar = total_refeicao
+
+    print(f"💰 Cálculo CORRIGIDO:")
+    print(f"   Total colaboradores (já incluindo tudo): {total_colaboradores}")
+    print(f"   A contratar (não soma mais): {a_contratar}")
+    print(f"   Total pessoas: {total_pessoas}")
+    print(f"   Refeição: R$ {valor_pago} x {total_pessoas} pessoas = R$ {total_refeicao}")
+    print(f"   HOSPEDADO: {hospedado}")
+    print(f"   Hotel: R$ {valor_diaria} (NÃO incluído no total)")
+    print(f"   TOTAL FINAL: R$ {total_pagar} (apenas refeições)")
+    print(f"🔧 DADOS CORRIGIDOS:")
+    print(f"   LIDER (equipe): {lider}")
+    print(f"   NOME_LIDER (do organograma): {nome_lider}")
+    print(f"   FAZENDA: {fazenda}")
+    print(f"   PAGCORP: {pagcorp}")
+    print(f"   RESPONSÁVEL CARTÃO: {responsavel_cartao}")
+    print(f"   HOSPEDADO: {hospedado}")
+    print(f"   NOME HOTEL: {nome_hotel}")
+    print(f"   VALOR DIÁRIA: R$ {valor_diaria}")
+
+    parametros = [
+        data_retirada, projeto, coordenador, supervisor, lider, nome_lider,
+        fazenda, tipo_refeicao, cidade, fornecedor, valor_pago,
+        colaboradores_nomes, total_colaboradores, a_contratar,
+        responsavel_cartao, pagcorp, hospedado, nome_hotel, valor_diaria,
+        total_pagar, aprovado_por, observacoes, aferiu_temperatura_frontend
+    ]
+    resumo = {
+        "tipo_refeicao": tipo_refeicao,
+        "total_pagar": total_pagar,
+        "aferiu_temperatura": aferiu_temperatura_frontend
+    }
+    return parametros, resumo
+
+
+def medir(funcao, repeticoes):
+    """Melhor de 5 rodadas, em microssegundos de CPU por chamada"""
+    melhor = float('inf')
+    for _ in range(5):
+        inicio = time.process_time()
+        for _ in range(repeticoes):
+            funcao(PEDIDO_EXEMPLO)
+        melhor = min(melhor, (time.process_time() - inicio) / repeticoes)
+    return melhor * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark da montagem de parâmetros do pedido')
+    parser.add_argument('--repeticoes', type=int, default=20000)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        antigo = montar_pedido_antigo(PEDIDO_EXEMPLO)
+    novo = ESQUEMA_PEDIDO.montar(PEDIDO_EXEMPLO)
+    if list(novo[0]) != antigo[0] or novo[1] != antigo[1]:
+        raise SystemExit(f"❌ Resultados diferentes:\n   antigo: {antigo}\n   novo:   {novo}")
+
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        # O buffer é esvaziado a cada rodada para não medir o crescimento da string
+        def antigo_sem_terminal(pedido):
+            buffer.seek(0)
+            buffer.truncate()
+            return montar_pedido_antigo(pedido)
+
+        us_antigo = medir(antigo_sem_terminal, args.repeticoes)
+    us_novo = medir(ESQUEMA_PEDIDO.montar, args.repeticoes)
+
+    print(f"📊 Montagem do pedido ({args.repeticoes} repetições, melhor de 5, CPU por chamada)")
+    print(f"   código antigo (prints em buffer): {us_antigo:8.2f} µs")
+    print(f"   esquema compilado:                {us_novo:8.2f} µs")
+    print(f"   economia: {us_antigo - us_novo:.2f} µs por requisição ({us_antigo / us_novo:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline de upload contra o Azure Blob falso (fake_blob.py)
+
+Sobe o servidor (RefeicaoHandler) e o Blob falso no mesmo processo e dispara requisições
+concorrentes em /upload-blob e /api/afericao-temperatura (JSON com base64 e multipart).
+Para a aferição mede também o tempo até o POOL_UPLOADS terminar os uploads em segundo plano.
+
+O Azure SQL é substituído por uma função com latência fixa (--latencia-sql), para que o
+resultado reflita o pipeline de upload e não a rede até o banco.
+
+Uso:
+    python bench_uploads.py --requisicoes 200 --concorrencia 8 --tamanho-kb 800 \\
+        --latencia-blob 0.03 --falhas 0.05
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+
+from fake_blob import ServidorBlobFalso
+
+CENARIOS = ('upload-blob', 'afericao-json', 'afericao-multipart')
+
+
+def memoria_maxima_mb():
+    """Pico de RSS do processo (ru_maxrss é KB no Linux e bytes no macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def percentil(valores, fracao):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+def _jpeg_ruido(largura, altura, gerador):
+    # Ruído em blocos de 8x8 suavizado: comprime mais perto de uma foto do que ruído puro
+    pequena = Image.frombytes('RGB', (max(1, largura // 8), max(1, altura // 8)),
+                              gerador.randbytes(max(1, largura // 8) * max(1, altura // 8) * 3))
+    saida = io.BytesIO()
+    pequena.resize((largura, altura), Image.BILINEAR).save(saida, format='JPEG', quality=92)
+    return saida.getvalue()
+
+
+def gerar_imagem(tamanho, semente):
+    """JPEG de verdade (ruído, 4:3) com ~tamanho bytes, único por semente - sem acerto de dedup
+
+    Decodificável pelo Pillow, então o benchmark passa pela redução/recompressão de
+    image_processing como uma foto real. As dimensões são calibradas numa primeira codificação.
+    """
+    gerador = random.Random(semente)
+    pixels = tamanho / 0.35   # estimativa inicial de bytes por pixel
+    for _ in range(2):
+        largura = max(16, int((pixels * 4 / 3) ** 0.5))
+        altura = max(12, largura * 3 // 4)
+        dados = _jpeg_ruido(largura, altura, gerador)
+        pixels = largura * altura * tamanho / len(dados)
+    return dados
+
+
+def preparar_ambiente(blob_falso, diretorio):
+    """Variáveis lidas pelo server.py na importação"""
+    os.environ.update({
+        'AZURE_BLOB_ENDPOINT': blob_falso.endpoint,
+        'AZURE_STORAGE_ACCOUNT': 'bench',
+        'AZURE_STORAGE_CONTAINER': 'fotos',
+        'AZURE_SAS_TOKEN': 'sv=bench&sig=bench',
+        'UPLOAD_SPOOL_DIR': os.path.join(diretorio, 'spool'),
+        'UPLOAD_INDICE_ARQUIVO': os.path.join(diretorio, 'indice.jsonl'),
+        # Regime normal (índice íntegro): sem HEAD antes do upload condicional
+        'UPLOAD_VERIFICAR_HEAD': '0',
+    })
+
+
+def substituir_banco(server, latencia_sql):
+    """executar_query com latência fixa e respostas mínimas para as rotas de upload"""
+
+    def executar_query(query, params=None):
+        time.sleep(latencia_sql)
+        if 'INFORMATION_SCHEMA' in query:
+            return [{'COLUMN_NAME': c} for c in ('TEMPERATURA_RETIRADA', 'TEMPERATURA_CONSUMO', 'OBSERVACOES_TEMP')]
+        if query.lstrip().upper().startswith('SELECT'):
+            return []
+        return 1
+
+    server.executar_query = executar_query
+
+
+def executar_cenario(cenario, url_base, args):
+    sessao_local = threading.local()
+
+    def sessao():
+        if not hasattr(sessao_local, 'sessao'):
+            sessao_local.sessao = requests.Session()
+        return sessao_local.sessao
+
+    def uma_requisicao(indice):
+        imagem = gerar_imagem(args.tamanho_kb * 1024, f'{cenario}-{indice}')
+        # Segunda foto da aferição: outra semente (conteúdo diferente, também decodificável)
+        imagem_consumo = gerar_imagem(args.tamanho_kb * 1024, f'{cenario}-{indice}-consumo') if cenario != 'upload-blob' else None
+        inicio = time.perf_counter()
+        if cenario == 'upload-blob':
+            resposta = sessao().post(f'{url_base}/upload-blob',
+                                     files={'file': (f'bench_{indice}.jpg', imagem, 'image/jpeg')})
+        elif cenario == 'afericao-json':
+            corpo = {
+                'pedido_id': indice, 'temperatura_retirada': 65.0, 'temperatura_consumo': 61.5,
+                'img_retirada': 'data:image/jpeg;base64,' + base64.b64encode(imagem).decode('ascii'),
+                'img_consumo': 'data:image/jpeg;base64,' + base64.b64encode(imagem_consumo).decode('ascii'),
+            }
+            resposta = sessao().post(f'{url_base}/api/afericao-temperatura', data=json.dumps(corpo),
+                                     headers={'Content-Type': 'application/json'})
+        else:
+            resposta = sessao().post(
+                f'{url_base}/api/afericao-temperatura',
+                data={'pedido_id': str(indice), 'temperatura_retirada': '65', 'temperatura_consumo': '61.5'},
+                files={'img_retirada': ('r.jpg', imagem, 'image/jpeg'),
+                       'img_consumo': ('c.jpg', imagem_consumo, 'image/jpeg')})
+        duracao = time.perf_counter() - inicio
+        return duracao, resposta.status_code == 200 and not resposta.json().get('error')
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        resultados = list(executor.map(uma_requisicao, range(args.requisicoes)))
+    return resultados, time.perf_counter() - inicio
+
+
+def aguardar_pool(server, timeout=300):
+    """Espera os uploads em segundo plano (aferição) terminarem"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        estatisticas = server.POOL_UPLOADS.estatisticas()
+        if estatisticas['fila'] == 0 and estatisticas['em_andamento'] == 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de upload (Blob falso local)')
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help=f'lista separada por vírgula: {", ".join(CENARIOS)}')
+    parser.add_argument('--requisicoes', type=int, default=100)
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--tamanho-kb', type=int, default=500, help='tamanho de cada imagem')
+    parser.add_argument('--latencia-blob', type=float, default=0.02, help='segundos por requisição ao Blob')
+    parser.add_argument('--banda-blob', type=int, default=0, help='bytes/s simulados no Blob (0 = sem limite)')
+    parser.add_argument('--falhas', type=float, default=0.0, help='probabilidade de 503 no Blob')
+    parser.add_argument('--latencia-sql', type=float, default=0.005)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench_uploads_')
+    blob_falso = ServidorBlobFalso(latencia=args.latencia_blob, banda=args.banda_blob,
+                                   taxa_falha=args.falhas).iniciar()
+    preparar_ambiente(blob_falso, diretorio)
+
+    import server  # Depois do ambiente: a configuração do Blob é lida na importação
+    substituir_banco(server, args.latencia_sql)
+
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    httpd = socketserver.ThreadingTCPServer(('127.0.0.1', 0), server.RefeicaoHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url_base = f'http://127.0.0.1:{httpd.server_address[1]}'
+
+    relatorio = []
+    for cenario in [c.strip() for c in args.cenarios.split(',') if c.strip()]:
+        if cenario not in CENARIOS:
+            parser.error(f'cenário desconhecido: {cenario}')
+        requisicoes_blob = blob_falso.armazenamento.requisicoes
+        resultados, duracao = executar_cenario(cenario, url_base, args)
+        inicio_pool = time.perf_counter()
+        drenou = aguardar_pool(server)
+        duracao_total = duracao + (time.perf_counter() - inicio_pool)
+
+        latencias_ms = [r[0] * 1000 for r in resultados]
+        erros = sum(1 for r in resultados if not r[1])
+        relatorio.append({
+            'cenario': cenario,
+            'requisicoes': len(resultados),
+            'erros': erros,
+            'req_s': round(len(resultados) / duracao, 1),
+            'p50_ms': round(statistics.median(latencias_ms), 1),
+            'p95_ms': round(percentil(latencias_ms, 0.95), 1),
+            'p99_ms': round(percentil(latencias_ms, 0.99), 1),
+            'ponta_a_ponta_s': round(duracao_total, 2),
+            'pool_drenado': drenou,
+            'requisicoes_blob': blob_falso.armazenamento.requisicoes - requisicoes_blob,
+            'rss_pico_mb': round(memoria_maxima_mb(), 1),
+        })
+
+    print(f"\n📊 {args.requisicoes} requisições x {args.concorrencia} concorrentes, imagens de {args.tamanho_kb}KB, "
+          f"Blob falso com {args.latencia_blob * 1000:.0f}ms de latência e {args.falhas:.0%} de falhas")
+    colunas = list(relatorio[0].keys()) if relatorio else []
+    print(' | '.join(colunas))
+    for linha in relatorio:
+        print(' | '.join(str(linha[c]) for c in colunas))
+    print(f"\n☁️ Blob falso: {len(blob_falso.armazenamento.blobs)} blob(s), "
+          f"{blob_falso.armazenamento.bytes_armazenados() / 1024 / 1024:.1f}MB armazenados, "
+          f"{blob_falso.armazenamento.falhas_injetadas} falha(s) injetada(s)")
+    print(f"📈 Métricas do cliente: {json.dumps({k: v for k, v in server.CLIENTE_BLOB.metricas.resumo().items() if k != 'ultimos'})}")
+
+    httpd.shutdown()
+    blob_falso.parar()
+    shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
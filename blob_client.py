@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP compartilhado para o Azure Blob Storage
+
+- Sessão única com pool de conexões keep-alive por host (TCP/TLS reaproveitados entre uploads)
+- Retry com backoff exponencial + jitter em respostas 5xx/429 e timeouts
+- Upload em blocos paralelos (Put Block + Put Block List) para arquivos grandes
+- Upload condicional (If-None-Match: *): blob já existente responde 409 sem ser sobrescrito
+- Métricas por upload (tempo, bytes, tentativas) e estatísticas agregadas
+"""
+import base64
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Conexões mantidas por host (*.blob.core.windows.net é sempre o mesmo host)
+BLOB_POOL_CONEXOES = int(os.getenv('BLOB_POOL_CONEXOES', 4))
+BLOB_MAX_TENTATIVAS = int(os.getenv('BLOB_MAX_TENTATIVAS', 3))
+BLOB_BACKOFF_BASE = float(os.getenv('BLOB_BACKOFF_BASE', 0.5))   # segundos
+BLOB_BACKOFF_MAX = float(os.getenv('BLOB_BACKOFF_MAX', 8.0))
+# (conexão, leitura) - conectar deve ser rápido; a leitura inclui o envio do corpo
+BLOB_TIMEOUT = (float(os.getenv('BLOB_TIMEOUT_CONEXAO', 5)), float(os.getenv('BLOB_TIMEOUT_LEITURA', 10)))
+# Acima deste tamanho o upload é feito em blocos paralelos em vez de um único PUT
+BLOB_LIMITE_PUT_UNICO = int(os.getenv('BLOB_LIMITE_PUT_UNICO', 4 * 1024 * 1024))
+BLOB_TAMANHO_BLOCO = int(os.getenv('BLOB_TAMANHO_BLOCO', 1024 * 1024))
+# Blocos enviados ao mesmo tempo (cada um ocupa uma conexão do pool)
+BLOB_BLOCOS_PARALELOS = int(os.getenv('BLOB_BLOCOS_PARALELOS', BLOB_POOL_CONEXOES))
+
+STATUS_RETENTAVEIS = {408, 429, 500, 502, 503, 504}
+# Respostas de Put Blob / Put Block List aceitas como "blob no container"
+STATUS_GRAVADO = (200, 201)
+HISTORICO_METRICAS = 200
+
+
+class LeitorMemoria:
+    """Expõe bytes/bytearray/memoryview como arquivo (read/len) sem copiar o buffer
+
+    requests trata bytearray como iterável (envia byte a byte em chunked); com este
+    wrapper o corpo vai com Content-Length e em fatias do buffer original.
+    """
+
+    def __init__(self, dados):
+        self._view = memoryview(dados).cast('B')
+        self._posicao = 0
+
+    def __len__(self):
+        return len(self._view)
+
+    def tell(self):
+        return self._posicao
+
+    def seek(self, posicao, whence=0):
+        base = {0: 0, 1: self._posicao, 2: len(self._view)}[whence]
+        self._posicao = max(0, min(len(self._view), base + posicao))
+        return self._posicao
+
+    def read(self, tamanho=-1):
+        if tamanho is None or tamanho < 0:
+            tamanho = len(self._view) - self._posicao
+        inicio = self._posicao
+        self._posicao = min(len(self._view), inicio + tamanho)
+        return self._view[inicio:self._posicao]
+
+
+def calcular_backoff(tentativa, base=BLOB_BACKOFF_BASE, maximo=BLOB_BACKOFF_MAX):
+    """Backoff exponencial com "full jitter": aleatório entre 0 e base * 2^tentativa"""
+    return random.uniform(0, min(maximo, base * (2 ** tentativa)))
+
+
+def blob_ja_existia(response):
+    """409 de um upload condicional (If-None-Match: *): o blob já estava no container"""
+    return response.status_code == 409 and response.headers.get('x-ms-error-code', 'BlobAlreadyExists') == 'BlobAlreadyExists'
+
+
+def id_bloco(indice):
+    """Block ID em base64 - todos os IDs de um blob precisam ter o mesmo tamanho"""
+    return base64.b64encode(f'bloco-{indice:06d}'.encode('ascii')).decode('ascii')
+
+
+class FalhaUploadBlob(Exception):
+    """Upload em blocos não concluído (status inesperado em algum bloco ou no commit)"""
+
+    def __init__(self, mensagem, status=None):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class MetricasUpload:
+    """Registro das últimas operações e contadores agregados (thread-safe)"""
+
+    def __init__(self, historico=HISTORICO_METRICAS):
+        self._lock = threading.Lock()
+        self._recentes = deque(maxlen=historico)
+        self.total = 0
+        self.sucessos = 0
+        self.falhas = 0
+        self.retentativas = 0
+        self.bytes_enviados = 0
+
+    def registrar(self, nome, tamanho, duracao, tentativas, status, sucesso):
+        with self._lock:
+            self.total += 1
+            self.retentativas += tentativas - 1
+            if sucesso:
+                self.sucessos += 1
+                self.bytes_enviados += tamanho
+            else:
+                self.falhas += 1
+            self._recentes.append({
+                "blob": nome,
+                "bytes": tamanho,
+                "duracao_ms": round(duracao * 1000, 1),
+                "tentativas": tentativas,
+                "status": status,
+                "sucesso": sucesso,
+            })
+
+    def resumo(self):
+        with self._lock:
+            duracoes = sorted(m['duracao_ms'] for m in self._recentes if m['sucesso'])
+            resumo = {
+                "total": self.total,
+                "sucessos": self.sucessos,
+                "falhas": self.falhas,
+                "retentativas": self.retentativas,
+                "bytes_enviados": self.bytes_enviados,
+                "ultimos": list(self._recentes)[-10:],
+            }
+        if duracoes:
+            resumo["duracao_ms_p50"] = duracoes[len(duracoes) // 2]
+            resumo["duracao_ms_p95"] = duracoes[min(len(duracoes) - 1, int(len(duracoes) * 0.95))]
+        return resumo
+
+
+class ClienteBlob:
+    """Cliente do container configurado, com sessão keep-alive compartilhada"""
+
+    def __init__(self, account_name, container_name, sas_token,
+                 pool_conexoes=BLOB_POOL_CONEXOES, max_tentativas=BLOB_MAX_TENTATIVAS,
+                 timeout=BLOB_TIMEOUT, endpoint=None):
+        self.account_name = account_name
+        # Endpoint alternativo (ex: emulador local); padrão é https://<conta>.blob.core.windows.net
+        self.endpoint = (endpoint or os.getenv('AZURE_BLOB_ENDPOINT') or '').rstrip('/')
+        self.container_name = container_name
+        self.sas_token = sas_token
+        self.max_tentativas = max(1, max_tentativas)
+        self.timeout = timeout
+        self.metricas = MetricasUpload()
+
+        self.sessao = requests.Session()
+        # pool_block=True: acima do limite, espera uma conexão livre em vez de abrir outra
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=pool_conexoes,
+                                pool_block=True, max_retries=0)
+        self.sessao.mount('https://', adaptador)
+        self.sessao.mount('http://', adaptador)
+
+    @property
+    def configurado(self):
+        return all([self.account_name, self.container_name, self.sas_token])
+
+    @property
+    def url_base(self):
+        endpoint = self.endpoint or f"https://{self.account_name}.blob.core.windows.net"
+        return f"{endpoint}/{self.container_name}"
+
+    def url_publica(self, nome_blob):
+        """URL do blob sem SAS token (a que é gravada no banco)"""
+        return f"{self.url_base}/{nome_blob}"
+
+    def url_assinada(self, nome_blob, parametros=''):
+        """URL do blob com SAS token (e parâmetros extras como comp=block)"""
+        extra = f"{parametros}&" if parametros else ''
+        return f"{self.url_base}/{nome_blob}?{extra}{self.sas_token}"
+
+    def requisitar(self, metodo, url, dados=None, headers=None, timeout=None):
+        """Executa a requisição com retry (backoff + jitter) em 5xx/429/timeouts
+
+        Retorna (response, tentativas). Se todas as tentativas falharem por exceção
+        (timeout/conexão), a última exceção é propagada.
+        """
+        corpo = dados
+        if dados is not None and not isinstance(dados, bytes):
+            corpo = dados if hasattr(dados, 'read') else LeitorMemoria(dados)
+
+        tentativa = 0
+        while True:
+            tentativa += 1
+            if hasattr(corpo, 'seek'):
+                corpo.seek(0)
+            try:
+                response = self.sessao.request(metodo, url, data=corpo, headers=headers,
+                                               timeout=timeout or self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if tentativa >= self.max_tentativas:
+                    raise
+                espera = calcular_backoff(tentativa - 1)
+                print(f"⏳ {type(e).__name__} no Blob (tentativa {tentativa}/{self.max_tentativas}) - nova tentativa em {espera:.2f}s")
+                time.sleep(espera)
+                continue
+
+            if response.status_code in STATUS_RETENTAVEIS and tentativa < self.max_tentativas:
+                espera = calcular_backoff(tentativa - 1)
+                print(f"⏳ Blob respondeu {response.status_code} (tentativa {tentativa}/{self.max_tentativas}) - nova tentativa em {espera:.2f}s")
+                response.close()
+                time.sleep(espera)
+                continue
+            return response, tentativa
+
+    def put_blob(self, nome_blob, dados, content_type='application/octet-stream', timeout=None,
+                 somente_se_novo=False):
+        """Put Blob (BlockBlob) numa única requisição; retorna o response final
+
+        somente_se_novo: If-None-Match: * - se o blob já existe o Azure responde 409 e não grava.
+        """
+        headers = {
+            'x-ms-blob-type': 'BlockBlob',
+            'Content-Type': content_type
+        }
+        if somente_se_novo:
+            headers['If-None-Match'] = '*'
+        inicio = time.monotonic()
+        tentativas = self.max_tentativas
+        status = None
+        sucesso = False
+        try:
+            response, tentativas = self.requisitar('PUT', self.url_assinada(nome_blob), dados, headers, timeout)
+            status = response.status_code
+            sucesso = status in STATUS_GRAVADO or (somente_se_novo and blob_ja_existia(response))
+            return response
+        finally:
+            duracao = time.monotonic() - inicio
+            self.metricas.registrar(nome_blob, len(dados), duracao, tentativas, status, sucesso)
+            print(f"📊 Upload {nome_blob}: {len(dados)/1024:.1f}KB em {duracao*1000:.0f}ms, "
+                  f"{tentativas} tentativa(s), status {status}")
+
+    def existe(self, nome_blob, timeout=None):
+        """HEAD no blob: True se já existe (sem permissão de leitura no SAS, responde False)"""
+        try:
+            response, _ = self.requisitar('HEAD', self.url_assinada(nome_blob), timeout=timeout)
+        except requests.exceptions.RequestException:
+            return False
+        response.close()
+        return response.status_code == 200
+
+    def put_block(self, nome_blob, id_bloco_b64, dados, timeout=None):
+        """Put Block: envia um bloco não confirmado; retorna (status, tentativas)"""
+        parametros = 'comp=block&blockid=' + requests.utils.quote(id_bloco_b64, safe='')
+        response, tentativas = self.requisitar('PUT', self.url_assinada(nome_blob, parametros), dados, None, timeout)
+        response.close()
+        if response.status_code != 201:
+            raise FalhaUploadBlob(f"Put Block {id_bloco_b64} respondeu {response.status_code}", response.status_code)
+        return response.status_code, tentativas
+
+    def put_block_list(self, nome_blob, ids_blocos, content_type='application/octet-stream', timeout=None,
+                       somente_se_novo=False):
+        """Put Block List: confirma os blocos na ordem dada; retorna (response, tentativas)"""
+        corpo = ('<?xml version="1.0" encoding="utf-8"?><BlockList>'
+                 + ''.join(f'<Latest>{escape(i)}</Latest>' for i in ids_blocos)
+                 + '</BlockList>').encode('utf-8')
+        headers = {
+            'Content-Type': 'application/xml',
+            'x-ms-blob-content-type': content_type
+        }
+        if somente_se_novo:
+            headers['If-None-Match'] = '*'
+        return self.requisitar('PUT', self.url_assinada(nome_blob, 'comp=blocklist'), corpo, headers, timeout)
+
+    def upload_em_blocos(self, nome_blob, dados, content_type='application/octet-stream', timeout=None,
+                         tamanho_bloco=BLOB_TAMANHO_BLOCO, paralelos=BLOB_BLOCOS_PARALELOS, somente_se_novo=False):
+        """Divide os dados em blocos, envia em paralelo (retry por bloco) e confirma com Put Block List
+
+        Os blocos são fatias (memoryview) do buffer original - nada é copiado.
+        Retorna o response do Put Block List; falha de um bloco levanta FalhaUploadBlob.
+        """
+        view = memoryview(dados).cast('B')
+        blocos = [(id_bloco(indice), view[inicio:inicio + tamanho_bloco])
+                  for indice, inicio in enumerate(range(0, len(view), tamanho_bloco))]
+
+        inicio = time.monotonic()
+        tentativas = len(blocos)
+        status = None
+        sucesso = False
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(paralelos, len(blocos))),
+                                    thread_name_prefix='blob-bloco') as executor:
+                futuros = [executor.submit(self.put_block, nome_blob, id_b64, fatia, timeout)
+                           for id_b64, fatia in blocos]
+                # result() propaga a primeira falha (os blocos restantes terminam antes do with sair)
+                tentativas = sum(futuro.result()[1] for futuro in futuros)
+
+            response, tentativas_commit = self.put_block_list(nome_blob, [id_b64 for id_b64, _ in blocos],
+                                                              content_type, timeout, somente_se_novo)
+            tentativas += tentativas_commit
+            status = response.status_code
+            sucesso = status in STATUS_GRAVADO or (somente_se_novo and blob_ja_existia(response))
+            return response
+        except FalhaUploadBlob as e:
+            status = e.status
+            raise
+        finally:
+            duracao = time.monotonic() - inicio
+            # Métricas contam retentativas: requisições além de uma por bloco + o commit
+            retentativas = max(0, tentativas - len(blocos) - 1)
+            self.metricas.registrar(nome_blob, len(view), duracao, retentativas + 1, status, sucesso)
+            print(f"📊 Upload em blocos {nome_blob}: {len(view)/1024:.1f}KB em {len(blocos)} bloco(s), "
+                  f"{duracao*1000:.0f}ms, {tentativas} requisição(ões), status {status}")
+
+    def enviar(self, nome_blob, dados, content_type='application/octet-stream', timeout=None, somente_se_novo=False):
+        """Escolhe Put Blob único ou upload em blocos paralelos conforme o tamanho"""
+        if len(dados) > BLOB_LIMITE_PUT_UNICO:
+            return self.upload_em_blocos(nome_blob, dados, content_type, timeout, somente_se_novo=somente_se_novo)
+        return self.put_blob(nome_blob, dados, content_type, timeout, somente_se_novo)
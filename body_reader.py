@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Leitura do corpo das requisições POST
+
+- Buffer pré-alocado com readinto/memoryview (sem cópias quadráticas)
+- Limite máximo de tamanho por rota, verificado ANTES de ler
+- Leitor em streaming para handlers que não precisam do body inteiro na memória
+"""
+import os
+import urllib.parse
+
+# Limite padrão para rotas JSON comuns
+LIMITE_BODY_PADRAO = int(os.getenv('MAX_BODY_BYTES', 1 * 1024 * 1024))  # 1MB
+
+# Limites por rota (rotas com imagens precisam de mais espaço)
+LIMITES_BODY_POR_ROTA = {
+    '/api/salvar-pedido': LIMITE_BODY_PADRAO,
+    '/upload-blob': int(os.getenv('MAX_UPLOAD_BYTES', 20 * 1024 * 1024)),  # 20MB
+    '/api/afericao-temperatura': int(os.getenv('MAX_AFERICAO_BYTES', 30 * 1024 * 1024)),  # 30MB (2 imagens base64)
+    '/api/aferição-temperatura': int(os.getenv('MAX_AFERICAO_BYTES', 30 * 1024 * 1024)),
+    '/api/afericoes-temperatura': int(os.getenv('MAX_AFERICAO_LOTE_BYTES', 60 * 1024 * 1024)),  # 60MB: lote com imagens base64
+}
+
+# Tamanho de cada leitura do socket
+TAMANHO_BLOCO_LEITURA = 64 * 1024
+
+
+class BodyMuitoGrande(Exception):
+    """Content-Length acima do limite permitido para a rota"""
+
+    def __init__(self, tamanho, limite):
+        super().__init__(f"Body de {tamanho} bytes excede o limite de {limite} bytes")
+        self.tamanho = tamanho
+        self.limite = limite
+
+
+def limite_para_rota(path):
+    """Retorna o tamanho máximo de body aceito para a rota
+
+    O cliente envia /api/aferição-temperatura como /api/aferi%C3%A7%C3%A3o-temperatura:
+    o caminho é decodificado antes da busca.
+    """
+    return LIMITES_BODY_POR_ROTA.get(urllib.parse.unquote(path), LIMITE_BODY_PADRAO)
+
+
+def obter_content_length(headers, limite):
+    """Lê e valida o Content-Length contra o limite da rota"""
+    try:
+        content_length = int(headers.get('Content-Length', 0))
+    except (TypeError, ValueError):
+        raise ValueError("Content-Length inválido")
+    if content_length < 0:
+        raise ValueError("Content-Length inválido")
+    if content_length > limite:
+        raise BodyMuitoGrande(content_length, limite)
+    return content_length
+
+
+def ler_body_completo(rfile, content_length):
+    """Lê exatamente content_length bytes para um bytearray pré-alocado"""
+    if content_length == 0:
+        return bytearray()
+
+    buffer = bytearray(content_length)
+    view = memoryview(buffer)
+    recebido = 0
+    try:
+        while recebido < content_length:
+            lidos = rfile.readinto(view[recebido:recebido + TAMANHO_BLOCO_LEITURA])
+            if not lidos:
+                break
+            recebido += lidos
+    finally:
+        view.release()
+
+    if recebido != content_length:
+        print(f"⚠️ Body incompleto: esperado {content_length} bytes, recebido {recebido} bytes")
+        del buffer[recebido:]
+
+    return buffer
+
+
+class LeitorBodyStream:
+    """Leitor limitado ao Content-Length, para consumir o body incrementalmente"""
+
+    def __init__(self, rfile, content_length):
+        self._rfile = rfile
+        self.content_length = content_length
+        self.restante = content_length
+
+    def readinto(self, destino):
+        """Lê para um buffer existente, sem passar do fim do body"""
+        if self.restante <= 0:
+            return 0
+        view = memoryview(destino)
+        try:
+            if len(view) > self.restante:
+                view = view[:self.restante]
+            lidos = self._rfile.readinto(view) or 0
+        finally:
+            view.release()
+        self.restante -= lidos
+        if lidos == 0:
+            # Cliente fechou antes do fim - não há mais nada para ler
+            self.restante = 0
+        return lidos
+
+    def read(self, tamanho=-1):
+        """Lê até `tamanho` bytes (ou o restante do body se negativo)"""
+        if self.restante <= 0:
+            return b''
+        if tamanho is None or tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self._rfile.read(tamanho)
+        self.restante -= len(dados)
+        if not dados:
+            self.restante = 0
+        return dados
+
+    def iter_blocos(self, tamanho=TAMANHO_BLOCO_LEITURA):
+        """Itera sobre o body em blocos"""
+        while True:
+            bloco = self.read(tamanho)
+            if not bloco:
+                return
+            yield bloco
+
+    def descartar(self):
+        """Consome o que sobrou do body (mantém a conexão keep-alive consistente)"""
+        while self.read(TAMANHO_BLOCO_LEITURA):
+            pass
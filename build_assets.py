@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Build dos arquivos estáticos para deploy (gera a pasta dist/)
+
+1. Gera nomes com hash de conteúdo (js/app-modules.js -> js/app-modules.<hash>.js, ícones, manifest.json)
+2. Reescreve as referências nos HTML/manifest para os nomes com hash
+3. Divide sistema-pedidos.html: CSS/JS inline viram bundles minificados com hash, só o CSS
+   crítico fica inline (ver asset_minify.py)
+4. Gera dist/sw.js com o manifesto de precache (URL + revisão por arquivo)
+5. Grava dist/asset-manifest.json (original -> nome com hash, preloads por página)
+
+Com STATIC_BUILD_DIR=dist o servidor serve dist/ primeiro (arquivos com hash como imutáveis) e cai
+para a raiz do projeto; sem a variável (desenvolvimento local) serve só os fontes.
+
+Uso: python build_assets.py [--origem DIR] [--destino DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from asset_minify import extrair_css_critico, minificar_css, minificar_html, minificar_js
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+DESTINO_PADRAO = os.path.join(RAIZ_PROJETO, 'dist')
+
+# Arquivos que recebem hash no nome - folhas primeiro (manifest.json referencia os ícones)
+ASSETS_COM_HASH = [
+    'icon_PR_otimizado.png',
+    'iconenovo.png',
+    'icon-32.svg',
+    'icon-180.svg',
+    'icon-192.svg',
+    'js/app-modules.js',
+    'manifest.json',
+]
+
+# Páginas mantêm o nome (são URLs de navegação) - só as referências são reescritas
+PAGINAS = [
+    'index.html',
+    'sistema-pedidos.html',
+]
+
+# Páginas cujos <style>/<script> inline viram arquivos separados (cacheáveis individualmente)
+PAGINAS_DIVIDIDAS = [
+    'sistema-pedidos.html',
+]
+
+# Entradas do precache sem arquivo correspondente (respostas de API)
+PRECACHE_EXTRA = [
+    '/api/teste-conexao',
+]
+
+SERVICE_WORKER = 'sw.js'
+MANIFESTO_ASSETS = 'asset-manifest.json'
+
+EXTENSOES_TEXTO = ('.html', '.js', '.json', '.css', '.svg')
+TAMANHO_HASH = 10
+
+PADRAO_PRECACHE = re.compile(r'/\* PRECACHE:INICIO \*/.*?/\* PRECACHE:FIM \*/', re.DOTALL)
+# Só blocos sem atributos (scripts com src/type/module ficam como estão)
+PADRAO_STYLE_INLINE = re.compile(r'<style>(.*?)</style>', re.DOTALL)
+PADRAO_SCRIPT_INLINE = re.compile(r'<script>(.*?)</script>', re.DOTALL)
+
+
+def hash_conteudo(conteudo):
+    """Hash curto do conteúdo (usado no nome do arquivo e como revisão)"""
+    return hashlib.sha256(conteudo).hexdigest()[:TAMANHO_HASH]
+
+
+def nome_com_hash(caminho, hash_arquivo):
+    """js/app-modules.js -> js/app-modules.<hash>.js"""
+    base, extensao = os.path.splitext(caminho)
+    return f'{base}.{hash_arquivo}{extensao}'
+
+
+def eh_texto(caminho):
+    return caminho.endswith(EXTENSOES_TEXTO)
+
+
+def reescrever_referencias(texto, mapa):
+    """Troca referências aos arquivos originais pelos nomes com hash
+
+    Só substitui referências delimitadas por aspas/parênteses (src="...", href='...', url(...)),
+    preservando prefixos "/" ou "./".
+    """
+    for original, novo in mapa.items():
+        padrao = re.compile(r'(?<=["\'(])(\s*(?:\.?/)?)' + re.escape(original) + r'(?=[?#"\')])')
+        texto = padrao.sub(lambda m: m.group(1) + novo, texto)
+    return texto
+
+
+def ler(origem, caminho):
+    with open(os.path.join(origem, caminho), 'rb') as arquivo:
+        return arquivo.read()
+
+
+def gravar(destino, caminho, conteudo):
+    completo = os.path.join(destino, caminho)
+    os.makedirs(os.path.dirname(completo), exist_ok=True)
+    with open(completo, 'wb') as arquivo:
+        arquivo.write(conteudo)
+
+
+class Build:
+    """Estado do build: mapa original -> nome final e revisões para o precache"""
+
+    def __init__(self, origem, destino):
+        self.origem = origem
+        self.destino = destino
+        self.mapa = {}          # caminho original -> caminho com hash
+        self.precache = []      # entradas {url, revision}
+        self.preloads = {}      # página -> [(url, as)] enviados como header Link
+
+    def conteudo_reescrito(self, caminho, conteudo=None):
+        if conteudo is None:
+            conteudo = ler(self.origem, caminho)
+        if eh_texto(caminho):
+            conteudo = reescrever_referencias(conteudo.decode('utf-8'), self.mapa).encode('utf-8')
+        return conteudo
+
+    def emitir_com_hash(self, caminho, conteudo=None):
+        """Grava o arquivo com hash no nome e registra no mapa/precache"""
+        conteudo = self.conteudo_reescrito(caminho, conteudo)
+        final = nome_com_hash(caminho, hash_conteudo(conteudo))
+        gravar(self.destino, final, conteudo)
+        self.mapa[caminho] = final
+        # URL com hash já é única por conteúdo - não precisa de revisão
+        self.precache.append({'url': '/' + final, 'revision': None})
+        return final
+
+    def emitir_pagina(self, caminho, conteudo=None):
+        """Grava a página com o nome original (referências reescritas) e revisão = hash"""
+        conteudo = self.conteudo_reescrito(caminho, conteudo)
+        gravar(self.destino, caminho, conteudo)
+        self.precache.append({'url': '/' + caminho, 'revision': hash_conteudo(conteudo)})
+        return caminho
+
+    def dividir_pagina(self, caminho):
+        """Extrai CSS/JS inline da página para bundles minificados com hash
+
+        - CSS: bundle completo carregado sem bloquear (preload + onload) e só o crítico inline
+        - JS: cada <script> inline vira um arquivo próprio, na mesma posição (ordem de execução igual)
+        Retorna o HTML resultante (a página é emitida depois, com as referências reescritas).
+        """
+        html = ler(self.origem, caminho).decode('utf-8')
+        base = os.path.splitext(os.path.basename(caminho))[0]
+        preloads = []
+
+        # HTML estático (sem scripts) para decidir o CSS crítico
+        cabecalho, _, corpo = html.partition('<body')
+        html_estatico = PADRAO_SCRIPT_INLINE.sub('', corpo)
+
+        css = '\n'.join(PADRAO_STYLE_INLINE.findall(html))
+        if css:
+            url_css = self.emitir_com_hash(f'css/{base}.css', minificar_css(css).encode('utf-8'))
+            critico = extrair_css_critico(css, html_estatico)
+            substituto = (
+                f'<style>{critico}</style>\n'
+                f'    <link rel="preload" href="{url_css}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+                f'    <noscript><link rel="stylesheet" href="{url_css}"></noscript>'
+            )
+            primeiro = [True]
+
+            def trocar_style(m):
+                if primeiro[0]:
+                    primeiro[0] = False
+                    return substituto
+                return ''
+
+            html = PADRAO_STYLE_INLINE.sub(trocar_style, html)
+            preloads.append(('/' + url_css, 'style'))
+
+        scripts_corpo = []
+        contador = [0]
+
+        def trocar_script(m):
+            contador[0] += 1
+            url_js = self.emitir_com_hash(f'js/{base}-{contador[0]}.js', minificar_js(m.group(1)).encode('utf-8'))
+            if m.start() > len(cabecalho):
+                scripts_corpo.append(url_js)
+            preloads.append(('/' + url_js, 'script'))
+            return f'<script src="{url_js}"></script>'
+
+        html = PADRAO_SCRIPT_INLINE.sub(trocar_script, html)
+
+        # Scripts do fim do <body>: começar o download já durante o parse do <head>
+        if scripts_corpo:
+            dicas = ''.join(f'    <link rel="preload" href="{url}" as="script">\n' for url in scripts_corpo)
+            html = html.replace('</head>', dicas + '</head>', 1)
+
+        self.preloads[caminho] = preloads
+        return minificar_html(html).encode('utf-8')
+
+    def emitir_service_worker(self):
+        """Injeta o manifesto de precache no sw.js"""
+        precache = self.precache + [{'url': url, 'revision': None} for url in PRECACHE_EXTRA]
+        versao = hash_conteudo(json.dumps(precache, sort_keys=True).encode('utf-8'))
+
+        entradas = ',\n'.join(f"    {{ url: {json.dumps(e['url'])}, revision: {json.dumps(e['revision'])} }}"
+                               for e in precache)
+        linhas = [f"const CACHE_NAME = 'refeicoes-pwa-{versao}';",
+                  'const PRECACHE_MANIFEST = [\n' + entradas + '\n];']
+        bloco = '/* PRECACHE:INICIO */\n' + '\n'.join(linhas) + '\n/* PRECACHE:FIM */'
+
+        sw = ler(self.origem, SERVICE_WORKER).decode('utf-8')
+        if not PADRAO_PRECACHE.search(sw):
+            raise RuntimeError(f"Marcadores PRECACHE não encontrados em {SERVICE_WORKER}")
+        sw = PADRAO_PRECACHE.sub(lambda m: bloco, sw)
+        gravar(self.destino, SERVICE_WORKER, sw.encode('utf-8'))
+        return versao
+
+    def emitir_manifesto(self, versao):
+        manifesto = {'versao': versao, 'assets': self.mapa, 'preloads': self.preloads}
+        gravar(self.destino, MANIFESTO_ASSETS,
+               json.dumps(manifesto, indent=2, ensure_ascii=False).encode('utf-8'))
+
+
+def construir(origem=RAIZ_PROJETO, destino=DESTINO_PADRAO):
+    """Executa o build completo e retorna o objeto Build"""
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+
+    build = Build(origem, destino)
+    for caminho in ASSETS_COM_HASH:
+        build.emitir_com_hash(caminho)
+    for caminho in PAGINAS:
+        conteudo = build.dividir_pagina(caminho) if caminho in PAGINAS_DIVIDIDAS else None
+        build.emitir_pagina(caminho, conteudo)
+    versao = build.emitir_service_worker()
+    build.emitir_manifesto(versao)
+    return build, versao
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build dos arquivos estáticos (hash + precache do service worker)')
+    parser.add_argument('--origem', default=RAIZ_PROJETO)
+    parser.add_argument('--destino', default=DESTINO_PADRAO)
+    args = parser.parse_args()
+
+    build, versao = construir(args.origem, args.destino)
+    print(f"📦 Build de assets concluído: {args.destino}")
+    for original, final in build.mapa.items():
+        print(f"   {original} -> {final}")
+    print(f"💾 Precache: {len(build.precache)} arquivos - CACHE_NAME refeicoes-pwa-{versao}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compressão negociada (Accept-Encoding) das respostas: gzip e brotli opcional
+
+O brotli só é usado se o pacote `brotli` estiver instalado.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional
+    brotli = None
+
+# Respostas menores que isso não compensam a compressão
+COMPRESSAO_MIN_BYTES = int(os.getenv('COMPRESSAO_MIN_BYTES', 1024))
+
+# Níveis ajustáveis (gzip: 1-9, brotli: 0-11)
+GZIP_NIVEL = int(os.getenv('GZIP_NIVEL', 6))
+BROTLI_NIVEL = int(os.getenv('BROTLI_NIVEL', 5))
+
+# Ordem de preferência quando o cliente aceita vários com o mesmo peso
+ENCODINGS_SUPORTADOS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _parse_accept_encoding(accept_encoding):
+    """Converte o header Accept-Encoding em {encoding: qvalue}"""
+    pesos = {}
+    for item in (accept_encoding or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        partes = item.split(';')
+        nome = partes[0].strip().lower()
+        q = 1.0
+        for param in partes[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        pesos[nome] = q
+    return pesos
+
+
+def negociar_encoding(accept_encoding, encodings=ENCODINGS_SUPORTADOS):
+    """Escolhe o melhor encoding aceito pelo cliente (ou None para identity)"""
+    pesos = _parse_accept_encoding(accept_encoding)
+    if not pesos:
+        return None
+
+    melhor = None
+    melhor_q = 0.0
+    for encoding in encodings:
+        q = pesos.get(encoding, pesos.get('*', 0.0))
+        if q > melhor_q:
+            melhor, melhor_q = encoding, q
+    return melhor
+
+
+def comprimir(dados, encoding):
+    """Comprime os bytes com o encoding escolhido"""
+    if encoding == 'gzip':
+        # mtime=0 para saída determinística (mesmo conteúdo -> mesmos bytes)
+        return gzip.compress(dados, compresslevel=GZIP_NIVEL, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(dados, quality=BROTLI_NIVEL)
+    raise ValueError(f"Encoding não suportado: {encoding}")
+
+
+def comprimir_resposta(dados, accept_encoding, min_bytes=COMPRESSAO_MIN_BYTES):
+    """Retorna (corpo, content_encoding) já negociado; content_encoding None = sem compressão"""
+    if len(dados) < min_bytes:
+        return dados, None
+
+    encoding = negociar_encoding(accept_encoding)
+    if encoding is None:
+        return dados, None
+
+    comprimido = comprimir(dados, encoding)
+    if len(comprimido) >= len(dados):
+        return dados, None
+    return comprimido, encoding
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Diário local de pedidos (write-behind) para /api/salvar-pedido
+
+Com PEDIDOS_WRITE_BEHIND=1 o pedido é validado, gravado num SQLite local (WAL, fsync a cada
+commit) e confirmado na hora com um ID provisório. Uma thread grava os pendentes em PEDIDOS
+em lotes (mesmo caminho de /api/salvar-pedidos) e registra o ID real de cada um; o status
+pode ser consultado em /api/status-pedido?id=<id provisório>.
+
+O diário sobrevive a reinícios: pendentes de uma execução anterior são gravados na próxima
+varredura. Cada pedido vai para o banco com o ID provisório como idempotency_key, então se o
+processo morrer entre o COMMIT no Azure SQL e a marcação local, o reenvio devolve o resultado
+já registrado em vez de inserir de novo.
+
+Lote recusado pelo SQL é refeito item a item, para que um pedido inválido não segure os outros;
+depois de DIARIO_MAX_TENTATIVAS recusas o pedido fica com status 'falhou' e sai da fila. Com o
+banco fora do ar (gravar_lote levanta BancoIndisponivel) o lote inteiro só espera o backoff: refazer
+item a item multiplicaria os timeouts de conexão, e queda do banco não conta para o 'falhou'.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+PEDIDOS_WRITE_BEHIND = os.getenv('PEDIDOS_WRITE_BEHIND', '0').lower() in ('1', 'true', 'sim')
+DIARIO_PEDIDOS_ARQUIVO = os.getenv('DIARIO_PEDIDOS_ARQUIVO', os.path.join(RAIZ_PROJETO, 'diario_pedidos.sqlite3'))
+DIARIO_INTERVALO = float(os.getenv('DIARIO_INTERVALO', 2))        # segundos entre gravações
+DIARIO_LOTE = int(os.getenv('DIARIO_LOTE', 20))
+DIARIO_BACKOFF_MAX = float(os.getenv('DIARIO_BACKOFF_MAX', 300))
+# Recusas do SQL (não quedas do banco) até o pedido desistir
+DIARIO_MAX_TENTATIVAS = int(os.getenv('DIARIO_MAX_TENTATIVAS', 12))
+# Pedidos já gravados ficam no diário por este tempo (consulta de status) e depois são apagados
+DIARIO_RETENCAO = float(os.getenv('DIARIO_RETENCAO', 7 * 24 * 3600))
+
+STATUS_PENDENTE = 'pendente'
+STATUS_GRAVADO = 'gravado'
+STATUS_FALHOU = 'falhou'
+
+
+class BancoIndisponivel(Exception):
+    """gravar_lote não conseguiu falar com o banco (conexão/timeout) - nada foi recusado pelo SQL"""
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    id_provisorio TEXT PRIMARY KEY,
+    criado_em REAL NOT NULL,
+    dados TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pedido_id INTEGER,
+    resposta TEXT,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa REAL NOT NULL DEFAULT 0,
+    ultimo_erro TEXT,
+    atualizado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pedidos_status ON pedidos (status, proxima_tentativa);
+"""
+
+
+class DiarioPedidos:
+    """Diário SQLite + thread de gravação em lote no Azure SQL"""
+
+    def __init__(self, arquivo=DIARIO_PEDIDOS_ARQUIVO, intervalo=DIARIO_INTERVALO, lote=DIARIO_LOTE):
+        self.arquivo = arquivo
+        self.intervalo = intervalo
+        self.lote = lote
+        # Uma conexão compartilhada (check_same_thread=False) protegida por lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(arquivo, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(ESQUEMA)
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self.gravados = 0
+        self.falhas = 0
+
+    def registrar(self, pedido_data):
+        """Grava o pedido no diário (durável ao retornar); retorna o ID provisório"""
+        id_provisorio = 'prov-' + uuid.uuid4().hex
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pedidos (id_provisorio, criado_em, dados, status, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+                (id_provisorio, agora, json.dumps(pedido_data, ensure_ascii=False), STATUS_PENDENTE, agora))
+        self._acordar.set()
+        return id_provisorio
+
+    def obter(self, id_provisorio):
+        """Status de um pedido do diário (ou None se não existe)"""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT status, pedido_id, resposta, tentativas, ultimo_erro, criado_em, atualizado_em "
+                "FROM pedidos WHERE id_provisorio = ?", (id_provisorio,)).fetchone()
+        if linha is None:
+            return None
+        status, pedido_id, resposta, tentativas, ultimo_erro, criado_em, atualizado_em = linha
+        return {
+            "id_provisorio": id_provisorio,
+            "status": status,
+            "pedido_id": pedido_id,
+            "resposta": json.loads(resposta) if resposta else None,
+            "tentativas": tentativas,
+            "ultimo_erro": ultimo_erro,
+            "criado_em": criado_em,
+            "atualizado_em": atualizado_em,
+        }
+
+    def _pendentes_vencidos(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id_provisorio, dados, tentativas FROM pedidos "
+                "WHERE status = ? AND proxima_tentativa <= ? ORDER BY criado_em LIMIT ?",
+                (STATUS_PENDENTE, time.time(), self.lote)).fetchall()
+
+    @staticmethod
+    def _gravar(gravar_lote, pedidos):
+        try:
+            return gravar_lote(pedidos)
+        except BancoIndisponivel as e:
+            return [{"error": True, "message": f"Banco indisponível: {e}", "indisponivel": True}] * len(pedidos)
+        except Exception as e:
+            return [{"error": True, "message": str(e)}] * len(pedidos)
+
+    def _gravar_um_a_um(self, gravar_lote, pedidos):
+        resultados = []
+        for posicao, pedido in enumerate(pedidos):
+            resultado = self._gravar(gravar_lote, [pedido])[0]
+            if resultado.get('indisponivel'):
+                # O banco caiu no meio: o resto espera o backoff sem novas tentativas agora
+                return resultados + [resultado] * (len(pedidos) - posicao)
+            resultados.append(resultado)
+        return resultados
+
+    def gravar_pendentes(self, gravar_lote):
+        """Grava um lote de pendentes; retorna quantos foram confirmados no banco
+
+        gravar_lote(lista_de_pedidos) -> lista de respostas por item (formato de /api/salvar-pedidos)
+        """
+        linhas = self._pendentes_vencidos()
+        if not linhas:
+            return 0
+
+        # O ID provisório é a chave de idempotência: reenvio após queda não duplica o pedido
+        pedidos = [dict(json.loads(dados), idempotency_key=id_provisorio) for id_provisorio, dados, _ in linhas]
+        resultados = self._gravar(gravar_lote, pedidos)
+        if resultados and resultados[0].get('indisponivel'):
+            print(f"📒 Diário de pedidos: banco indisponível, lote de {len(linhas)} aguarda nova tentativa")
+        elif len(linhas) > 1 and all(resultado.get('error') for resultado in resultados):
+            # O lote é um único comando: uma linha recusada derruba todas - refaz item a item
+            print(f"📒 Diário de pedidos: lote de {len(linhas)} falhou, gravando um a um")
+            resultados = self._gravar_um_a_um(gravar_lote, pedidos)
+
+        agora = time.time()
+        gravados = 0
+        falharam = 0
+        with self._lock:
+            self._conn.execute('BEGIN')
+            for (id_provisorio, _, tentativas), resultado in zip(linhas, resultados):
+                if not resultado.get('error'):
+                    gravados += 1
+                    self._conn.execute(
+                        "UPDATE pedidos SET status = ?, pedido_id = ?, resposta = ?, ultimo_erro = NULL, "
+                        "atualizado_em = ? WHERE id_provisorio = ?",
+                        (STATUS_GRAVADO, resultado.get('pedido_id'), json.dumps(resultado, ensure_ascii=False),
+                         agora, id_provisorio))
+                else:
+                    espera = min(DIARIO_BACKOFF_MAX, self.intervalo * (2 ** tentativas))
+                    # Recusado sem mais tentativas: fica no diário como 'falhou' (fora da fila) para análise
+                    recusado = not resultado.get('indisponivel')
+                    status = STATUS_FALHOU if recusado and tentativas + 1 >= DIARIO_MAX_TENTATIVAS else STATUS_PENDENTE
+                    falharam += status == STATUS_FALHOU
+                    self._conn.execute(
+                        "UPDATE pedidos SET status = ?, tentativas = tentativas + 1, proxima_tentativa = ?, "
+                        "ultimo_erro = ?, atualizado_em = ? WHERE id_provisorio = ?",
+                        (status, agora + espera, str(resultado.get('message'))[:500], agora, id_provisorio))
+            # Limpeza dos já gravados há mais tempo que a retenção
+            self._conn.execute("DELETE FROM pedidos WHERE status = ? AND atualizado_em < ?",
+                               (STATUS_GRAVADO, agora - DIARIO_RETENCAO))
+            self._conn.execute('COMMIT')
+            self.gravados += gravados
+            self.falhas += len(linhas) - gravados
+
+        print(f"📒 Diário de pedidos: {gravados}/{len(linhas)} gravados no banco")
+        if falharam:
+            print(f"❌ Diário de pedidos: {falharam} pedido(s) desistido(s) após {DIARIO_MAX_TENTATIVAS} tentativas")
+        return gravados
+
+    def iniciar(self, gravar_lote):
+        """Inicia a thread de gravação (pendentes de execuções anteriores entram na 1ª varredura)"""
+        if self._thread is not None:
+            return
+        pendentes = self.estatisticas()['pendentes']
+        if pendentes:
+            print(f"📒 Diário de pedidos: {pendentes} pedido(s) pendente(s) de execuções anteriores")
+
+        def trabalhar():
+            while True:
+                try:
+                    # Lotes cheios seguidos enquanto houver fila; senão espera o intervalo
+                    while self.gravar_pendentes(gravar_lote) >= self.lote:
+                        pass
+                except Exception as e:
+                    print(f"❌ Erro na gravação do diário de pedidos: {e}")
+                if self._parar.is_set():
+                    break  # A última varredura acima já rodou depois do pedido de parada
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+
+        self._thread = threading.Thread(target=trabalhar, name='diario-pedidos', daemon=True)
+        self._thread.start()
+
+    def encerrar(self, timeout=10):
+        """Tenta gravar o que falta e para a thread"""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._lock:
+            contagem = dict(self._conn.execute("SELECT status, COUNT(*) FROM pedidos GROUP BY status").fetchall())
+            mais_antigo = self._conn.execute("SELECT MIN(criado_em) FROM pedidos WHERE status = ?",
+                                             (STATUS_PENDENTE,)).fetchone()[0]
+        return {
+            "pendentes": contagem.get(STATUS_PENDENTE, 0),
+            "gravados_retidos": contagem.get(STATUS_GRAVADO, 0),
+            "falharam": contagem.get(STATUS_FALHOU, 0),
+            "pendente_mais_antigo": mais_antigo,
+            "gravados": self.gravados,
+            "falhas": self.falhas,
+        }
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Esquema declarativo do pedido (/api/salvar-pedido, /api/salvar-pedidos e write-behind)
+
+Cada coluna do INSERT em PEDIDOS é descrita uma vez em CAMPOS_PEDIDO: de qual chave do JSON vem,
+o valor padrão e a conversão. O esquema é compilado na importação numa tupla de passos
+(chaves, padrão, conversor) com as expressões regulares já compiladas; montar() valida,
+normaliza e gera a tupla de parâmetros na ordem de COLUNAS_PEDIDO_INSERT numa única passada.
+"""
+import re
+
+# Texto fixo gravado em APROVADO_POR
+APROVADO_POR = 'ELAINE KLUG'
+
+# COLABORADORES: só ASCII e Latin-1/Latin Extended-A (remove emojis, ícones e surrogates soltos)
+PADRAO_CARACTERES_INVALIDOS = re.compile(r'[^\x00-\x7F\u00C0-\u017F]')
+
+
+class Campo:
+    """Uma coluna do INSERT
+
+    chaves: chave do JSON ou tupla de alternativas (vale a primeira presente no pedido).
+    conversor: função aplicada ao valor (float, int, limpeza de texto); erros viram ValueError.
+    derivado/depende: coluna calculada = derivado(*valores das colunas em depende).
+    """
+
+    def __init__(self, coluna, chaves=None, padrao='', conversor=None, obrigatorio=False,
+                 constante=None, derivado=None, depende=()):
+        self.coluna = coluna
+        self.chaves = (chaves,) if isinstance(chaves, str) else tuple(chaves or ())
+        self.padrao = padrao
+        self.conversor = conversor
+        self.obrigatorio = obrigatorio
+        self.constante = constante
+        self.derivado = derivado
+        self.depende = depende
+
+
+def texto_aparado(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def limpar_nomes_colaboradores(valor):
+    """Remove emojis/símbolos dos nomes e normaliza espaços"""
+    if not valor:
+        return valor
+    return ' '.join(PADRAO_CARACTERES_INVALIDOS.sub('', valor).split())
+
+
+def _total_pagar(valor_pago, total_colaboradores):
+    # APENAS VALOR_PAGO × TOTAL_COLABORADORES (a diária do hotel NÃO entra no total;
+    # TOTAL_COLABORADORES já inclui selecionados + a contratar + outros)
+    return valor_pago * total_colaboradores
+
+
+# Ordem = ordem das colunas no INSERT (FECHAMENTO fica de fora: preenchido pela TRIGGER do SQL)
+CAMPOS_PEDIDO = (
+    Campo('DATA_RETIRADA', 'data_retirada', None, obrigatorio=True),
+    Campo('PROJETO', 'projeto'),
+    Campo('COORDENADOR', 'coordenador'),
+    Campo('SUPERVISOR', 'supervisor'),
+    Campo('LIDER', 'equipe'),                                              # equipe digitada (ex: 700AA)
+    Campo('NOME_LIDER', ('nome_lider_organograma', 'solicitante'), 'N/A'),  # nome do líder (organograma)
+    Campo('FAZENDA', 'fazenda_digitada', conversor=texto_aparado),         # apenas o que o usuário digitou
+    Campo('TIPO_REFEICAO', 'tipo_refeicao', 'N/A'),
+    Campo('CIDADE_PRESTACAO_DO_SERVICO', 'cidade_prestacao_servico'),
+    Campo('FORNECEDOR', 'fornecedor', 'N/A'),
+    Campo('VALOR_PAGO', 'valor_pago', 0, float),
+    Campo('COLABORADORES', 'colaboradores_nomes_limpos', conversor=limpar_nomes_colaboradores),
+    Campo('TOTAL_COLABORADORES', 'total_colaboradores', 1, int),
+    Campo('A_CONTRATAR', 'a_contratar', 0, int),
+    Campo('RESPONSAVEL_PELO_CARTAO', 'responsavel_cartao'),
+    Campo('PAGCORP', 'pagcorp_numero'),                                    # número digitado pelo usuário
+    Campo('HOSPEDADO', 'hospedado_real', 'NÃO'),
+    Campo('NOME_DO_HOTEL', 'nome_hotel_real'),
+    Campo('VALOR_DIARIA', 'valor_diaria_real', 0, float),
+    Campo('TOTAL_PAGAR', derivado=_total_pagar, depende=('VALOR_PAGO', 'TOTAL_COLABORADORES')),
+    Campo('APROVADO_POR', constante=APROVADO_POR),
+    Campo('OBSERVACOES', 'observacoes'),
+    Campo('AFERIU_TEMPERATURA', 'aferiu_temperatura'),                     # vem do frontend
+)
+
+# Campos devolvidos na resposta da API
+COLUNAS_RESUMO = {
+    'tipo_refeicao': 'TIPO_REFEICAO',
+    'total_pagar': 'TOTAL_PAGAR',
+    'aferiu_temperatura': 'AFERIU_TEMPERATURA',
+}
+
+_AUSENTE = object()
+
+
+class EsquemaPedido:
+    """CAMPOS_PEDIDO compilados: montar(pedido_data) -> (parametros, resumo)
+
+    A compilação separa os campos em passos especializados, para que montar() faça o mínimo
+    por requisição: uma leitura .get() por coluna e só depois os poucos campos com alternativas,
+    obrigatoriedade, conversão ou cálculo.
+    """
+
+    def __init__(self, campos=CAMPOS_PEDIDO, resumo=COLUNAS_RESUMO):
+        self.colunas = tuple(campo.coluna for campo in campos)
+        posicoes = {coluna: i for i, coluna in enumerate(self.colunas)}
+        # 1ª chave e padrão de cada coluna (constantes: chave None, que nunca existe num JSON)
+        self._leituras = tuple(
+            (c.chaves[0] if c.chaves else None,
+             _AUSENTE if len(c.chaves) > 1 else (c.constante if c.constante is not None else c.padrao))
+            for c in campos
+        )
+        self._alternativas = tuple((posicoes[c.coluna], c.chaves[1:], c.padrao) for c in campos if len(c.chaves) > 1)
+        self._obrigatorios = tuple((posicoes[c.coluna], c.chaves[0]) for c in campos if c.obrigatorio)
+        self._conversoes = tuple((posicoes[c.coluna], c.conversor, c.chaves[0]) for c in campos if c.conversor)
+        self._derivados = tuple(
+            (posicoes[c.coluna], c.derivado, tuple(posicoes[d] for d in c.depende)) for c in campos if c.derivado
+        )
+        self._resumo = tuple((chave, posicoes[coluna]) for chave, coluna in resumo.items())
+
+    def montar(self, pedido_data):
+        """Valida e normaliza o pedido; retorna (parametros na ordem de self.colunas, resumo)
+
+        Levanta ValueError (com o nome do campo) para obrigatórios ausentes e valores inválidos.
+        """
+        if not isinstance(pedido_data, dict):
+            raise ValueError("pedido deve ser um objeto JSON")
+        obter = pedido_data.get
+        valores = [obter(chave, padrao) for chave, padrao in self._leituras]
+
+        for posicao, alternativas, padrao in self._alternativas:
+            if valores[posicao] is _AUSENTE:
+                valores[posicao] = padrao
+                for chave in alternativas:
+                    if chave in pedido_data:
+                        valores[posicao] = pedido_data[chave]
+                        break
+        for posicao, nome in self._obrigatorios:
+            if not valores[posicao]:
+                raise ValueError(f"{nome} é obrigatória")
+        for posicao, conversor, nome in self._conversoes:
+            try:
+                valores[posicao] = conversor(valores[posicao])
+            except (TypeError, ValueError):
+                raise ValueError(f"{nome} inválido: {valores[posicao]!r}")
+        for posicao, derivado, dependencias in self._derivados:
+            valores[posicao] = derivado(*[valores[d] for d in dependencias])
+
+        return tuple(valores), {chave: valores[posicao] for chave, posicao in self._resumo}
+
+
+ESQUEMA_PEDIDO = EsquemaPedido()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Pub/sub em memória para as pendências de aferição (Server-Sent Events)
+
+/api/eventos-pendencias?equipe=<LIDER> mantém a conexão aberta e recebe:
+- 'adicionado' quando /api/salvar-pedido (ou o lote) grava um MARMITEX que precisa de aferição
+- 'removido' quando uma aferição (individual ou em lote) marca o pedido como aferido
+
+Cada assinante tem uma fila limitada; a thread da conexão fica bloqueada nela e só acorda
+para eventos ou para o heartbeat (comentário SSE), então clientes parados quase não gastam CPU.
+Assinante lento que enche a fila é desconectado - o EventSource reconecta sozinho e o
+frontend recarrega a lista completa. O número total de assinantes é limitado porque cada
+conexão ocupa uma thread do ThreadingTCPServer.
+
+Os eventos existem só neste processo (sem replay): o estado de verdade continua sendo a
+consulta de /api/pedidos-pendentes-temperatura, feita a cada (re)conexão.
+"""
+import json
+import os
+import queue
+import threading
+
+from pedidos_recentes import chave_equipe
+
+SSE_MAX_ASSINANTES = int(os.getenv('SSE_MAX_ASSINANTES', 200))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 25))        # segundos (proxies do Railway cortam em ~60s)
+SSE_FILA_ASSINANTE = int(os.getenv('SSE_FILA_ASSINANTE', 100))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 5000))           # intervalo de reconexão sugerido ao navegador
+
+EVENTO_ADICIONADO = 'adicionado'
+EVENTO_REMOVIDO = 'removido'
+# Mensagem vazia na fila = encerrar a conexão (desligamento do servidor)
+FIM = b''
+
+
+class LimiteAssinantes(Exception):
+    """SSE_MAX_ASSINANTES conexões já abertas"""
+
+
+def formatar_evento(evento, dados, id_evento=None):
+    """Mensagem no formato text/event-stream"""
+    linhas = []
+    if id_evento is not None:
+        linhas.append(f'id: {id_evento}')
+    linhas.append(f'event: {evento}')
+    linhas.append('data: ' + json.dumps(dados, ensure_ascii=False, default=str))
+    return ('\n'.join(linhas) + '\n\n').encode('utf-8')
+
+
+class Assinatura:
+    """Fila de uma conexão SSE"""
+
+    def __init__(self, equipe, tamanho_fila):
+        self.equipe = chave_equipe(equipe)
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.transbordou = False
+
+    def proxima(self, timeout):
+        """Próxima mensagem (bytes) ou None se o timeout passou sem eventos"""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class BarramentoPendencias:
+    """equipe -> assinaturas; publicar() nunca bloqueia quem grava o pedido"""
+
+    def __init__(self, maximo=SSE_MAX_ASSINANTES, tamanho_fila=SSE_FILA_ASSINANTE):
+        self.maximo = maximo
+        self.tamanho_fila = tamanho_fila
+        self._lock = threading.Lock()
+        self._assinaturas = {}     # equipe -> set(Assinatura)
+        self._total = 0
+        self._sequencia = 0
+        self.publicados = 0
+        self.recusados = 0
+        self.desconectados_lentos = 0
+        self.encerrado = False
+
+    def assinar(self, equipe):
+        with self._lock:
+            if self.encerrado:
+                raise LimiteAssinantes("Servidor em desligamento")
+            if self._total >= self.maximo:
+                self.recusados += 1
+                raise LimiteAssinantes(f"Limite de {self.maximo} conexões de eventos atingido")
+            assinatura = Assinatura(equipe, self.tamanho_fila)
+            self._assinaturas.setdefault(assinatura.equipe, set()).add(assinatura)
+            self._total += 1
+            return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.equipe)
+            if assinaturas is None or assinatura not in assinaturas:
+                return
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del self._assinaturas[assinatura.equipe]
+            self._total -= 1
+
+    def publicar(self, equipe, evento, dados):
+        """Entrega o evento a todos os assinantes da equipe; retorna quantos receberam"""
+        equipe = chave_equipe(equipe)
+        if not equipe:
+            return 0
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(equipe, ()))
+            if not assinaturas:
+                return 0
+            self._sequencia += 1
+            self.publicados += 1
+            mensagem = formatar_evento(evento, dados, self._sequencia)
+        entregues = 0
+        for assinatura in assinaturas:
+            try:
+                assinatura.fila.put_nowait(mensagem)
+                entregues += 1
+            except queue.Full:
+                # Cliente não está lendo: a conexão é encerrada e ele reconecta com a lista completa
+                if not assinatura.transbordou:
+                    assinatura.transbordou = True
+                    with self._lock:
+                        self.desconectados_lentos += 1
+        return entregues
+
+    def encerrar(self):
+        """Acorda todas as conexões para que terminem (o ThreadingTCPServer espera as threads)"""
+        with self._lock:
+            self.encerrado = True
+            assinaturas = [a for conjunto in self._assinaturas.values() for a in conjunto]
+        for assinatura in assinaturas:
+            try:
+                assinatura.fila.put_nowait(FIM)
+            except queue.Full:
+                assinatura.transbordou = True
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "assinantes": self._total,
+                "equipes": len(self._assinaturas),
+                "maximo": self.maximo,
+                "publicados": self.publicados,
+                "recusados": self.recusados,
+                "desconectados_lentos": self.desconectados_lentos,
+            }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Exportação de PEDIDOS em streaming (/api/exportar-pedidos) como CSV ou NDJSON
+
+As linhas são lidas do cursor do banco com fetchmany (EXPORTACAO_LOTE por vez) e cada lote vira
+um pedaço da resposta, comprimido em gzip de forma incremental quando pedido. Nada acumula a
+exportação inteira: a memória é a de um lote, seja o período de mil ou de um milhão de pedidos.
+O cabeçalho (linha de colunas do CSV) sai antes mesmo da consulta, então o download começa na hora.
+
+Filtros e lista de colunas são os mesmos do histórico (historico_pedidos.montar_filtros),
+com data_inicio e data_fim obrigatórias.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from compression import GZIP_NIVEL
+from historico_pedidos import (
+    COLUNAS_HISTORICO, ConsultaHistoricoInvalida, montar_filtros, resolver_campos, valor_parametro,
+)
+
+EXPORTACAO_LOTE = int(os.getenv('EXPORTACAO_LOTE', 1000))   # linhas por fetchmany / pedaço enviado
+
+FORMATOS = {
+    # formato: (Content-Type, extensão)
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+# O Excel (pt-BR) só reconhece UTF-8 com BOM e separa colunas por ';'
+BOM_UTF8 = '\ufeff'
+SEPARADOR_CSV = ';'
+
+
+def montar_consulta_exportacao(parametros):
+    """parse_qs da URL -> (query, params, campos, formato)
+
+    formato: csv (padrão) ou ndjson; campos: como em /api/pedidos (padrão: todas as colunas).
+    """
+    formato = valor_parametro(parametros, 'formato').lower() or 'csv'
+    if formato not in FORMATOS:
+        raise ConsultaHistoricoInvalida(f"formato deve ser {' ou '.join(FORMATOS)}")
+    if not valor_parametro(parametros, 'data_inicio') or not valor_parametro(parametros, 'data_fim'):
+        raise ConsultaHistoricoInvalida("data_inicio e data_fim são obrigatórias na exportação")
+
+    texto_campos = valor_parametro(parametros, 'campos')
+    campos = resolver_campos(texto_campos) if texto_campos else COLUNAS_HISTORICO
+    condicoes, params = montar_filtros(parametros)
+    # montar_filtros termina com o intervalo [data_inicio, data_fim + 1 dia)
+    if params[-2] >= params[-1]:
+        raise ConsultaHistoricoInvalida("data_fim deve ser igual ou posterior a data_inicio")
+
+    # Ordem crescente: o arquivo lê como uma linha do tempo
+    query = f"""
+    SELECT {', '.join(campos)}
+    FROM PEDIDOS
+    WHERE {' AND '.join(condicoes)}
+    ORDER BY DATA_RETIRADA, ID
+    """
+    return query, params, campos, formato
+
+
+def nome_arquivo(parametros, formato):
+    inicio = valor_parametro(parametros, 'data_inicio')
+    fim = valor_parametro(parametros, 'data_fim')
+    return f"pedidos_{inicio}_{fim}.{FORMATOS[formato][1]}"
+
+
+def _valor_json(valor):
+    # Datas como ISO sem conversão de fuso, igual a historico_pedidos.serializar_linha
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+class CodificadorCSV:
+    """Lote de tuplas -> bytes CSV (um StringIO reaproveitado entre os lotes)"""
+
+    def __init__(self, campos):
+        self.campos = campos
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, delimiter=SEPARADOR_CSV, lineterminator='\r\n')
+
+    def _esvaziar(self):
+        texto = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return texto.encode('utf-8')
+
+    def cabecalho(self):
+        self._buffer.write(BOM_UTF8)
+        self._escritor.writerow(self.campos)
+        return self._esvaziar()
+
+    def lote(self, linhas):
+        self._escritor.writerows([_valor_csv(valor) for valor in linha] for linha in linhas)
+        return self._esvaziar()
+
+
+class CodificadorNDJSON:
+    """Lote de tuplas -> bytes NDJSON (um objeto JSON por linha)"""
+
+    def __init__(self, campos):
+        self.campos = campos
+        self._json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_valor_json)
+
+    def cabecalho(self):
+        return b''
+
+    def lote(self, linhas):
+        campos, codificar = self.campos, self._json.encode
+        return ''.join(
+            codificar(dict(zip(campos, linha))) + '\n' for linha in linhas
+        ).encode('utf-8')
+
+
+CODIFICADORES = {'csv': CodificadorCSV, 'ndjson': CodificadorNDJSON}
+
+
+class CompressorGzip:
+    """gzip incremental: cada pedaço sai comprimido e com flush, sem esperar o fim do arquivo"""
+
+    def __init__(self, nivel=GZIP_NIVEL):
+        self._compressor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def pedaco(self, dados):
+        # Z_SYNC_FLUSH: o cliente consegue descomprimir tudo o que já chegou
+        return self._compressor.compress(dados) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def exportar(cursor, query, params, campos, formato, escrever, gzip=False, lote=EXPORTACAO_LOTE):
+    """Executa a consulta e envia o resultado em pedaços via escrever(bytes); retorna o nº de linhas
+
+    cursor: cursor DB-API com linhas em tupla (na ordem de campos). O cabeçalho é enviado antes
+    do execute, para o cliente receber os primeiros bytes enquanto o banco prepara o resultado.
+    """
+    codificador = CODIFICADORES[formato](campos)
+    compressor = CompressorGzip() if gzip else None
+
+    def enviar(dados):
+        if compressor is not None:
+            dados = compressor.pedaco(dados)
+        if dados:
+            escrever(dados)
+
+    enviar(codificador.cabecalho())
+    cursor.execute(query, tuple(params))
+    total = 0
+    while True:
+        linhas = cursor.fetchmany(lote)
+        if not linhas:
+            break
+        total += len(linhas)
+        enviar(codificador.lote(linhas))
+    if compressor is not None:
+        escrever(compressor.finalizar())
+    return total
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita o subconjunto da API REST do Azure Blob usado pelo servidor
+
+Operações: Put Blob, Put Block (comp=block), Put Block List (comp=blocklist), HEAD e GET.
+Put Blob / Put Block List com If-None-Match: * respondem 409 BlobAlreadyExists se o blob existe.
+Permite injetar latência e falhas (503) para medir o pipeline de upload sem conta de storage.
+
+Uso direto:
+    python fake_blob.py --porta 10000 --latencia 0.05 --falhas 0.1
+    AZURE_BLOB_ENDPOINT=http://127.0.0.1:10000 AZURE_STORAGE_ACCOUNT=local \\
+    AZURE_STORAGE_CONTAINER=fotos AZURE_SAS_TOKEN=sv=local python server.py
+"""
+import argparse
+import http.server
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+PADRAO_BLOCO_LISTA = re.compile(rb'<(?:Latest|Committed|Uncommitted)>([^<]*)</')
+
+
+class ArmazenamentoFalso:
+    """Blobs confirmados e blocos pendentes, em memória (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.blobs = {}       # caminho -> (bytes, content_type)
+        self.blocos = {}      # (caminho, block_id) -> bytes
+        self.requisicoes = 0
+        self.falhas_injetadas = 0
+        self.bytes_recebidos = 0
+
+    def bytes_armazenados(self):
+        with self._lock:
+            return sum(len(dados) for dados, _ in self.blobs.values())
+
+
+class HandlerBlobFalso(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como o Azure
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def armazenamento(self):
+        return self.server.armazenamento
+
+    def _responder(self, status, corpo=b'', headers=None):
+        self.send_response(status)
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if corpo and self.command != 'HEAD':
+            self.wfile.write(corpo)
+
+    def _preparar(self):
+        """Lê o body, aplica latência/falha; retorna (caminho, parâmetros, body) ou None se falhou"""
+        tamanho = int(self.headers.get('Content-Length', 0) or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b''
+        url = urllib.parse.urlparse(self.path)
+        parametros = urllib.parse.parse_qs(url.query)
+
+        with self.armazenamento._lock:
+            self.armazenamento.requisicoes += 1
+            self.armazenamento.bytes_recebidos += len(corpo)
+
+        espera = self.server.latencia + (len(corpo) / self.server.banda if self.server.banda else 0)
+        if espera:
+            time.sleep(espera)
+        if self.server.taxa_falha and random.random() < self.server.taxa_falha:
+            with self.armazenamento._lock:
+                self.armazenamento.falhas_injetadas += 1
+            self._responder(503, b'ServerBusy')
+            return None
+        if 'sig' not in parametros and 'sv' not in parametros:
+            self._responder(403, b'AuthenticationFailed')
+            return None
+        return urllib.parse.unquote(url.path), parametros, corpo
+
+    def _ja_existe(self, caminho):
+        """If-None-Match: * com o blob já confirmado -> responde 409 (chamar com o lock)"""
+        if self.headers.get('If-None-Match') == '*' and caminho in self.armazenamento.blobs:
+            self._responder(409, b'BlobAlreadyExists', {'x-ms-error-code': 'BlobAlreadyExists'})
+            return True
+        return False
+
+    def do_PUT(self):
+        preparado = self._preparar()
+        if preparado is None:
+            return
+        caminho, parametros, corpo = preparado
+        comp = parametros.get('comp', [None])[0]
+        armazenamento = self.armazenamento
+
+        if comp == 'block':
+            id_bloco = parametros.get('blockid', [''])[0]
+            if not id_bloco:
+                self._responder(400, b'InvalidQueryParameterValue')
+                return
+            with armazenamento._lock:
+                armazenamento.blocos[(caminho, id_bloco)] = corpo
+            self._responder(201)
+        elif comp == 'blocklist':
+            ids = [i.decode('ascii') for i in PADRAO_BLOCO_LISTA.findall(corpo)]
+            with armazenamento._lock:
+                if self._ja_existe(caminho):
+                    return
+                if any((caminho, i) not in armazenamento.blocos for i in ids):
+                    self._responder(400, b'InvalidBlockList')
+                    return
+                dados = b''.join(armazenamento.blocos.pop((caminho, i)) for i in ids)
+                tipo = self.headers.get('x-ms-blob-content-type', 'application/octet-stream')
+                armazenamento.blobs[caminho] = (dados, tipo)
+            self._responder(201)
+        elif self.headers.get('x-ms-blob-type') == 'BlockBlob':
+            with armazenamento._lock:
+                if self._ja_existe(caminho):
+                    return
+                armazenamento.blobs[caminho] = (corpo, self.headers.get('Content-Type', 'application/octet-stream'))
+            self._responder(201)
+        else:
+            self._responder(400, b'MissingRequiredHeader')
+
+    def do_HEAD(self):
+        preparado = self._preparar()
+        if preparado is None:
+            return
+        caminho = preparado[0]
+        with self.armazenamento._lock:
+            blob = self.armazenamento.blobs.get(caminho)
+        if blob is None:
+            self._responder(404)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(blob[0])))
+            self.send_header('Content-Type', blob[1])
+            self.end_headers()
+
+    def do_GET(self):
+        preparado = self._preparar()
+        if preparado is None:
+            return
+        with self.armazenamento._lock:
+            blob = self.armazenamento.blobs.get(preparado[0])
+        if blob is None:
+            self._responder(404, b'BlobNotFound')
+        else:
+            self._responder(200, blob[0], {'Content-Type': blob[1]})
+
+
+class ServidorBlobFalso:
+    """Sobe o servidor falso numa thread; use .endpoint como AZURE_BLOB_ENDPOINT
+
+    latencia: segundos fixos por requisição; banda: bytes/s simulados para o corpo (0 = infinita);
+    taxa_falha: probabilidade (0-1) de responder 503.
+    """
+
+    def __init__(self, porta=0, latencia=0.0, banda=0, taxa_falha=0.0):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', porta), HandlerBlobFalso)
+        self.httpd.daemon_threads = True
+        self.httpd.armazenamento = ArmazenamentoFalso()
+        self.httpd.latencia = latencia
+        self.httpd.banda = banda
+        self.httpd.taxa_falha = taxa_falha
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    @property
+    def armazenamento(self):
+        return self.httpd.armazenamento
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='blob-falso', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Azure Blob falso para testes locais')
+    parser.add_argument('--porta', type=int, default=10000)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos por requisição')
+    parser.add_argument('--banda', type=int, default=0, help='bytes/s simulados (0 = sem limite)')
+    parser.add_argument('--falhas', type=float, default=0.0, help='probabilidade de 503 (0-1)')
+    args = parser.parse_args()
+
+    servidor = ServidorBlobFalso(args.porta, args.latencia, args.banda, args.falhas)
+    print(f"🧪 Azure Blob falso em {servidor.endpoint} (latência {args.latencia}s, falhas {args.falhas:.0%})")
+    try:
+        servidor.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 Parado - {len(servidor.armazenamento.blobs)} blob(s), "
+              f"{servidor.armazenamento.requisicoes} requisição(ões)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Consulta do histórico de pedidos (/api/pedidos) com paginação por chave (keyset)
+
+A página seguinte não usa OFFSET: o cursor guarda (DATA_RETIRADA, ID) da última linha e a
+consulta continua a partir dele com ORDER BY DATA_RETIRADA DESC, ID DESC. Com os índices de
+migracao_indices_historico.sql cada página é um seek + TOP N, então a página 500 custa o
+mesmo que a primeira.
+
+Este módulo só monta SQL e cursores; quem executa é o server.py (executar_query).
+"""
+import base64
+import json
+import os
+from datetime import date, datetime, timedelta
+
+HISTORICO_LIMITE_PADRAO = int(os.getenv('HISTORICO_LIMITE_PADRAO', 50))
+HISTORICO_LIMITE_MAX = int(os.getenv('HISTORICO_LIMITE_MAX', 200))
+
+# Colunas que podem ser pedidas em ?campos= (lista fechada: os nomes vão direto para o SQL)
+COLUNAS_HISTORICO = (
+    'ID', 'DATA_RETIRADA', 'DATA_ENVIO1', 'PROJETO', 'COORDENADOR', 'SUPERVISOR', 'LIDER',
+    'NOME_LIDER', 'FAZENDA', 'TIPO_REFEICAO', 'CIDADE_PRESTACAO_DO_SERVICO', 'FORNECEDOR',
+    'VALOR_PAGO', 'COLABORADORES', 'TOTAL_COLABORADORES', 'A_CONTRATAR', 'RESPONSAVEL_PELO_CARTAO',
+    'PAGCORP', 'HOSPEDADO', 'NOME_DO_HOTEL', 'VALOR_DIARIA', 'TOTAL_PAGAR', 'APROVADO_POR',
+    'OBSERVACOES', 'AFERIU_TEMPERATURA', 'FECHAMENTO', 'TEMPERATURA_RETIRADA', 'TEMPERATURA_CONSUMO',
+    'HORA_RETIRADA', 'HORA_CONSUMO', 'OBSERVACOES_TEMP', 'IMG_RETIRADA', 'IMG_CONSUMO',
+)
+_COLUNAS_VALIDAS = frozenset(COLUNAS_HISTORICO)
+
+# Projeção padrão = colunas cobertas pelos índices da migração (sem lookup na tabela)
+CAMPOS_PADRAO = (
+    'ID', 'DATA_RETIRADA', 'LIDER', 'NOME_LIDER', 'PROJETO', 'TIPO_REFEICAO', 'FORNECEDOR',
+    'TOTAL_COLABORADORES', 'TOTAL_PAGAR', 'AFERIU_TEMPERATURA', 'FECHAMENTO',
+)
+# Sempre selecionadas: são a chave do cursor
+CAMPOS_CURSOR = ('DATA_RETIRADA', 'ID')
+
+# Filtros de igualdade: parâmetro da URL -> coluna
+FILTROS_IGUALDADE = (
+    ('equipe', 'LIDER'),
+    ('projeto', 'PROJETO'),
+    ('fornecedor', 'FORNECEDOR'),
+)
+
+
+class ConsultaHistoricoInvalida(ValueError):
+    """Parâmetro inválido em /api/pedidos (campo desconhecido, data ou cursor malformado)"""
+
+
+def codificar_cursor(data_retirada, pedido_id):
+    """(DATA_RETIRADA, ID) da última linha -> token opaco para ?cursor="""
+    valor = data_retirada.isoformat() if hasattr(data_retirada, 'isoformat') else str(data_retirada)
+    bruto = json.dumps([valor, int(pedido_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        valor, pedido_id = json.loads(bruto)
+        return datetime.fromisoformat(valor), int(pedido_id)
+    except (ValueError, TypeError, KeyError):
+        # base64, UTF-8 e JSON malformados são todos ValueError; a mensagem do codec não vai ao cliente
+        raise ConsultaHistoricoInvalida("cursor inválido") from None
+
+
+def _data_parametro(nome, valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ConsultaHistoricoInvalida(f"{nome} deve estar no formato AAAA-MM-DD")
+
+
+def resolver_campos(texto):
+    """'id,total_pagar' -> tupla de colunas (sempre com DATA_RETIRADA e ID)"""
+    if not texto:
+        return CAMPOS_PADRAO
+    pedidos = [c.strip().upper() for c in texto.split(',') if c.strip()]
+    desconhecidos = [c for c in pedidos if c not in _COLUNAS_VALIDAS]
+    if desconhecidos:
+        raise ConsultaHistoricoInvalida(f"campo(s) desconhecido(s): {', '.join(desconhecidos)}")
+    campos = list(CAMPOS_CURSOR)
+    for coluna in pedidos:
+        if coluna not in campos:
+            campos.append(coluna)
+    return tuple(campos)
+
+
+def valor_parametro(parametros, nome):
+    """Primeiro valor de um parâmetro do parse_qs, sem espaços ('' se ausente)"""
+    return (parametros.get(nome, [''])[0] or '').strip()
+
+
+def montar_filtros(parametros):
+    """Filtros comuns ao histórico e à exportação -> (condições SQL, params)
+
+    equipe, projeto, fornecedor e data_inicio/data_fim (inclusivas, AAAA-MM-DD).
+    """
+    def valor(nome):
+        return valor_parametro(parametros, nome)
+
+    # Linhas sem DATA_RETIRADA não têm posição no cursor
+    condicoes = ["DATA_RETIRADA IS NOT NULL"]
+    params = []
+    for nome, coluna in FILTROS_IGUALDADE:
+        filtro = valor(nome)
+        if filtro and filtro != 'SEM_EQUIPE':
+            condicoes.append(f"{coluna} = %s")
+            params.append(filtro)
+
+    # Intervalo semiaberto [início, fim + 1 dia): continua usando o índice em DATA_RETIRADA
+    inicio, fim = valor('data_inicio'), valor('data_fim')
+    if inicio:
+        condicoes.append("DATA_RETIRADA >= %s")
+        params.append(_data_parametro('data_inicio', inicio))
+    if fim:
+        condicoes.append("DATA_RETIRADA < %s")
+        params.append(_data_parametro('data_fim', fim) + timedelta(days=1))
+    return condicoes, params
+
+
+def montar_consulta_historico(parametros):
+    """parse_qs da URL -> (query, params, campos, limite)
+
+    Filtros de montar_filtros; paginação: limite (até HISTORICO_LIMITE_MAX) e cursor
+    (proximo_cursor da página anterior).
+    """
+    def valor(nome):
+        return valor_parametro(parametros, nome)
+
+    campos = resolver_campos(valor('campos'))
+    try:
+        limite = int(valor('limite') or HISTORICO_LIMITE_PADRAO)
+    except ValueError:
+        raise ConsultaHistoricoInvalida("limite deve ser um número inteiro")
+    limite = max(1, min(limite, HISTORICO_LIMITE_MAX))
+
+    condicoes, params = montar_filtros(parametros)
+    cursor = valor('cursor')
+    if cursor:
+        data_cursor, id_cursor = decodificar_cursor(cursor)
+        # (DATA_RETIRADA, ID) < (data_cursor, id_cursor) - o SQL Server não compara tuplas
+        condicoes.append("(DATA_RETIRADA < %s OR (DATA_RETIRADA = %s AND ID < %s))")
+        params.extend([data_cursor, data_cursor, id_cursor])
+
+    # Uma linha a mais indica se existe próxima página
+    query = f"""
+    SELECT TOP ({limite + 1}) {', '.join(campos)}
+    FROM PEDIDOS
+    WHERE {' AND '.join(condicoes)}
+    ORDER BY DATA_RETIRADA DESC, ID DESC
+    """
+    return query, params, campos, limite
+
+
+def paginar(linhas, limite):
+    """Corta a linha extra e gera o cursor da próxima página (ou None na última)"""
+    if linhas is None or len(linhas) <= limite:
+        return linhas, None
+    pagina = linhas[:limite]
+    ultima = pagina[-1]
+    return pagina, codificar_cursor(ultima['DATA_RETIRADA'], ultima['ID'])
+
+
+def serializar_linha(linha):
+    """Datas como ISO sem conversão de fuso (DATA_RETIRADA é data local do pedido)"""
+    return {
+        coluna: valor.isoformat() if isinstance(valor, (datetime, date)) else valor
+        for coluna, valor in linha.items()
+    }
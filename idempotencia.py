@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Idempotency-Key para /api/salvar-pedido (e para cada item de /api/salvar-pedidos)
+
+A fila offline do PWA e o background sync do service worker reenviam pedidos depois de
+quedas de rede; sem chave, cada reenvio vira uma linha nova em PEDIDOS. Com a chave:
+
+- resultado de uma chave já concluída volta direto da memória (sem tocar no banco)
+- requisições simultâneas com a mesma chave esperam a primeira e recebem o mesmo resultado
+- chaves concluídas são gravadas num arquivo append-only e recarregadas na inicialização
+
+Só resultados de sucesso são guardados: um erro deixa o cliente tentar de novo com a mesma chave.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+IDEMPOTENCIA_ARQUIVO = os.getenv('IDEMPOTENCIA_ARQUIVO', os.path.join(RAIZ_PROJETO, 'idempotencia_pedidos.jsonl'))
+IDEMPOTENCIA_MAX = int(os.getenv('IDEMPOTENCIA_MAX', 20000))
+# Fila offline pode segurar um pedido por dias (aparelho sem sinal no campo)
+IDEMPOTENCIA_TTL = float(os.getenv('IDEMPOTENCIA_TTL', 7 * 24 * 3600))
+# Quanto esperar por uma execução em andamento com a mesma chave
+IDEMPOTENCIA_ESPERA = float(os.getenv('IDEMPOTENCIA_ESPERA', 60))
+TAMANHO_MAX_CHAVE = 200
+
+
+class ConflitoIdempotencia(Exception):
+    """Chave reutilizada com um corpo diferente do original"""
+
+
+def impressao_pedido(dados):
+    """Hash do corpo (sem a própria chave) para detectar reuso da chave com outro pedido"""
+    sem_chave = {k: v for k, v in dados.items() if k != 'idempotency_key'}
+    canonico = json.dumps(sem_chave, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+class _Execucao:
+    def __init__(self, impressao):
+        self.impressao = impressao
+        self.evento = threading.Event()
+        self.resposta = None
+
+
+class RegistroIdempotencia:
+    """Índice chave -> resposta (LRU com validade) + coalescência de requisições em andamento"""
+
+    def __init__(self, arquivo=IDEMPOTENCIA_ARQUIVO, maximo=IDEMPOTENCIA_MAX, ttl=IDEMPOTENCIA_TTL):
+        self.arquivo = arquivo
+        self.maximo = maximo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._concluidas = OrderedDict()   # chave -> (impressao, resposta, expira_em)
+        self._em_andamento = {}            # chave -> _Execucao
+        self._linhas_arquivo = 0
+        self.repeticoes = 0
+        self.coalescidas = 0
+        self._carregar()
+
+    def _carregar(self):
+        if not self.arquivo or not os.path.exists(self.arquivo):
+            return
+        agora = time.time()
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    self._linhas_arquivo += 1
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        continue  # Linha incompleta (processo morto no meio da escrita)
+                    if registro['expira_em'] > agora:
+                        self._concluidas[registro['chave']] = (registro['impressao'], registro['resposta'],
+                                                               registro['expira_em'])
+                        self._concluidas.move_to_end(registro['chave'])
+            while len(self._concluidas) > self.maximo:
+                self._concluidas.popitem(last=False)
+            print(f"🔑 Idempotency-Keys carregadas: {len(self._concluidas)}")
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar Idempotency-Keys: {e}")
+
+    def _buscar(self, chave, impressao):
+        """Resposta já concluída para a chave (ou None); chamar com o lock"""
+        registro = self._concluidas.get(chave)
+        if registro is None:
+            return None
+        impressao_original, resposta, expira_em = registro
+        if expira_em <= time.time():
+            del self._concluidas[chave]
+            return None
+        if impressao_original != impressao:
+            raise ConflitoIdempotencia("Idempotency-Key já usada com um pedido diferente")
+        self._concluidas.move_to_end(chave)
+        return resposta
+
+    def executar(self, chave, impressao, funcao):
+        """Executa funcao() uma única vez por chave; retorna (resposta, repetida)"""
+        chave = chave[:TAMANHO_MAX_CHAVE]
+        with self._lock:
+            resposta = self._buscar(chave, impressao)
+            if resposta is not None:
+                self.repeticoes += 1
+                return resposta, True
+            execucao = self._em_andamento.get(chave)
+            dona = execucao is None
+            if dona:
+                execucao = self._em_andamento[chave] = _Execucao(impressao)
+            elif execucao.impressao != impressao:
+                raise ConflitoIdempotencia("Idempotency-Key já usada com um pedido diferente")
+
+        if not dona:
+            # Mesma chave chegando em paralelo (ex: app e service worker ao mesmo tempo)
+            with self._lock:
+                self.coalescidas += 1
+            if not execucao.evento.wait(IDEMPOTENCIA_ESPERA) or execucao.resposta is None:
+                return {"error": True, "message": "Pedido com a mesma Idempotency-Key ainda em processamento"}, True
+            return execucao.resposta, True
+
+        try:
+            execucao.resposta = funcao()
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+                if execucao.resposta is not None and not execucao.resposta.get('error'):
+                    self._guardar(chave, impressao, execucao.resposta)
+            execucao.evento.set()
+        return execucao.resposta, False
+
+    def obter(self, chave, impressao):
+        """Resposta já concluída para a chave (ou None) - usado pelo lote, que não coalesce"""
+        with self._lock:
+            resposta = self._buscar(chave[:TAMANHO_MAX_CHAVE], impressao)
+            if resposta is not None:
+                self.repeticoes += 1
+            return resposta
+
+    def registrar(self, chave, impressao, resposta):
+        """Registra o resultado de uma chave processada fora de executar() (ex: lote)"""
+        with self._lock:
+            self._guardar(chave[:TAMANHO_MAX_CHAVE], impressao, resposta)
+
+    def _guardar(self, chave, impressao, resposta):
+        """Guarda em memória e acrescenta ao arquivo; chamar com o lock"""
+        expira_em = time.time() + self.ttl
+        self._concluidas[chave] = (impressao, resposta, expira_em)
+        self._concluidas.move_to_end(chave)
+        if len(self._concluidas) > self.maximo:
+            self._concluidas.popitem(last=False)
+        if not self.arquivo:
+            return
+        try:
+            if self._linhas_arquivo >= 2 * self.maximo:
+                # Reescrever só as chaves vivas
+                temporario = self.arquivo + '.tmp'
+                with open(temporario, 'w', encoding='utf-8') as arquivo:
+                    for c, (i, r, e) in self._concluidas.items():
+                        arquivo.write(json.dumps({"chave": c, "impressao": i, "resposta": r, "expira_em": e},
+                                                 default=str) + '\n')
+                os.replace(temporario, self.arquivo)
+                self._linhas_arquivo = len(self._concluidas)
+                return
+            with open(self.arquivo, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps({"chave": chave, "impressao": impressao, "resposta": resposta,
+                                          "expira_em": expira_em}, default=str) + '\n')
+            self._linhas_arquivo += 1
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar Idempotency-Key: {e}")
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "chaves": len(self._concluidas),
+                "em_andamento": len(self._em_andamento),
+                "repeticoes": self.repeticoes,
+                "coalescidas": self.coalescidas,
+            }
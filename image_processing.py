@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Redução e recompressão das fotos antes do upload
+
+As fotos de termômetro chegam na resolução cheia da câmera; como só servem de evidência,
+são reduzidas para IMAGEM_MAX_LADO, recomprimidas em JPEG (IMAGEM_QUALIDADE_JPEG) e gravadas
+sem EXIF (a orientação é aplicada antes). Opcionalmente gera uma miniatura. Foto que não
+precisou ser reduzida nem girada e não ficou menor ao recomprimir segue como chegou.
+
+Usa Pillow se estiver instalado; sem ele as imagens seguem como chegaram.
+"""
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional
+    Image = None
+
+IMAGEM_MAX_LADO = int(os.getenv('IMAGEM_MAX_LADO', 1600))
+IMAGEM_QUALIDADE_JPEG = int(os.getenv('IMAGEM_QUALIDADE_JPEG', 80))
+# Lado maior da miniatura (0 desativa)
+IMAGEM_MINIATURA_LADO = int(os.getenv('IMAGEM_MINIATURA_LADO', 0))
+IMAGEM_QUALIDADE_MINIATURA = int(os.getenv('IMAGEM_QUALIDADE_MINIATURA', 70))
+# Proteção contra "decompression bomb" (imagens com dimensões absurdas)
+IMAGEM_MAX_PIXELS = int(os.getenv('IMAGEM_MAX_PIXELS', 50_000_000))
+# Tag EXIF Orientation (1 = já está de pé)
+ORIENTACAO_EXIF = 0x0112
+
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = IMAGEM_MAX_PIXELS
+
+
+class ImagemProcessada:
+    """Resultado do processamento (dados originais se nada foi feito)"""
+
+    def __init__(self, dados, content_type, processada=False, largura=None, altura=None,
+                 miniatura=None, bytes_originais=None):
+        self.dados = dados
+        self.content_type = content_type
+        self.processada = processada
+        self.largura = largura
+        self.altura = altura
+        self.miniatura = miniatura
+        self.bytes_originais = len(dados) if bytes_originais is None else bytes_originais
+
+
+def _codificar_jpeg(imagem, qualidade):
+    saida = io.BytesIO()
+    # Sem exif=...: o Pillow não copia os metadados originais para o arquivo novo
+    imagem.save(saida, format='JPEG', quality=qualidade, optimize=True, progressive=True)
+    return saida.getvalue()
+
+
+def processar_imagem(dados, content_type='image/jpeg', max_lado=IMAGEM_MAX_LADO,
+                     qualidade=IMAGEM_QUALIDADE_JPEG, miniatura_lado=IMAGEM_MINIATURA_LADO):
+    """Reduz, recomprime em JPEG e remove EXIF; em caso de erro devolve os dados originais"""
+    if Image is None:
+        return ImagemProcessada(dados, content_type)
+
+    try:
+        imagem = Image.open(io.BytesIO(dados))
+        tamanho_original = imagem.size
+        girada = imagem.getexif().get(ORIENTACAO_EXIF, 1) != 1
+        # JPEG: decodificar já reduzido (escala do DCT) - bem mais rápido que decodificar tudo
+        imagem.draft('RGB', (max_lado, max_lado))
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode != 'RGB':
+            imagem = imagem.convert('RGB')
+        imagem.thumbnail((max_lado, max_lado), Image.LANCZOS)
+        processados = _codificar_jpeg(imagem, qualidade)
+        if not girada and imagem.size == tamanho_original and len(processados) >= len(dados):
+            # Foto pequena ou já bem comprimida: recomprimir só aumentaria o arquivo
+            print(f"🖼️ Imagem mantida: recompressão não reduziu ({len(dados)/1024:.1f}KB -> "
+                  f"{len(processados)/1024:.1f}KB)")
+            processados = None
+
+        miniatura = None
+        if miniatura_lado:
+            copia = imagem.copy()
+            copia.thumbnail((miniatura_lado, miniatura_lado), Image.LANCZOS)
+            miniatura = _codificar_jpeg(copia, IMAGEM_QUALIDADE_MINIATURA)
+
+        if processados is None:
+            return ImagemProcessada(dados, content_type, False, imagem.width, imagem.height, miniatura)
+        print(f"🖼️ Imagem processada: {len(dados)/1024:.1f}KB -> {len(processados)/1024:.1f}KB "
+              f"({imagem.width}x{imagem.height})")
+        return ImagemProcessada(processados, 'image/jpeg', True, imagem.width, imagem.height,
+                                miniatura, len(dados))
+    except Exception as e:
+        print(f"⚠️ Não foi possível processar a imagem ({e}) - enviando original")
+        return ImagemProcessada(dados, content_type)
+
+
+def nome_miniatura(nome_blob):
+    """img_<hash>.jpg -> img_<hash>_mini.jpg"""
+    base, _ = os.path.splitext(nome_blob)
+    return f'{base}_mini.jpg'
@@ -0,0 +1,39 @@
+-- Índices de cobertura para o histórico de pedidos (/api/pedidos)
+-- Problema: a paginação por (DATA_RETIRADA, ID) precisa de um índice nessa ordem; sem ele cada
+--           página ordena a tabela inteira e páginas profundas ficam cada vez mais lentas
+-- Solução: índices com a chave do cursor e as colunas da projeção padrão em INCLUDE, para que
+--          cada página seja um seek + TOP N sem lookup na tabela
+-- Script idempotente: pode ser executado mais de uma vez
+
+-- 1. Filtro por equipe (LIDER), o caso do app: seek por equipe já na ordem do cursor
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PEDIDOS_LIDER_DATA_RETIRADA_ID'
+               AND object_id = OBJECT_ID('dbo.PEDIDOS'))
+BEGIN
+    CREATE NONCLUSTERED INDEX [IX_PEDIDOS_LIDER_DATA_RETIRADA_ID]
+    ON [dbo].[PEDIDOS] ([LIDER], [DATA_RETIRADA] DESC, [ID] DESC)
+    INCLUDE ([NOME_LIDER], [PROJETO], [TIPO_REFEICAO], [FORNECEDOR], [TOTAL_COLABORADORES],
+             [TOTAL_PAGAR], [AFERIU_TEMPERATURA], [FECHAMENTO])
+    WITH (ONLINE = ON)
+    PRINT 'Índice IX_PEDIDOS_LIDER_DATA_RETIRADA_ID criado'
+END
+GO
+
+-- 2. Sem equipe (por projeto, fornecedor ou só período): varre na ordem do cursor e filtra
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PEDIDOS_DATA_RETIRADA_ID'
+               AND object_id = OBJECT_ID('dbo.PEDIDOS'))
+BEGIN
+    CREATE NONCLUSTERED INDEX [IX_PEDIDOS_DATA_RETIRADA_ID]
+    ON [dbo].[PEDIDOS] ([DATA_RETIRADA] DESC, [ID] DESC)
+    INCLUDE ([LIDER], [NOME_LIDER], [PROJETO], [TIPO_REFEICAO], [FORNECEDOR], [TOTAL_COLABORADORES],
+             [TOTAL_PAGAR], [AFERIU_TEMPERATURA], [FECHAMENTO])
+    WITH (ONLINE = ON)
+    PRINT 'Índice IX_PEDIDOS_DATA_RETIRADA_ID criado'
+END
+GO
+
+-- 3. Verificar
+SELECT i.name AS indice, i.type_desc AS tipo
+FROM sys.indexes i
+WHERE i.object_id = OBJECT_ID('dbo.PEDIDOS') AND i.name LIKE 'IX_PEDIDOS_%DATA_RETIRADA_ID'
+
+PRINT 'Migração de índices do histórico concluída!'
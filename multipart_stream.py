@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Parser incremental de multipart/form-data
+
+Lê o body em blocos (LeitorBodyStream) e entrega cada parte com seus dados em streaming,
+sem dividir o body inteiro com bytes.split e sem passar por base64.
+"""
+
+TAMANHO_BLOCO = 64 * 1024
+# Limite para o bloco de headers de cada parte (proteção contra body malformado)
+TAMANHO_MAX_HEADERS = 16 * 1024
+# Limite para campos de texto (partes sem filename) lidos por ler_formulario
+TAMANHO_MAX_CAMPO = 64 * 1024
+
+
+class MultipartInvalido(Exception):
+    """Body multipart malformado"""
+
+
+def extrair_boundary(content_type):
+    """Extrai o boundary do header Content-Type (ou None)"""
+    tipo, _, parametros = (content_type or '').partition(';')
+    if tipo.strip().lower() != 'multipart/form-data':
+        return None
+    for parametro in parametros.split(';'):
+        nome, _, valor = parametro.strip().partition('=')
+        if nome.strip().lower() == 'boundary':
+            valor = valor.strip()
+            if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+                valor = valor[1:-1]
+            return valor or None
+    return None
+
+
+def _parse_parametros(valor):
+    """'form-data; name="x"; filename="y.jpg"' -> ('form-data', {'name': 'x', 'filename': 'y.jpg'})"""
+    principal, _, resto = valor.partition(';')
+    parametros = {}
+    for item in resto.split(';'):
+        nome, separador, conteudo = item.strip().partition('=')
+        if not separador:
+            continue
+        conteudo = conteudo.strip()
+        if len(conteudo) >= 2 and conteudo[0] == conteudo[-1] == '"':
+            conteudo = conteudo[1:-1]
+        parametros[nome.strip().lower()] = conteudo
+    return principal.strip().lower(), parametros
+
+
+class ParteMultipart:
+    """Uma parte do multipart; os dados são lidos com iter_blocos() ou ler_tudo()"""
+
+    def __init__(self, parser, headers):
+        self._parser = parser
+        self.headers = headers
+        _, disposicao = _parse_parametros(headers.get('content-disposition', ''))
+        self.nome = disposicao.get('name')
+        self.filename = disposicao.get('filename')
+        self.content_type = headers.get('content-type', 'application/octet-stream').strip()
+        self.consumida = False
+
+    @property
+    def eh_arquivo(self):
+        return self.filename is not None
+
+    def iter_blocos(self):
+        """Itera sobre os dados da parte em blocos (memória limitada ao tamanho do bloco)"""
+        if self.consumida:
+            return
+        for bloco in self._parser._dados_da_parte():
+            yield bloco
+        self.consumida = True
+
+    def ler_tudo(self, limite=None):
+        """Acumula os dados da parte num único bytearray (cresce sem cópias quadráticas)"""
+        dados = bytearray()
+        for bloco in self.iter_blocos():
+            dados += bloco
+            if limite is not None and len(dados) > limite:
+                raise MultipartInvalido(f"Parte '{self.nome}' excede {limite} bytes")
+        return dados
+
+    def descartar(self):
+        for _ in self.iter_blocos():
+            pass
+
+
+class ParserMultipart:
+    """Itera sobre as partes de um body multipart lido incrementalmente
+
+    Uso:
+        for parte in ParserMultipart(leitor, boundary):
+            if parte.eh_arquivo:
+                dados = parte.ler_tudo()
+
+    Partes não consumidas pelo chamador são descartadas automaticamente ao avançar.
+    """
+
+    def __init__(self, leitor, boundary, tamanho_bloco=TAMANHO_BLOCO):
+        self._leitor = leitor
+        self._tamanho_bloco = tamanho_bloco
+        self._delimitador = b'\r\n--' + boundary.encode('latin-1')
+        self._buf = bytearray()
+        self._eof = False
+        self._tem_proxima = False
+
+    def _preencher(self):
+        """Lê mais um bloco do body para o buffer; False se não há mais dados"""
+        if self._eof:
+            return False
+        bloco = self._leitor.read(self._tamanho_bloco)
+        if not bloco:
+            self._eof = True
+            return False
+        self._buf += bloco
+        return True
+
+    def _iniciar(self):
+        """Pula o preâmbulo até o primeiro boundary"""
+        # O primeiro boundary não tem o \r\n antes - prefixar para usar o mesmo delimitador
+        self._buf[:0] = b'\r\n'
+        while True:
+            indice = self._buf.find(self._delimitador)
+            if indice != -1:
+                del self._buf[:indice + len(self._delimitador)]
+                return self._apos_delimitador()
+            # Manter só o final que pode conter o início do delimitador
+            if len(self._buf) > len(self._delimitador):
+                del self._buf[:len(self._buf) - len(self._delimitador)]
+            if not self._preencher():
+                raise MultipartInvalido("Boundary inicial não encontrado")
+
+    def _apos_delimitador(self):
+        """Depois de um boundary: '--' encerra, '\\r\\n' inicia nova parte. True se há parte"""
+        while len(self._buf) < 2:
+            if not self._preencher():
+                raise MultipartInvalido("Body terminou após boundary")
+        if self._buf[:2] == b'--':
+            return False
+        # Tolerar espaços antes do CRLF (permitido pela RFC 2046)
+        while True:
+            fim_linha = self._buf.find(b'\r\n')
+            if fim_linha != -1:
+                del self._buf[:fim_linha + 2]
+                return True
+            if not self._preencher():
+                raise MultipartInvalido("Linha do boundary incompleta")
+
+    def _ler_headers(self):
+        while True:
+            fim = self._buf.find(b'\r\n\r\n')
+            if fim != -1:
+                break
+            if len(self._buf) > TAMANHO_MAX_HEADERS:
+                raise MultipartInvalido("Headers da parte muito grandes")
+            if not self._preencher():
+                raise MultipartInvalido("Headers da parte incompletos")
+
+        headers = {}
+        for linha in bytes(self._buf[:fim]).decode('utf-8', errors='replace').split('\r\n'):
+            nome, separador, valor = linha.partition(':')
+            if separador:
+                headers[nome.strip().lower()] = valor.strip()
+        del self._buf[:fim + 4]
+        return headers
+
+    def _dados_da_parte(self):
+        """Gera os blocos de dados da parte atual até o próximo boundary"""
+        tamanho_delim = len(self._delimitador)
+        while True:
+            indice = self._buf.find(self._delimitador)
+            if indice != -1:
+                if indice:
+                    yield bytes(self._buf[:indice])
+                del self._buf[:indice + tamanho_delim]
+                self._tem_proxima = self._apos_delimitador()
+                return
+            # Entregar tudo menos o final que pode ser o começo do delimitador
+            seguro = len(self._buf) - (tamanho_delim - 1)
+            if seguro > 0:
+                yield bytes(self._buf[:seguro])
+                del self._buf[:seguro]
+            if not self._preencher():
+                raise MultipartInvalido("Body terminou antes do boundary final")
+
+    def __iter__(self):
+        if not self._iniciar():
+            return
+        while True:
+            self._tem_proxima = False
+            parte = ParteMultipart(self, self._ler_headers())
+            yield parte
+            if not parte.consumida:
+                parte.descartar()
+            if not self._tem_proxima:
+                return
+
+
+def ler_formulario(leitor, boundary, limite_campo=TAMANHO_MAX_CAMPO, limite_arquivo=None):
+    """Lê o formulário inteiro: retorna (campos, arquivos)
+
+    campos: {nome: str}; arquivos: {nome: (bytearray, filename, content_type)}.
+    Só a primeira ocorrência de cada nome é mantida.
+    """
+    campos = {}
+    arquivos = {}
+    for parte in ParserMultipart(leitor, boundary):
+        if not parte.nome or parte.nome in campos or parte.nome in arquivos:
+            continue
+        if parte.eh_arquivo:
+            dados = parte.ler_tudo(limite_arquivo)
+            if dados:
+                arquivos[parte.nome] = (dados, parte.filename, parte.content_type)
+        else:
+            campos[parte.nome] = parte.ler_tudo(limite_campo).decode('utf-8', errors='replace')
+    return campos, arquivos
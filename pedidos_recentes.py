@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Índice em memória dos pedidos recentes (/api/pedidos-pendentes-temperatura e /api/ultimo-pedido)
+
+As duas rotas só olham uma janela curta de PEDIDOS (pendências dos últimos 7 dias e os pedidos
+de ontem), sempre por equipe. O índice guarda os pedidos dos últimos INDICE_RECENTES_DIAS dias
+(e os com data futura) organizados por LIDER -> data -> ID, e responde sem ir ao banco:
+- carga em lote na inicialização (um SELECT pela janela)
+- cada pedido gravado (individual, lote ou write-behind) entra na hora
+- cada aferição (individual ou em lote) marca o pedido como aferido
+- reconciliação periódica: a janela é relida do SQL e substitui o índice (pega alterações feitas
+  direto no banco); o que foi registrado durante a releitura é reaplicado por cima
+
+FECHAMENTO é preenchido pela TRIGGER do SQL: pedidos gravados depois da última carga ficam sem
+ele até a próxima reconciliação, e /api/ultimo-pedido consulta o banco nesses casos.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+INDICE_RECENTES_DIAS = int(os.getenv('INDICE_RECENTES_DIAS', 10))
+INDICE_RECENTES_RECONCILIAR = float(os.getenv('INDICE_RECENTES_RECONCILIAR', 300))   # segundos
+
+# Colunas usadas pelas duas rotas (formatar_pendencia e a resposta de /api/ultimo-pedido)
+COLUNAS_RECENTES = (
+    'ID', 'DATA_RETIRADA', 'DATA_ENVIO1', 'PROJETO', 'COORDENADOR', 'SUPERVISOR', 'LIDER',
+    'NOME_LIDER', 'FAZENDA', 'TIPO_REFEICAO', 'FORNECEDOR', 'VALOR_PAGO', 'TOTAL_COLABORADORES',
+    'A_CONTRATAR', 'PAGCORP', 'HOSPEDADO', 'VALOR_DIARIA', 'TOTAL_PAGAR', 'AFERIU_TEMPERATURA',
+    'FECHAMENTO',
+)
+QUERY_RECENTES = f"""
+SELECT {', '.join(COLUNAS_RECENTES)}
+FROM PEDIDOS
+WHERE DATA_RETIRADA >= %s
+"""
+
+# DATA_ENVIO1 do INSERT: DATEADD(hour, -6, GETUTCDATE())
+DESLOCAMENTO_DATA_ENVIO = timedelta(hours=-6)
+
+
+def precisa_afericao(tipo_refeicao, aferiu_temperatura):
+    """Mesmo critério do WHERE de /api/pedidos-pendentes-temperatura"""
+    tipo = (tipo_refeicao or '').upper()
+    aferiu = (aferiu_temperatura or '').rstrip().upper()   # '=' do SQL Server (collation CI)
+    return ('MARMITEX' in tipo or 'MARMITA' in tipo) and aferiu in ('', 'NAO')
+
+
+def chave_equipe(lider):
+    """LIDER normalizado como o '=' do SQL Server (collation CI): sem diferença de maiúsculas e
+    espaços à direita. Usado no índice e no barramento SSE (eventos_pendencias)"""
+    return (lider or '').rstrip().upper()
+
+
+def _como_datetime(valor):
+    """DATA_RETIRADA do banco (datetime/date) ou do formulário ('AAAA-MM-DD') -> datetime"""
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime.combine(valor, datetime.min.time())
+    try:
+        return datetime.strptime(str(valor)[:10], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+class IndicePedidosRecentes:
+    """LIDER -> data de retirada -> {ID: pedido}, mais ID -> (LIDER, data) para as aferições"""
+
+    def __init__(self, dias=INDICE_RECENTES_DIAS, intervalo=INDICE_RECENTES_RECONCILIAR):
+        self.dias = dias
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._equipes = {}
+        self._posicoes = {}
+        self._sem_fechamento = set()   # gravados depois da última carga (FECHAMENTO ainda desconhecido)
+        self._inicio = None            # primeira data coberta (None = ainda não carregado)
+        self._durante_carga = None     # operações registradas enquanto a janela é relida do SQL
+        self._parar = threading.Event()
+        self._thread = None
+        self.reconciliado_em = None
+        self.ultima_divergencia = 0
+        self.reconciliacoes = 0
+        self.consultas_memoria = 0
+
+    # --- escrita -------------------------------------------------------------------------------
+
+    def _inserir(self, pedido, sem_fechamento):
+        data_retirada = _como_datetime(pedido.get('DATA_RETIRADA'))
+        if data_retirada is None or (self._inicio is not None and data_retirada.date() < self._inicio):
+            return
+        pedido_id = int(pedido['ID'])
+        self._remover(pedido_id)
+        pedido['DATA_RETIRADA'] = data_retirada
+        chave = (chave_equipe(pedido.get('LIDER')), data_retirada.date())
+        self._equipes.setdefault(chave[0], {}).setdefault(chave[1], {})[pedido_id] = pedido
+        self._posicoes[pedido_id] = chave
+        if sem_fechamento:
+            self._sem_fechamento.add(pedido_id)
+
+    def _remover(self, pedido_id):
+        chave = self._posicoes.pop(pedido_id, None)
+        if chave is None:
+            return
+        datas = self._equipes[chave[0]]
+        del datas[chave[1]][pedido_id]
+        if not datas[chave[1]]:
+            del datas[chave[1]]
+            if not datas:
+                del self._equipes[chave[0]]
+        self._sem_fechamento.discard(pedido_id)
+
+    def _marcar_aferido(self, pedido_id):
+        chave = self._posicoes.get(pedido_id)
+        if chave is not None:
+            self._equipes[chave[0]][chave[1]][pedido_id]['AFERIU_TEMPERATURA'] = 'SIM'
+
+    def registrar(self, pedido_id, pedido):
+        """Pedido recém-gravado (colunas de COLUNAS_PEDIDO_INSERT)"""
+        pedido = {coluna: pedido.get(coluna) for coluna in COLUNAS_RECENTES}
+        pedido['ID'] = int(pedido_id)
+        pedido['DATA_ENVIO1'] = datetime.utcnow() + DESLOCAMENTO_DATA_ENVIO
+        with self._lock:
+            if self._durante_carga is not None:
+                self._durante_carga.append((self._inserir, (dict(pedido), True)))
+            self._inserir(pedido, True)
+
+    def marcar_aferido(self, pedido_id):
+        """AFERIU_TEMPERATURA = 'SIM' gravado no banco: o pedido sai das pendências"""
+        pedido_id = int(pedido_id)
+        with self._lock:
+            if self._durante_carga is not None:
+                self._durante_carga.append((self._marcar_aferido, (pedido_id,)))
+            self._marcar_aferido(pedido_id)
+
+    # --- carga / reconciliação -----------------------------------------------------------------
+
+    def reconciliar(self, consultar, hoje=None):
+        """Relê a janela no SQL e troca o índice; retorna False se a consulta falhou"""
+        inicio = (hoje or date.today()) - timedelta(days=self.dias)
+        with self._lock:
+            self._durante_carga = []
+        try:
+            linhas = consultar(QUERY_RECENTES, [inicio])
+        except Exception:
+            with self._lock:
+                self._durante_carga = None
+            raise
+        if linhas is None:
+            with self._lock:
+                self._durante_carga = None
+            return False
+
+        with self._lock:
+            # Gravados por este processo depois da carga anterior não contam como divergência
+            ignorados = self._sem_fechamento
+            anterior = {
+                pedido_id: self._equipes[chave[0]][chave[1]][pedido_id].get('AFERIU_TEMPERATURA')
+                for pedido_id, chave in self._posicoes.items()
+                if chave[1] >= inicio and pedido_id not in ignorados
+            } if self._inicio is not None else None
+            self._equipes, self._posicoes, self._sem_fechamento = {}, {}, set()
+            self._inicio = inicio
+            for linha in linhas:
+                self._inserir(dict(linha), False)
+            # Gravações e aferições que aconteceram enquanto o SELECT rodava (idempotentes)
+            for operacao, argumentos in self._durante_carga:
+                operacao(*argumentos)
+            self._durante_carga = None
+
+            if anterior is not None:
+                # Pedidos que divergiam do banco (alterados/excluídos direto no SQL)
+                atual = {
+                    pedido_id: self._equipes[chave[0]][chave[1]][pedido_id].get('AFERIU_TEMPERATURA')
+                    for pedido_id, chave in self._posicoes.items()
+                    if pedido_id not in self._sem_fechamento and pedido_id not in ignorados
+                }
+                self.ultima_divergencia = len(anterior.keys() ^ atual.keys()) + sum(
+                    1 for pedido_id, aferiu in anterior.items()
+                    if pedido_id in atual and atual[pedido_id] != aferiu
+                )
+            self.reconciliado_em = time.time()
+            self.reconciliacoes += 1
+            total = len(self._posicoes)
+        print(f"🗂️ Índice de pedidos recentes: {total} pedido(s) desde {inicio.isoformat()}"
+              f" (divergência: {self.ultima_divergencia})")
+        return True
+
+    @property
+    def carregado(self):
+        return self._inicio is not None
+
+    def cobre(self, data_minima):
+        """True se o índice está carregado e tem todos os pedidos a partir de data_minima"""
+        return self._inicio is not None and data_minima >= self._inicio
+
+    # --- leitura -------------------------------------------------------------------------------
+
+    def pendentes(self, equipe, desde):
+        """Pedidos da equipe com DATA_RETIRADA >= desde que precisam de aferição (mais recentes primeiro)"""
+        with self._lock:
+            self.consultas_memoria += 1
+            pedidos = [
+                dict(pedido)
+                for data_retirada, por_id in self._equipes.get(chave_equipe(equipe), {}).items()
+                if data_retirada >= desde.date()
+                for pedido in por_id.values()
+                if pedido['DATA_RETIRADA'] >= desde
+                and precisa_afericao(pedido.get('TIPO_REFEICAO'), pedido.get('AFERIU_TEMPERATURA'))
+            ]
+        pedidos.sort(key=lambda pedido: (pedido['DATA_RETIRADA'], pedido['ID']), reverse=True)
+        return pedidos
+
+    def do_dia(self, equipe, data_retirada):
+        """Pedidos da equipe numa data (DATA_ENVIO1 e ID decrescentes); None se algum está sem
+        FECHAMENTO (quem chama consulta o banco)"""
+        with self._lock:
+            self.consultas_memoria += 1
+            por_id = self._equipes.get(chave_equipe(equipe), {}).get(data_retirada, {})
+            if any(pedido_id in self._sem_fechamento for pedido_id in por_id):
+                return None
+            pedidos = [dict(pedido) for pedido in por_id.values()]
+        pedidos.sort(key=lambda pedido: (pedido.get('DATA_ENVIO1') or datetime.min, pedido['ID']), reverse=True)
+        return pedidos
+
+    # --- ciclo de vida -------------------------------------------------------------------------
+
+    def iniciar(self, consultar):
+        """Carga inicial e thread de reconciliação"""
+        if self._thread is not None:
+            return
+
+        def trabalhar():
+            while not self._parar.is_set():
+                try:
+                    ok = self.reconciliar(consultar)
+                except Exception as e:
+                    print(f"❌ Erro no índice de pedidos recentes: {e}")
+                    ok = False
+                # Falha na carga/reconciliação: tenta de novo em 1 minuto
+                self._parar.wait(self.intervalo if ok else 60)
+
+        self._thread = threading.Thread(target=trabalhar, name='pedidos-recentes', daemon=True)
+        self._thread.start()
+
+    def encerrar(self, timeout=5):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "carregado": self._inicio is not None,
+                "pedidos": len(self._posicoes),
+                "equipes": len(self._equipes),
+                "desde": self._inicio.isoformat() if self._inicio else None,
+                "sem_fechamento": len(self._sem_fechamento),
+                "reconciliacoes": self.reconciliacoes,
+                "ultima_divergencia": self.ultima_divergencia,
+                "consultas_memoria": self.consultas_memoria,
+                "reconciliado_em": self.reconciliado_em,
+            }
@@ -3,12 +3,34 @@ import http.server
 import socketserver
 import json
 import urllib.parse
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import pymssql
 import decimal
 import os
 from dotenv import load_dotenv
+from blob_client import ClienteBlob, FalhaUploadBlob, blob_ja_existia
+from body_reader import (
+    BodyMuitoGrande, LeitorBodyStream, LIMITE_BODY_PADRAO,
+    limite_para_rota, obter_content_length, ler_body_completo
+)
+from compression import comprimir_resposta, negociar_encoding
+from multipart_stream import MultipartInvalido, ParserMultipart, extrair_boundary, ler_formulario
+from agregados_fechamento import AgregadosFechamento
+from diario_pedidos import BancoIndisponivel, DiarioPedidos, PEDIDOS_WRITE_BEHIND
+from esquema_pedido import ESQUEMA_PEDIDO
+from exportacao_pedidos import FORMATOS, exportar, montar_consulta_exportacao, nome_arquivo
+from historico_pedidos import ConsultaHistoricoInvalida, montar_consulta_historico, paginar, serializar_linha
+from pedidos_recentes import IndicePedidosRecentes, precisa_afericao
+from eventos_pendencias import (
+    EVENTO_ADICIONADO, EVENTO_REMOVIDO, FIM, SSE_HEARTBEAT, SSE_RETRY_MS, BarramentoPendencias, LimiteAssinantes,
+)
+from idempotencia import ConflitoIdempotencia, RegistroIdempotencia, impressao_pedido
+from image_processing import nome_miniatura, processar_imagem
+from upload_dedup import IndiceConteudo, hash_conteudo, nome_blob_por_conteudo
+from upload_pool import PoolUploads, UPLOAD_TIMEOUT_ENCERRAMENTO
+from upload_spool import SpoolUploads
+from static_assets import CACHE_ASSETS, RangeInvalido, interpretar_range
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -48,8 +70,47 @@ AZURE_BLOB_CONFIG = {
     'sas_token': os.getenv('AZURE_SAS_TOKEN')
 }
 
+# Cliente compartilhado (pool keep-alive + retry) para todos os uploads
+CLIENTE_BLOB = ClienteBlob(**AZURE_BLOB_CONFIG)
+
+# Trabalhadores fixos + fila limitada para uploads em segundo plano
+POOL_UPLOADS = PoolUploads()
+
+# Índice hash do conteúdo -> URL (uploads repetidos não vão para a rede)
+INDICE_UPLOADS = IndiceConteudo()
+
+# Chaves Idempotency-Key já processadas em /api/salvar-pedido (memória + arquivo)
+REGISTRO_IDEMPOTENCIA = RegistroIdempotencia()
+
+# Totais por FECHAMENTO/fornecedor/projeto (incrementais + reconciliação periódica no SQL)
+AGREGADOS_FECHAMENTO = AgregadosFechamento()
+
+# Pedidos dos últimos dias por equipe/data (pendências de aferição e último pedido sem ir ao SQL)
+PEDIDOS_RECENTES = IndicePedidosRecentes()
+
+# Eventos de pendências de aferição (SSE) por equipe
+BARRAMENTO_PENDENCIAS = BarramentoPendencias()
+
+# Diário local de pedidos (write-behind) - só existe com PEDIDOS_WRITE_BEHIND=1
+DIARIO_PEDIDOS = DiarioPedidos() if PEDIDOS_WRITE_BEHIND else None
+
+# Uploads que falharam ficam em disco e são reenviados em segundo plano
+SPOOL_UPLOADS = SpoolUploads()
+SPOOL_TIMEOUT_LEITURA = float(os.getenv('SPOOL_TIMEOUT_LEITURA', 60))
+# Tentativa no caminho da requisição: curta, o que não subir a tempo vai para o spool
+# (reenvio com BLOB_TIMEOUT_CONEXAO e SPOOL_TIMEOUT_LEITURA)
+UPLOAD_TIMEOUT_INLINE = (float(os.getenv('UPLOAD_TIMEOUT_INLINE_CONEXAO', 2)),
+                         float(os.getenv('UPLOAD_TIMEOUT_INLINE_LEITURA', 4)))
+COLUNAS_IMAGEM_PEDIDO = {'IMG_RETIRADA', 'IMG_CONSUMO'}
+
 # Configurações Azure carregadas
 
+# Rotas POST cujo handler consome o body incrementalmente via LeitorBodyStream
+# (as demais recebem o body completo em post_body)
+ROTAS_BODY_STREAMING = {'/upload-blob'}
+# Aferição de temperatura (com e sem acento); multipart/form-data também é lido em streaming
+ROTAS_AFERICAO = {'/api/aferição-temperatura', '/api/afericao-temperatura'}
+
 def conectar_azure_sql():
     """Conecta ao Azure SQL Server com timeout"""
     try:
@@ -69,62 +130,108 @@ def conectar_azure_sql():
         traceback.print_exc()
         return None
 
-def upload_imagem_blob(imagem_base64, nome_arquivo):
-    """Faz upload de imagem para Azure Blob Storage com timeout otimizado"""
+def upload_imagem_blob(imagem_base64, nome_arquivo, pedido_id=None, coluna=None):
+    """Faz upload de imagem em base64 (com ou sem prefixo data:image) para Azure Blob Storage"""
     import base64
-    import requests
-    import time
-    from datetime import datetime
-    
+
     try:
-        print(f"📷 Iniciando upload RÁPIDO para blob: {nome_arquivo}")
-        
-        # Verificar configurações antes do upload
-        if not all(AZURE_BLOB_CONFIG.values()):
-            print("❌ Configurações do Azure Blob incompletas - usando backup local")
-            return f"local_backup_{nome_arquivo}"
-        
         # Remover prefixo data:image se existir
         if ',' in imagem_base64:
             imagem_base64 = imagem_base64.split(',')[1]
-        
+
         # Decodificar base64
         imagem_bytes = base64.b64decode(imagem_base64)
-        print(f"📏 Tamanho da imagem: {len(imagem_bytes)} bytes ({len(imagem_bytes)/1024:.1f}KB)")
-        
-        # Se a imagem for muito grande, pular o upload para evitar timeout
-        if len(imagem_bytes) > 5 * 1024 * 1024:  # 5MB
-            print("⚠️ Imagem muito grande (>5MB) - pulando upload para evitar timeout")
-            return f"local_backup_{nome_arquivo}"
-        
-        # Gerar nome único para o arquivo
-        # Gerar timestamp brasileiro para o nome do arquivo
-        brasilia_tz = pytz.timezone('America/Sao_Paulo')
-        timestamp = datetime.now(brasilia_tz).strftime('%Y%m%d_%H%M%S')
-        nome_unico = f"temp_{timestamp}_{nome_arquivo}"
+    except Exception as e:
+        print(f"❌ Erro ao decodificar imagem base64: {e} - usando backup local")
+        return f"local_error_{nome_arquivo}"
+
+    return upload_imagem_bytes(imagem_bytes, nome_arquivo, pedido_id, coluna)
+
+
+def upload_imagem_bytes(imagem_bytes, nome_arquivo, pedido_id=None, coluna=None):
+    """Pipeline das fotos de aferição: deduplicação, redução/recompressão e upload"""
+    # Mesma foto reenviada (fila offline do PWA): nem processa nem sobe de novo
+    hash_original = hash_conteudo(imagem_bytes)
+    url = INDICE_UPLOADS.obter(hash_original)
+    if url:
+        print(f"♻️ Imagem {nome_arquivo} já enviada anteriormente - reaproveitando {url}")
+        return url
+
+    # Reduzir/recomprimir antes de subir (roda no POOL_UPLOADS, fora da thread da requisição)
+    imagem = processar_imagem(imagem_bytes)
+    url = upload_bytes_blob(imagem.dados, nome_arquivo, imagem.content_type, pedido_id=pedido_id, coluna=coluna)
+    if url and not url.startswith('local_'):
+        INDICE_UPLOADS.registrar(hash_original, url)
+
+    if imagem.miniatura and url and not url.startswith('local_'):
+        # Miniatura é opcional - falha aqui não afeta a imagem principal
+        nome_mini = nome_miniatura(url.rsplit('/', 1)[-1])
+        try:
+            CLIENTE_BLOB.put_blob(nome_mini, imagem.miniatura, 'image/jpeg', UPLOAD_TIMEOUT_INLINE)
+        except Exception as e:
+            print(f"⚠️ Erro ao enviar miniatura {nome_mini}: {e}")
+    return url
+
+
+def upload_bytes_blob(imagem_bytes, nome_arquivo, content_type='image/jpeg', pedido_id=None, coluna=None):
+    """Faz upload de bytes (bytes/bytearray/memoryview) para Azure Blob Storage com timeout otimizado
+
+    Se o upload falhar e houver um pedido de destino (pedido_id + coluna), a imagem vai para o
+    spool em disco e é reenviada em segundo plano - a URL é gravada no pedido quando subir.
+    """
+    import requests
+
+    # Nome do blob derivado do conteúdo: a mesma imagem sempre cai no mesmo blob
+    hash_imagem = hash_conteudo(imagem_bytes)
+    nome_unico = nome_blob_por_conteudo(hash_imagem, nome_arquivo)
+
+    def fallback(prefixo, motivo):
+        if pedido_id is not None and coluna:
+            SPOOL_UPLOADS.guardar(imagem_bytes, nome_unico, content_type, pedido_id, coluna, motivo)
+        return f"{prefixo}{nome_arquivo}"
+
+    try:
+        print(f"📷 Iniciando upload RÁPIDO para blob: {nome_arquivo}")
         
-        # URL do blob para upload (com SAS token)
-        blob_url_upload = f"https://{AZURE_BLOB_CONFIG['account_name']}.blob.core.windows.net/{AZURE_BLOB_CONFIG['container_name']}/{nome_unico}?{AZURE_BLOB_CONFIG['sas_token']}"
-        print(f"🌐 URL de upload: {blob_url_upload[:100]}...")  # Mostrar só início da URL
+        # Verificar configurações antes do upload
+        if not CLIENTE_BLOB.configurado:
+            print("❌ Configurações do Azure Blob incompletas - usando backup local")
+            return fallback("local_backup_", "Azure Blob não configurado")
         
-        # Headers para upload
-        headers = {
-            'x-ms-blob-type': 'BlockBlob',
-            'Content-Type': 'image/jpeg'
-        }
+        print(f"📏 Tamanho da imagem: {len(imagem_bytes)} bytes ({len(imagem_bytes)/1024:.1f}KB)")
+
+        # Conteúdo já enviado: índice local (sem rede); HEAD no blob só se o índice se perdeu
+        url_existente = INDICE_UPLOADS.obter(hash_imagem)
+        if url_existente:
+            print(f"♻️ Conteúdo já enviado - reaproveitando {nome_unico} sem upload")
+            return url_existente
+        if INDICE_UPLOADS.verificar_com_head and CLIENTE_BLOB.existe(nome_unico, UPLOAD_TIMEOUT_INLINE):
+            url_existente = CLIENTE_BLOB.url_publica(nome_unico)
+            INDICE_UPLOADS.registrar(hash_imagem, url_existente)
+            print(f"♻️ Blob {nome_unico} já existe no container - upload dispensado")
+            return url_existente
         
-        print(f"☁️ Enviando para Azure Blob Storage com timeout de 10s...")
+        print(f"☁️ Enviando para Azure Blob Storage (conexão reaproveitada do pool, com retry)...")
         
-        # Fazer upload com TIMEOUT REDUZIDO
-        response = requests.put(blob_url_upload, data=imagem_bytes, headers=headers, timeout=10)
+        # Sessão keep-alive compartilhada: uploads seguidos reaproveitam a conexão TLS
+        # Imagens grandes vão em blocos paralelos (Put Block + Put Block List)
+        # Condicional (If-None-Match: *): blob com o mesmo hash já no container responde 409
+        response = CLIENTE_BLOB.enviar(nome_unico, imagem_bytes, content_type, UPLOAD_TIMEOUT_INLINE,
+                                       somente_se_novo=True)
         
         print(f"📤 Response status: {response.status_code}")
+        if blob_ja_existia(response):
+            url_existente = CLIENTE_BLOB.url_publica(nome_unico)
+            INDICE_UPLOADS.registrar(hash_imagem, url_existente)
+            print(f"♻️ Blob {nome_unico} já existe no container (409) - conteúdo reaproveitado")
+            return url_existente
         if response.status_code not in [200, 201]:
             print(f"📤 Response body: {response.text[:200]}")  # Primeiros 200 chars da resposta
         
         if response.status_code in [200, 201]:
             # URL pública da imagem (sem SAS token para armazenar)
-            url_publica = f"https://{AZURE_BLOB_CONFIG['account_name']}.blob.core.windows.net/{AZURE_BLOB_CONFIG['container_name']}/{nome_unico}"
+            url_publica = CLIENTE_BLOB.url_publica(nome_unico)
+            INDICE_UPLOADS.registrar(hash_imagem, url_publica)
             # Upload concluído
             
             # SEM AGUARDAR PROPAGAÇÃO - upload assíncrono
@@ -133,14 +240,39 @@ def upload_imagem_blob(imagem_base64, nome_arquivo):
             return url_publica
         else:
             print(f"❌ Erro no upload: {response.status_code} - usando backup local")
-            return f"local_backup_{nome_arquivo}"
+            return fallback("local_backup_", f"status {response.status_code}")
             
+    except FalhaUploadBlob as e:
+        print(f"❌ Erro no upload em blocos: {e} - usando backup local")
+        return fallback("local_backup_", str(e))
     except requests.exceptions.Timeout:
         print("⏰ TIMEOUT no upload - usando backup local para continuar")
-        return f"local_timeout_{nome_arquivo}"
+        return fallback("local_timeout_", "timeout")
     except Exception as e:
         print(f"❌ Erro ao fazer upload da imagem: {e} - usando backup local")
-        return f"local_error_{nome_arquivo}"
+        return fallback("local_error_", str(e))
+
+
+def reenviar_upload_spool(dados, nome_blob, content_type):
+    """Reenvio de uma entrada do spool (com timeout de leitura maior)"""
+    if not CLIENTE_BLOB.configurado:
+        raise RuntimeError("Azure Blob não configurado")
+    response = CLIENTE_BLOB.enviar(nome_blob, dados, content_type,
+                                   timeout=(CLIENTE_BLOB.timeout[0], SPOOL_TIMEOUT_LEITURA), somente_se_novo=True)
+    if response.status_code not in (200, 201) and not blob_ja_existia(response):
+        raise RuntimeError(f"Blob respondeu {response.status_code}")
+    url = CLIENTE_BLOB.url_publica(nome_blob)
+    INDICE_UPLOADS.registrar(hash_conteudo(dados), url)
+    return url
+
+
+def gravar_url_imagem_pedido(pedido_id, coluna, url):
+    """Grava a URL de uma imagem reenviada pelo spool no pedido"""
+    if coluna not in COLUNAS_IMAGEM_PEDIDO:
+        print(f"⚠️ Coluna de imagem inválida no spool: {coluna}")
+        return True  # Entrada inválida - não adianta tentar de novo
+    resultado = executar_query(f"UPDATE PEDIDOS SET {coluna} = %s WHERE ID = %s", [url, pedido_id])
+    return resultado is not None
 
 def executar_query(query, params=None):
     """Executa uma query no Azure SQL"""
@@ -191,6 +323,677 @@ def executar_query(query, params=None):
     finally:
         conn.close()
 
+def _upload_imagem_afericao(imagem, nome_arquivo, pid, coluna):
+    if isinstance(imagem, (bytes, bytearray)):
+        return upload_imagem_bytes(imagem, nome_arquivo, pid, coluna)
+    return upload_imagem_blob(imagem, nome_arquivo, pid, coluna)
+
+
+def processar_uploads_afericao(pid, img_ret, img_con):
+    """Sobe as imagens da aferição e grava as URLs no pedido (executado no POOL_UPLOADS)
+
+    As imagens podem vir em base64 (body JSON) ou já em bytes (body multipart).
+    """
+    url_ret = None
+    url_con = None
+
+    try:
+        if img_ret:
+            url_ret = _upload_imagem_afericao(img_ret, f"retirada_pedido_{pid}.jpg", pid, 'IMG_RETIRADA')
+            print(f"📷 Upload retirada concluído: {url_ret[:80] if url_ret else 'FALHA'}...")
+
+        if img_con:
+            url_con = _upload_imagem_afericao(img_con, f"consumo_pedido_{pid}.jpg", pid, 'IMG_CONSUMO')
+            print(f"📷 Upload consumo concluído: {url_con[:80] if url_con else 'FALHA'}...")
+
+        # Atualizar URLs no banco - salvar cada uma independentemente
+        updates = []
+        params = []
+        if url_ret and not url_ret.startswith('local_'):
+            updates.append("IMG_RETIRADA = %s")
+            params.append(url_ret)
+        if url_con and not url_con.startswith('local_'):
+            updates.append("IMG_CONSUMO = %s")
+            params.append(url_con)
+
+        if updates:
+            params.append(pid)
+            query_img = f"UPDATE PEDIDOS SET {', '.join(updates)} WHERE ID = %s"
+            resultado_img = executar_query(query_img, params)
+            print(f"✅ URLs das imagens salvas no banco para pedido {pid}: {resultado_img}")
+        else:
+            print(f"⚠️ Nenhuma URL válida para salvar no banco (pedido {pid})")
+
+    except Exception as e:
+        print(f"❌ Erro no upload assíncrono de imagens (pedido {pid}): {e}")
+
+def formatar_pendencia(pedido):
+    """Linha de PEDIDOS -> item da lista de pendências de aferição do frontend"""
+    # Converter DATA_RETIRADA para string se for datetime (ou 'YYYY-MM-DD' vindo do formulário)
+    data_retirada = pedido.get("DATA_RETIRADA")
+    if data_retirada:
+        if hasattr(data_retirada, 'strftime'):
+            data_retirada_str = data_retirada.strftime('%d/%m/%Y')
+        else:
+            try:
+                data_retirada_str = datetime.strptime(str(data_retirada)[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+            except ValueError:
+                data_retirada_str = str(data_retirada)
+    else:
+        data_retirada_str = "N/A"
+
+    # Tratar valores nulos/None com segurança
+    total_pagar = pedido.get("TOTAL_PAGAR")
+    if total_pagar is None or total_pagar == "":
+        total_pagar = 0.0
+    else:
+        try:
+            total_pagar = float(total_pagar)
+        except (ValueError, TypeError):
+            total_pagar = 0.0
+
+    total_colab = pedido.get("TOTAL_COLABORADORES")
+    if total_colab is None or total_colab == "":
+        total_colab = 1
+    else:
+        try:
+            total_colab = int(total_colab)
+        except (ValueError, TypeError):
+            total_colab = 1
+
+    return {
+        "id": int(pedido["ID"]),  # ID real do banco como inteiro
+        "mealName": str(pedido.get("TIPO_REFEICAO", "N/A")),
+        "date": data_retirada_str,
+        "employees": f"{total_colab} pessoas",
+        "supplier": str(pedido.get("FORNECEDOR", "N/A")),
+        "city": "N/A",  # Campo não disponível na tabela atual
+        "requestor": str(pedido.get("NOME_LIDER", "N/A")),
+        "farm": "N/A",  # Campo não disponível na tabela atual
+        "phase": "Retirada",
+        "valor_total": total_pagar
+    }
+
+
+def registrar_pedido_gravado(pedido_id, parametros):
+    """Atualiza o que é mantido em memória a partir de um pedido recém-inserido em PEDIDOS
+
+    Chamado por salvar_pedido e salvar_pedidos_lote (que também atende o write-behind).
+    """
+    pedido = dict(zip(COLUNAS_PEDIDO_INSERT, parametros), ID=pedido_id)
+    AGREGADOS_FECHAMENTO.registrar(pedido_id, pedido)
+    PEDIDOS_RECENTES.registrar(pedido_id, pedido)
+    # Avisa os assinantes SSE da equipe sobre um MARMITEX que precisa de aferição
+    if precisa_afericao(pedido['TIPO_REFEICAO'], pedido['AFERIU_TEMPERATURA']):
+        BARRAMENTO_PENDENCIAS.publicar(pedido['LIDER'], EVENTO_ADICIONADO, formatar_pendencia(pedido))
+
+
+def registrar_pedido_aferido(pedido_id, equipe):
+    """AFERIU_TEMPERATURA = 'SIM' gravado: tira o pedido das pendências em memória e avisa os assinantes"""
+    PEDIDOS_RECENTES.marcar_aferido(pedido_id)
+    BARRAMENTO_PENDENCIAS.publicar(equipe, EVENTO_REMOVIDO, {"id": int(pedido_id)})
+
+
+def verificar_colunas_temperatura():
+    """Cria as colunas de temperatura em PEDIDOS se ainda não existirem"""
+    check_columns_query = """
+    SELECT COLUMN_NAME 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_NAME = 'PEDIDOS' 
+    AND COLUMN_NAME IN ('TEMPERATURA_RETIRADA', 'TEMPERATURA_CONSUMO', 'OBSERVACOES_TEMP')
+    """
+    
+    colunas_existentes = executar_query(check_columns_query, [])
+    
+    if not colunas_existentes or len(colunas_existentes) < 3:
+        alter_queries = [
+            "ALTER TABLE PEDIDOS ADD TEMPERATURA_RETIRADA FLOAT NULL",
+            "ALTER TABLE PEDIDOS ADD TEMPERATURA_CONSUMO FLOAT NULL", 
+            "ALTER TABLE PEDIDOS ADD OBSERVACOES_TEMP NVARCHAR(500) NULL"
+        ]
+        
+        for alter_query in alter_queries:
+            try:
+                executar_query(alter_query, [])
+            except:
+                pass  # Coluna já existe
+
+
+def temperatura_opcional(valor):
+    """Temperatura do JSON ou do formulário -> float ou None (ausente/vazia); aceita vírgula decimal"""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if isinstance(valor, str):
+        valor = valor.strip().replace(',', '.')
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"temperatura inválida: {valor!r}")
+
+
+def combinar_hora(data_pedido, hora):
+    """'HH:MM' + data do pedido -> datetime (None se vazia ou inválida)"""
+    if not hora:
+        return None
+    try:
+        return datetime.combine(data_pedido, datetime.strptime(hora, '%H:%M').time())
+    except (TypeError, ValueError):
+        return None
+
+
+def registrar_afericao(afericao_data, img_retirada=None, img_consumo=None):
+    """Grava temperaturas/horas da aferição e enfileira o upload das imagens; retorna a resposta
+
+    img_retirada/img_consumo: bytes (multipart) ou base64 (dentro do JSON, lidas de afericao_data).
+    """
+    pedido_id = afericao_data['pedido_id']
+    # Mesma conversão para JSON e multipart: ausente/vazia vira NULL
+    temperatura_retirada = temperatura_opcional(afericao_data.get('temperatura_retirada'))
+    temperatura_consumo = temperatura_opcional(afericao_data.get('temperatura_consumo'))
+    hora_retirada = afericao_data.get('hora_retirada')
+    hora_consumo = afericao_data.get('hora_consumo')
+    img_retirada = img_retirada or afericao_data.get('img_retirada')
+    img_consumo = img_consumo or afericao_data.get('img_consumo')
+    observacoes = afericao_data.get('observacoes', '')
+    
+    print(f"️ Salvando temperaturas - Pedido: {pedido_id}, Retirada: {temperatura_retirada}°C, Consumo: {temperatura_consumo}°C")
+    
+    # Verificar/criar colunas de temperatura se necessário
+    verificar_colunas_temperatura()
+    
+    # Atualizar temperaturas no banco
+    query_temp = """
+    UPDATE PEDIDOS 
+    SET TEMPERATURA_RETIRADA = %s, 
+        TEMPERATURA_CONSUMO = %s,
+        HORA_RETIRADA = %s,
+        HORA_CONSUMO = %s,
+        OBSERVACOES_TEMP = %s
+    WHERE ID = %s
+    """
+    
+    # Processar horas
+    from datetime import date
+    
+    # Buscar data do pedido
+    query_data = "SELECT DATA_RETIRADA, LIDER FROM PEDIDOS WHERE ID = %s"
+    resultado_data = executar_query(query_data, [pedido_id])
+    equipe_pedido = None
+    
+    if resultado_data and len(resultado_data) > 0:
+        equipe_pedido = resultado_data[0].get('LIDER')
+        data_retirada_pedido = resultado_data[0]['DATA_RETIRADA']
+        if hasattr(data_retirada_pedido, 'date'):
+            data_retirada_pedido = data_retirada_pedido.date()
+    else:
+        data_retirada_pedido = date.today()
+    
+    # Converter horas para datetime
+    hora_retirada_dt = combinar_hora(data_retirada_pedido, hora_retirada)
+    hora_consumo_dt = combinar_hora(data_retirada_pedido, hora_consumo)
+    
+    resultado_temp = executar_query(query_temp, [
+        temperatura_retirada,
+        temperatura_consumo,
+        hora_retirada_dt,
+        hora_consumo_dt,
+        observacoes,
+        pedido_id
+    ])
+    
+    print(f"✅ Temperaturas salvas: {resultado_temp} linhas afetadas")
+    
+    # 🔥 ATUALIZAR CAMPO AFERIU_TEMPERATURA PARA "SIM"
+    query_status = "UPDATE PEDIDOS SET AFERIU_TEMPERATURA = 'SIM' WHERE ID = %s"
+    resultado_status = executar_query(query_status, [pedido_id])
+    print(f"✅ AFERIU_TEMPERATURA atualizado para 'SIM': {resultado_status} linhas afetadas")
+    if resultado_status:
+        registrar_pedido_aferido(pedido_id, equipe_pedido)
+    
+    # Upload das imagens em background (pool limitado de trabalhadores)
+    if img_retirada or img_consumo:
+        POOL_UPLOADS.submeter(
+            processar_uploads_afericao, pedido_id, img_retirada, img_consumo,
+            descricao=f"uploads do pedido {pedido_id}"
+        )
+    
+    # Resposta imediata
+    if resultado_temp is not None and resultado_temp > 0:
+        response = {
+            "error": False,
+            "message": f"✅ Temperaturas salvas instantaneamente! Upload das imagens em andamento...",
+            "pedido_id": pedido_id,
+            "temperaturas": {
+                "retirada": temperatura_retirada,
+                "consumo": temperatura_consumo
+            },
+            "status_upload": "em_andamento",
+            "urls_imagens": {
+                "retirada": "upload_iniciado",
+                "consumo": "upload_iniciado"
+            }
+        }
+    else:
+        response = {
+            "error": True,
+            "message": f"❌ Erro ao salvar temperaturas no banco (ID {pedido_id})"
+        }
+
+    return response
+
+
+# Limite do lote: 6 parâmetros por aferição no UPDATE (o SQL Server aceita até 2100 por comando)
+LOTE_MAX_AFERICOES = int(os.getenv('LOTE_MAX_AFERICOES', 50))
+
+
+def _validar_afericao_lote(afericao):
+    """Normaliza um item do lote de aferições; ValueError se inválido"""
+    if not isinstance(afericao, dict):
+        raise ValueError("aferição deve ser um objeto JSON")
+    try:
+        pedido_id = int(afericao['pedido_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("pedido_id inválido ou ausente")
+    temperaturas = []
+    for campo in ('temperatura_retirada', 'temperatura_consumo'):
+        # Ausente ou vazia vira None, como em /api/registrar-afericao
+        valor = afericao.get(campo)
+        try:
+            temperaturas.append(temperatura_opcional(valor))
+        except ValueError:
+            raise ValueError(f"{campo} inválida: {valor!r}")
+    return pedido_id, temperaturas[0], temperaturas[1]
+
+
+def registrar_afericoes_lote(afericoes):
+    """Várias aferições num único UPDATE (temperaturas, horas e AFERIU_TEMPERATURA)
+
+    As imagens de todos os itens são enfileiradas no POOL_UPLOADS depois do UPDATE.
+    Retorna o resultado por item, no formato de registrar_afericao.
+    """
+    resultados = [None] * len(afericoes)
+    validas = []        # (índice, pedido_id, temperatura_retirada, temperatura_consumo, afericao)
+    ids_no_lote = set()
+
+    for indice, afericao in enumerate(afericoes):
+        try:
+            pedido_id, temperatura_retirada, temperatura_consumo = _validar_afericao_lote(afericao)
+            if pedido_id in ids_no_lote:
+                raise ValueError(f"pedido {pedido_id} repetido dentro do lote")
+            ids_no_lote.add(pedido_id)
+            validas.append((indice, pedido_id, temperatura_retirada, temperatura_consumo, afericao))
+        except ValueError as e:
+            resultados[indice] = {"error": True, "message": f"Aferição inválida: {e}"}
+
+    if validas:
+        verificar_colunas_temperatura()
+
+        # Datas dos pedidos numa única consulta (para combinar com as horas informadas)
+        marcadores = ', '.join(['%s'] * len(validas))
+        linhas = executar_query(f"SELECT ID, DATA_RETIRADA, LIDER FROM PEDIDOS WHERE ID IN ({marcadores})",
+                                [pedido_id for _, pedido_id, _, _, _ in validas])
+        if linhas is None:
+            for indice, pedido_id, _, _, _ in validas:
+                resultados[indice] = {"error": True, "message": f"❌ Erro ao buscar pedido {pedido_id} no banco"}
+            validas = []
+        datas = {}
+        equipes = {}
+        for linha in linhas or []:
+            data_pedido = linha['DATA_RETIRADA']
+            datas[int(linha['ID'])] = data_pedido.date() if hasattr(data_pedido, 'date') else data_pedido
+            equipes[int(linha['ID'])] = linha.get('LIDER')
+
+        encontradas = []
+        for item in validas:
+            indice, pedido_id = item[0], item[1]
+            if pedido_id in datas:
+                encontradas.append(item)
+            else:
+                resultados[indice] = {"error": True, "message": f"❌ Pedido {pedido_id} não encontrado"}
+
+        if encontradas:
+            params = []
+            for _, pedido_id, temperatura_retirada, temperatura_consumo, afericao in encontradas:
+                params.extend([
+                    pedido_id,
+                    temperatura_retirada,
+                    temperatura_consumo,
+                    combinar_hora(datas[pedido_id], afericao.get('hora_retirada')),
+                    combinar_hora(datas[pedido_id], afericao.get('hora_consumo')),
+                    afericao.get('observacoes', ''),
+                ])
+            query_lote = f"""
+            UPDATE P
+            SET TEMPERATURA_RETIRADA = CAST(V.TEMPERATURA_RETIRADA AS FLOAT),
+                TEMPERATURA_CONSUMO = CAST(V.TEMPERATURA_CONSUMO AS FLOAT),
+                HORA_RETIRADA = CAST(V.HORA_RETIRADA AS DATETIME),
+                HORA_CONSUMO = CAST(V.HORA_CONSUMO AS DATETIME),
+                OBSERVACOES_TEMP = V.OBSERVACOES_TEMP,
+                AFERIU_TEMPERATURA = 'SIM'
+            FROM PEDIDOS AS P
+            INNER JOIN (VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(encontradas))})
+                AS V (ID, TEMPERATURA_RETIRADA, TEMPERATURA_CONSUMO, HORA_RETIRADA, HORA_CONSUMO, OBSERVACOES_TEMP)
+                ON P.ID = V.ID
+            """
+            resultado_lote = executar_query(query_lote, params)
+            print(f"✅ Lote de aferições: {resultado_lote} linhas atualizadas num único UPDATE")
+
+            for indice, pedido_id, temperatura_retirada, temperatura_consumo, afericao in encontradas:
+                if resultado_lote is None:
+                    resultados[indice] = {
+                        "error": True,
+                        "message": f"❌ Erro ao salvar temperaturas no banco (ID {pedido_id})"
+                    }
+                    continue
+                registrar_pedido_aferido(pedido_id, equipes[pedido_id])
+                img_retirada = afericao.get('img_retirada')
+                img_consumo = afericao.get('img_consumo')
+                if img_retirada or img_consumo:
+                    POOL_UPLOADS.submeter(
+                        processar_uploads_afericao, pedido_id, img_retirada, img_consumo,
+                        descricao=f"uploads do pedido {pedido_id} (lote)"
+                    )
+                resultados[indice] = {
+                    "error": False,
+                    "message": "✅ Temperaturas salvas!",
+                    "pedido_id": pedido_id,
+                    "temperaturas": {
+                        "retirada": temperatura_retirada,
+                        "consumo": temperatura_consumo
+                    },
+                    "status_upload": "em_andamento" if img_retirada or img_consumo else "sem_imagens"
+                }
+
+    salvas = sum(1 for r in resultados if not r['error'])
+    print(f"🌡️ Lote de aferições: {salvas}/{len(afericoes)} salvas")
+    return {
+        "error": salvas == 0,
+        "message": f"{salvas} de {len(afericoes)} aferição(ões) salvas",
+        "salvas": salvas,
+        "falhas": len(afericoes) - salvas,
+        "resultados": resultados
+    }
+
+
+COLUNAS_PEDIDO_INSERT = ESQUEMA_PEDIDO.colunas
+# Limite do lote: 23 parâmetros por pedido e o SQL Server aceita até 2100 por comando
+LOTE_MAX_PEDIDOS = int(os.getenv('LOTE_MAX_PEDIDOS', 20))
+
+
+# Query COMPLETA com todos os campos disponíveis + APROVADO_POR + AFERIU_TEMPERATURA
+# ✅ FECHAMENTO removido - será preenchido pela TRIGGER do SQL
+QUERY_INSERIR_PEDIDO = """
+INSERT INTO PEDIDOS (
+    DATA_RETIRADA, DATA_ENVIO1, PROJETO, COORDENADOR, SUPERVISOR, 
+    LIDER, NOME_LIDER, FAZENDA, TIPO_REFEICAO, CIDADE_PRESTACAO_DO_SERVICO,
+    FORNECEDOR, VALOR_PAGO, COLABORADORES, TOTAL_COLABORADORES, A_CONTRATAR,
+    RESPONSAVEL_PELO_CARTAO, PAGCORP, HOSPEDADO, NOME_DO_HOTEL, VALOR_DIARIA,
+    TOTAL_PAGAR, APROVADO_POR, OBSERVACOES, AFERIU_TEMPERATURA
+) VALUES (%s, DATEADD(hour, -6, GETUTCDATE()), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def verificar_estrutura_pedidos():
+    """Confere/cria a coluna AFERIU_TEMPERATURA (com tamanho para 'NAO_NECESSITA')"""
+    # Verificar estrutura da tabela PEDIDOS primeiro
+    check_table_query = """
+    SELECT COLUMN_NAME, DATA_TYPE 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_NAME = 'PEDIDOS'
+    ORDER BY ORDINAL_POSITION
+    """
+
+    colunas = executar_query(check_table_query, [])
+    if colunas:
+        print("🔍 Estrutura da tabela PEDIDOS:")
+        coluna_aferiu_existe = False
+        for col in colunas:
+            print(f"   - {col['COLUMN_NAME']} ({col['DATA_TYPE']})")
+            if col['COLUMN_NAME'] == 'AFERIU_TEMPERATURA':
+                coluna_aferiu_existe = True
+
+        # Verificar se coluna AFERIU_TEMPERATURA existe e tem tamanho adequado
+        if not coluna_aferiu_existe:
+            print("⚠️ Coluna AFERIU_TEMPERATURA não existe! Criando...")
+            try:
+                alter_query = "ALTER TABLE PEDIDOS ADD AFERIU_TEMPERATURA NVARCHAR(50) NULL"
+                resultado_alter = executar_query(alter_query, [])
+                print(f"✅ Coluna AFERIU_TEMPERATURA criada: {resultado_alter}")
+            except Exception as e:
+                print(f"❌ Erro ao criar coluna AFERIU_TEMPERATURA: {e}")
+        else:
+            print("✅ Coluna AFERIU_TEMPERATURA já existe")
+            # Verificar tamanho da coluna
+            try:
+                size_query = """
+                SELECT CHARACTER_MAXIMUM_LENGTH 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_NAME = 'PEDIDOS' AND COLUMN_NAME = 'AFERIU_TEMPERATURA'
+                """
+                size_result = executar_query(size_query, [])
+                if size_result and len(size_result) > 0:
+                    current_size = size_result[0]['CHARACTER_MAXIMUM_LENGTH']
+                    print(f"🔍 Tamanho atual da coluna AFERIU_TEMPERATURA: {current_size}")
+
+                    if current_size < 20:  # Precisa de pelo menos 20 para 'NAO_NECESSITA'
+                        print(f"⚠️ Coluna muito pequena ({current_size}), aumentando para 50...")
+                        alter_size_query = "ALTER TABLE PEDIDOS ALTER COLUMN AFERIU_TEMPERATURA NVARCHAR(50)"
+                        resultado_size = executar_query(alter_size_query, [])
+                        print(f"✅ Tamanho da coluna alterado: {resultado_size}")
+                    else:
+                        print(f"✅ Tamanho da coluna adequado: {current_size}")
+            except Exception as e:
+                print(f"❌ Erro ao verificar/alterar tamanho da coluna: {e}")
+    else:
+        print("⚠️ Não foi possível obter estrutura da tabela")
+
+
+def montar_pedido(pedido_data):
+    """Extrai e normaliza os campos do pedido (esquema compilado em esquema_pedido.py)
+
+    Retorna (parametros, resumo): parametros na ordem de COLUNAS_PEDIDO_INSERT e resumo com os
+    campos devolvidos na resposta. Levanta ValueError para campos ausentes ou inválidos.
+    """
+    return ESQUEMA_PEDIDO.montar(pedido_data)
+
+
+def salvar_pedido(pedido_data):
+    """Insere o pedido em PEDIDOS e retorna a resposta da API (com o ID real gerado pelo banco)"""
+    try:
+        parametros, resumo = montar_pedido(pedido_data)
+    except ValueError as e:
+        print(f"❌ Pedido inválido: {e}")
+        return {"error": True, "message": f"Pedido inválido: {e}"}
+    print(f"📋 Pedido {resumo['tipo_refeicao']} da equipe {pedido_data.get('equipe', '')}: "
+          f"R$ {resumo['total_pagar']} (aferiu temperatura: {resumo['aferiu_temperatura'] or '-'})")
+
+    verificar_estrutura_pedidos()
+    resultado = executar_query(QUERY_INSERIR_PEDIDO, parametros)
+
+    if resultado is not None and isinstance(resultado, dict) and 'inserted_id' in resultado:
+        # Sucesso - retornar o ID real do banco
+        pedido_id_real = resultado['inserted_id']
+        print(f"✅ Pedido salvo com ID real: {pedido_id_real}")
+        registrar_pedido_gravado(pedido_id_real, parametros)
+
+        # ✅ AFERIU_TEMPERATURA JÁ FOI INSERIDO DIRETAMENTE NA QUERY PRINCIPAL
+        # ✅ AFERIU_TEMPERATURA JÁ FOI INSERIDO DIRETAMENTE NA QUERY PRINCIPAL
+
+        response = {
+            "error": False,
+            "message": "Pedido salvo com sucesso!",
+            "pedido_id": pedido_id_real,
+            **resumo
+        }
+    else:
+        print(f"❌ Falha ao inserir - resultado: {resultado}")
+        response = {
+            "error": True,
+            "message": "Erro ao salvar pedido no banco de dados",
+            "debug": str(resultado)
+        }
+
+    return response
+
+
+# Erros do DB-Library (cliente), não do SQL: falha/queda de conexão e timeouts
+CODIGOS_ERRO_CONEXAO = {20002, 20003, 20004, 20006, 20009, 20047}
+
+
+def erro_de_conexao(e):
+    """True se a exceção do pymssql é de conexão/timeout (o comando nem chegou a ser avaliado)"""
+    if isinstance(e, pymssql.InterfaceError):
+        return True
+    return isinstance(e, pymssql.OperationalError) and bool(e.args) and e.args[0] in CODIGOS_ERRO_CONEXAO
+
+
+def inserir_pedidos_lote(lista_parametros):
+    """Insere vários pedidos num único comando (uma transação); retorna os IDs na ordem ou None
+
+    None = o SQL recusou o lote; sem conexão ou em timeout levanta BancoIndisponivel.
+
+    MERGE com OUTPUT ... INTO: o OUTPUT traz a posição de cada linha junto com o ID gerado
+    (INSERT ... OUTPUT não garante a ordem, e PEDIDOS tem trigger, o que exige o INTO).
+    """
+    colunas = ', '.join(COLUNAS_PEDIDO_INSERT)
+    linha = '(' + ', '.join(['%s'] * (len(COLUNAS_PEDIDO_INSERT) + 1)) + ')'
+    query = f"""
+    SET NOCOUNT ON;
+    DECLARE @ids TABLE (ORDEM INT, ID INT);
+    MERGE INTO PEDIDOS AS destino
+    USING (VALUES {', '.join([linha] * len(lista_parametros))}) AS origem (ORDEM, {colunas})
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT (DATA_ENVIO1, {colunas})
+        VALUES (DATEADD(hour, -6, GETUTCDATE()), {', '.join('origem.' + c for c in COLUNAS_PEDIDO_INSERT)})
+    OUTPUT origem.ORDEM, INSERTED.ID INTO @ids;
+    SELECT ORDEM, ID FROM @ids ORDER BY ORDEM;
+    """
+    params = []
+    for ordem, parametros in enumerate(lista_parametros):
+        params.append(ordem)
+        params.extend(parametros)
+
+    conn = conectar_azure_sql()
+    if conn is None:
+        raise BancoIndisponivel("sem conexão com o Azure SQL")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        ids = [int(linha_id) for _, linha_id in cursor.fetchall()]
+        conn.commit()
+        if len(ids) != len(lista_parametros):
+            raise RuntimeError(f"{len(ids)} IDs retornados para {len(lista_parametros)} pedidos")
+        return ids
+    except Exception as e:
+        print(f"❌ Erro ao inserir lote de pedidos: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        if erro_de_conexao(e):
+            raise BancoIndisponivel(str(e)) from e
+        return None
+    finally:
+        conn.close()
+
+
+def salvar_pedidos_lote(pedidos, propagar_indisponivel=False):
+    """Valida todos os pedidos, insere os válidos de uma vez e retorna o resultado por item
+
+    propagar_indisponivel: com o banco fora do ar levanta BancoIndisponivel (write-behind)
+    em vez de responder erro em cada item.
+    """
+    resultados = [None] * len(pedidos)
+    validos = []        # (índice, parametros, resumo, chave, impressao)
+    chaves_no_lote = set()
+
+    for indice, pedido_data in enumerate(pedidos):
+        try:
+            if not isinstance(pedido_data, dict):
+                raise ValueError("pedido deve ser um objeto JSON")
+
+            chave = (pedido_data.get('idempotency_key') or '').strip()
+            impressao = impressao_pedido(pedido_data) if chave else None
+            if chave:
+                if chave in chaves_no_lote:
+                    raise ValueError("idempotency_key repetida dentro do lote")
+                chaves_no_lote.add(chave)
+                anterior = REGISTRO_IDEMPOTENCIA.obter(chave, impressao)
+                if anterior is not None:
+                    resultados[indice] = dict(anterior, repetido=True)
+                    continue
+
+            parametros, resumo = montar_pedido(pedido_data)
+            validos.append((indice, parametros, resumo, chave, impressao))
+        except (ValueError, ConflitoIdempotencia) as e:
+            resultados[indice] = {"error": True, "message": f"Pedido inválido: {e}"}
+
+    if validos:
+        verificar_estrutura_pedidos()
+        try:
+            ids = inserir_pedidos_lote([parametros for _, parametros, _, _, _ in validos])
+        except BancoIndisponivel:
+            if propagar_indisponivel:
+                raise
+            ids = None
+        for posicao, (indice, parametros, resumo, chave, impressao) in enumerate(validos):
+            if ids is None:
+                resultados[indice] = {"error": True, "message": "Erro ao salvar lote no banco de dados"}
+                continue
+            registrar_pedido_gravado(ids[posicao], parametros)
+            resultados[indice] = {
+                "error": False,
+                "message": "Pedido salvo com sucesso!",
+                "pedido_id": ids[posicao],
+                **resumo
+            }
+            if chave:
+                REGISTRO_IDEMPOTENCIA.registrar(chave, impressao, resultados[indice])
+
+    salvos = sum(1 for r in resultados if not r['error'])
+    print(f"📦 Lote de pedidos: {salvos}/{len(pedidos)} salvos")
+    return {
+        "error": salvos == 0,
+        "message": f"{salvos} de {len(pedidos)} pedido(s) salvos",
+        "salvos": salvos,
+        "falhas": len(pedidos) - salvos,
+        "resultados": resultados
+    }
+
+
+def salvar_pedido_write_behind(pedido_data):
+    """Valida, grava no diário local e confirma na hora com um ID provisório
+
+    A gravação em PEDIDOS é feita depois, em lote, pela thread do DIARIO_PEDIDOS.
+    """
+    try:
+        _, resumo = montar_pedido(pedido_data)
+    except ValueError as e:
+        return {"error": True, "message": f"Pedido inválido: {e}"}
+
+    id_provisorio = DIARIO_PEDIDOS.registrar(pedido_data)
+    print(f"📒 Pedido registrado no diário local: {id_provisorio}")
+    return {
+        "error": False,
+        "message": "Pedido recebido! Gravação no banco em andamento",
+        "pedido_id": None,
+        "id_provisorio": id_provisorio,
+        "status": "pendente",
+        **resumo
+    }
+
+
+def gravar_lote_diario(pedidos):
+    """Grava no banco os pedidos pendentes do diário
+
+    Cada pedido chega com o ID provisório em idempotency_key: um pedido reenviado depois de uma
+    queda entre o COMMIT no banco e a marcação no diário devolve o resultado já registrado.
+    Banco fora do ar levanta BancoIndisponivel: o diário adia o lote sem refazer item a item.
+    """
+    return salvar_pedidos_lote(pedidos, propagar_indisponivel=True)['resultados']
+
+
 class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         """Override para evitar crash em log quando pipe quebra"""
@@ -200,25 +1003,58 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
             pass
 
     def serve_html_file(self, filename):
-        """Serve arquivos HTML estáticos"""
+        """Serve arquivos HTML estáticos (a partir do cache em memória)"""
+        self.serve_static_file(filename, 'text/html')
+
+    def serve_static_file(self, filename, content_type):
+        """Serve arquivos estáticos (JS, JSON, CSS, PNG) do cache em memória, com ETag/304 e gzip/br"""
         try:
-            with open(filename, 'r', encoding='utf-8') as file:
-                content = file.read()
+            asset = CACHE_ASSETS.obter(filename, content_type)
+            if asset is None:
+                self.send_response(404)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b'<h1>404 - Arquivo nao encontrado</h1>')
+                return
+
+            if asset.corresponde_etag(self.headers.get('If-None-Match')):
+                self.send_response(304)
+                self.send_header('ETag', asset.etag)
+                self.send_header('Cache-Control', asset.cache_control)
+                if asset.comprimivel:
+                    self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+
+            if not asset.em_memoria:
+                self._enviar_arquivo_binario(asset)
+                return
+
+            content_encoding = None
+            if asset.comprimivel:
+                content_encoding = negociar_encoding(self.headers.get('Accept-Encoding'), tuple(e for e in asset.variantes if e))
+            corpo = asset.variantes[content_encoding]
 
             self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-type', asset.content_type)
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', asset.cache_control)
+            if asset.comprimivel:
+                self.send_header('Vary', 'Accept-Encoding')
+            if content_type == 'text/html':
+                link_preload = CACHE_ASSETS.link_preload(filename)
+                if link_preload:
+                    self.send_header('Link', link_preload)
+            if content_encoding:
+                self.send_header('Content-Encoding', content_encoding)
+            self.send_header('Content-Length', str(len(corpo)))
             self.end_headers()
-            self.wfile.write(content.encode('utf-8'))
+            self.wfile.write(corpo)
 
         except BrokenPipeError:
             # Cliente desconectou antes de receber a resposta completa - ignorar
             pass
-        except FileNotFoundError:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(b'<h1>404 - Arquivo nao encontrado</h1>')
         except Exception as e:
             try:
                 self.send_response(500)
@@ -228,41 +1064,38 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
             except BrokenPipeError:
                 pass
 
-    def serve_static_file(self, filename, content_type):
-        """Serve arquivos estáticos (JS, JSON, CSS) com MIME type correto"""
+    def _enviar_arquivo_binario(self, asset):
+        """Envia um arquivo binário direto do disco (sendfile), com suporte a Range/If-Range"""
+        inicio, fim = 0, asset.tamanho - 1
+        status = 200
         try:
-            # Determinar modo de leitura baseado no tipo
-            mode = 'r' if content_type.startswith('text/') or content_type == 'application/json' or content_type == 'application/javascript' else 'rb'
-            encoding = 'utf-8' if mode == 'r' else None
-
-            with open(filename, mode, encoding=encoding) as file:
-                content = file.read()
-
-            self.send_response(200)
-            self.send_header('Content-type', f'{content_type}; charset=utf-8' if encoding else content_type)
-            self.send_header('Access-Control-Allow-Origin', '*')
+            if asset.range_valido_para(self.headers.get('If-Range')):
+                intervalo = interpretar_range(self.headers.get('Range'), asset.tamanho)
+                if intervalo is not None:
+                    inicio, fim = intervalo
+                    status = 206
+        except RangeInvalido:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{asset.tamanho}')
+            self.send_header('Content-Length', '0')
             self.end_headers()
+            return
 
-            if encoding:
-                self.wfile.write(content.encode('utf-8'))
-            else:
-                self.wfile.write(content)
-
-        except BrokenPipeError:
-            pass
-        except FileNotFoundError:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/html')
+        with open(asset.caminho_disco, 'rb') as arquivo:
+            self.send_response(status)
+            self.send_header('Content-type', asset.content_type)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('ETag', asset.etag)
+            self.send_header('Last-Modified', asset.ultima_modificacao)
+            self.send_header('Cache-Control', asset.cache_control)
+            self.send_header('Accept-Ranges', 'bytes')
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {inicio}-{fim}/{asset.tamanho}')
+            self.send_header('Content-Length', str(fim - inicio + 1))
             self.end_headers()
-            self.wfile.write(b'<h1>404 - Arquivo nao encontrado</h1>')
-        except Exception as e:
-            try:
-                self.send_response(500)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(f'<h1>500 - Erro do servidor: {str(e)}</h1>'.encode('utf-8'))
-            except BrokenPipeError:
-                pass
+            if fim >= inicio:
+                # socket.sendfile usa os.sendfile (zero-copy) quando disponível
+                self.connection.sendfile(arquivo, offset=inicio, count=fim - inicio + 1)
 
     def do_GET(self):
         # Parse da URL
@@ -280,6 +1113,14 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(response).encode('utf-8'))
             return
         
+        if path == '/api/eventos-pendencias':
+            self._stream_eventos_pendencias(query_params.get('equipe', [''])[0])
+            return
+
+        if path == '/api/exportar-pedidos':
+            self._exportar_pedidos(query_params)
+            return
+        
         # Servir arquivos estáticos
         if path == '/' or path == '/index.html':
             self.serve_html_file('index.html')
@@ -302,16 +1143,11 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
         elif path.endswith('.png'):
             self.serve_static_file(path[1:], 'image/png')
             return
+        elif path.endswith('.svg'):
+            self.serve_static_file(path[1:], 'image/svg+xml')
+            return
         
-        # Headers CORS para APIs
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-        
-        # APIs simuladas
+        # APIs (headers enviados junto com a resposta, após a negociação de compressão)
         if path == '/api/config':
             # Endpoint para fornecer configurações do frontend
             response = {
@@ -336,6 +1172,15 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     "AZURE_STORAGE_CONTAINER": os.getenv('AZURE_STORAGE_CONTAINER', 'NÃO DEFINIDA'),
                     "AZURE_SAS_TOKEN": os.getenv('AZURE_SAS_TOKEN', 'NÃO DEFINIDA')[:50] + "..." if os.getenv('AZURE_SAS_TOKEN') else 'NÃO DEFINIDA'
                 },
+                "upload_metricas": CLIENTE_BLOB.metricas.resumo(),
+                "fila_uploads": POOL_UPLOADS.estatisticas(),
+                "spool_uploads": SPOOL_UPLOADS.estatisticas(),
+                "dedup_uploads": INDICE_UPLOADS.estatisticas(),
+                "idempotencia_pedidos": REGISTRO_IDEMPOTENCIA.estatisticas(),
+                "diario_pedidos": DIARIO_PEDIDOS.estatisticas() if DIARIO_PEDIDOS is not None else None,
+                "eventos_pendencias": BARRAMENTO_PENDENCIAS.estatisticas(),
+                "agregados_fechamento": AGREGADOS_FECHAMENTO.estatisticas(),
+                "pedidos_recentes": PEDIDOS_RECENTES.estatisticas(),
                 "timestamp": datetime.now(pytz.timezone('America/Sao_Paulo')).isoformat()
             }
             
@@ -543,8 +1388,13 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                 query_params_db = []
             
             try:
+                # Mesmo limite do DATEADD(day, -7, GETDATE()) (GETDATE do Azure SQL é UTC)
+                desde = datetime.utcnow() - timedelta(days=7)
                 if query is None:
                     pedidos_pendentes = []
+                elif PEDIDOS_RECENTES.cobre(desde.date()):
+                    pedidos_pendentes = PEDIDOS_RECENTES.pendentes(equipe_param, desde)
+                    print("🗂️ Pendências servidas do índice em memória")
                 else:
                     pedidos_pendentes = executar_query(query, query_params_db)
                 print(f"📊 Query executada. Resultado: {type(pedidos_pendentes)}")
@@ -560,45 +1410,7 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                         aferiu_status = pedido.get('AFERIU_TEMPERATURA', 'NULL')
                         print(f"   📋 Pedido ID {pedido['ID']}: {pedido['TIPO_REFEICAO']} - {pedido.get('DATA_RETIRADA', 'N/A')} - Equipe: {equipe_pedido} - Status: {aferiu_status}")
                         
-                        # Converter DATA_RETIRADA para string se for datetime
-                        data_retirada = pedido.get("DATA_RETIRADA")
-                        if data_retirada:
-                            data_retirada_str = data_retirada.strftime('%d/%m/%Y') if hasattr(data_retirada, 'strftime') else str(data_retirada)
-                        else:
-                            data_retirada_str = "N/A"
-                        
-                        # Tratar valores nulos/None com segurança
-                        total_pagar = pedido.get("TOTAL_PAGAR")
-                        if total_pagar is None or total_pagar == "":
-                            total_pagar = 0.0
-                        else:
-                            try:
-                                total_pagar = float(total_pagar)
-                            except (ValueError, TypeError):
-                                total_pagar = 0.0
-                        
-                        total_colab = pedido.get("TOTAL_COLABORADORES")
-                        if total_colab is None or total_colab == "":
-                            total_colab = 1
-                        else:
-                            try:
-                                total_colab = int(total_colab)
-                            except (ValueError, TypeError):
-                                total_colab = 1
-
-                        pendencia = {
-                            "id": int(pedido["ID"]),  # ID real do banco como inteiro
-                            "mealName": str(pedido.get("TIPO_REFEICAO", "N/A")),
-                            "date": data_retirada_str,
-                            "employees": f"{total_colab} pessoas",
-                            "supplier": str(pedido.get("FORNECEDOR", "N/A")),
-                            "city": "N/A",  # Campo não disponível na tabela atual
-                            "requestor": str(pedido.get("NOME_LIDER", "N/A")),
-                            "farm": "N/A",  # Campo não disponível na tabela atual
-                            "phase": "Retirada",
-                            "valor_total": total_pagar
-                        }
-                        pendencias_formatadas.append(pendencia)
+                        pendencias_formatadas.append(formatar_pendencia(pedido))
                     
                     print(f"📤 Enviando {len(pendencias_formatadas)} pendências formatadas")
                     
@@ -645,7 +1457,6 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     brasilia_tz = pytz.timezone('America/Sao_Paulo')
                     hoje = datetime.now(brasilia_tz).date()
                     
-                    from datetime import timedelta
                     ontem = hoje - timedelta(days=1)
                     
                     print(f"📅 Buscando pedidos de ONTEM: {ontem.strftime('%Y-%m-%d')}")
@@ -663,7 +1474,10 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     ORDER BY DATA_ENVIO1 DESC, ID DESC
                     """
                     
-                    resultado = executar_query(query, [equipe_param, ontem])
+                    # Índice em memória; None = fora da janela ou pedido ainda sem FECHAMENTO
+                    resultado = PEDIDOS_RECENTES.do_dia(equipe_param, ontem) if PEDIDOS_RECENTES.cobre(ontem) else None
+                    if resultado is None:
+                        resultado = executar_query(query, [equipe_param, ontem])
                     
                     if resultado and len(resultado) > 0:
                         print(f"✅ Encontrados {len(resultado)} pedidos de ontem para {equipe_param}")
@@ -725,58 +1539,215 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     "error": True,
                     "message": f"Erro ao buscar último pedido: {str(e)}"
                 }
+        elif path == '/api/pedidos':
+            # Histórico de pedidos com filtros, projeção (?campos=) e paginação por cursor
+            try:
+                query, params, campos, limite = montar_consulta_historico(query_params)
+                linhas = executar_query(query, params)
+                if linhas is None:
+                    response = {"error": True, "message": "Erro ao consultar histórico de pedidos"}
+                else:
+                    pagina, proximo_cursor = paginar(linhas, limite)
+                    response = {
+                        "error": False,
+                        "pedidos": [serializar_linha(linha) for linha in pagina],
+                        "total": len(pagina),
+                        "campos": list(campos),
+                        "proximo_cursor": proximo_cursor
+                    }
+            except ConsultaHistoricoInvalida as e:
+                response = {"error": True, "message": f"Parâmetro inválido: {e}"}
+            except Exception as e:
+                print(f"❌ Erro ao consultar histórico de pedidos: {e}")
+                response = {"error": True, "message": f"Erro ao consultar histórico: {str(e)}"}
+        elif path == '/api/relatorio-fechamento':
+            # Totais por fornecedor/projeto/período de FECHAMENTO, servidos dos agregados em memória
+            def filtro(nome):
+                valor = (query_params.get(nome, [''])[0] or '').strip()
+                return valor or None
+
+            if not AGREGADOS_FECHAMENTO.carregado:
+                response = {"error": True, "message": "Agregados de fechamento ainda não carregados - tente novamente em instantes"}
+            else:
+                grupos = AGREGADOS_FECHAMENTO.relatorio(filtro('fechamento'), filtro('fornecedor'), filtro('projeto'))
+                estatisticas = AGREGADOS_FECHAMENTO.estatisticas()
+                response = {
+                    "error": False,
+                    "grupos": grupos,
+                    "total": len(grupos),
+                    "total_pagar": round(sum(g["total_pagar"] for g in grupos), 2),
+                    "pedidos": sum(g["pedidos"] for g in grupos),
+                    "refeicoes": sum(g["refeicoes"] for g in grupos),
+                    "pedidos_aguardando_fechamento": estatisticas["pendentes"],
+                    "reconciliado_em": estatisticas["reconciliado_em"]
+                }
+        elif path == '/api/status-pedido':
+            # Status de um pedido confirmado pelo diário local (modo write-behind)
+            id_provisorio = query_params.get('id', [''])[0]
+            if DIARIO_PEDIDOS is None:
+                response = {"error": True, "message": "Modo write-behind desativado (PEDIDOS_WRITE_BEHIND)"}
+            elif not id_provisorio:
+                response = {"error": True, "message": "Parâmetro 'id' é obrigatório"}
+            else:
+                status_pedido = DIARIO_PEDIDOS.obter(id_provisorio)
+                if status_pedido is None:
+                    response = {"error": True, "message": f"Pedido {id_provisorio} não encontrado no diário"}
+                else:
+                    response = {"error": False, **status_pedido}
         else:
             response = {"error": True, "message": "Endpoint não encontrado"}
         
-        self.wfile.write(json.dumps(response, ensure_ascii=False, default=decimal_default).encode('utf-8'))
-
-    def _read_full_body(self):
-        """Lê o corpo completo do POST de forma robusta (loop até receber tudo)"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length == 0:
-            return b''
-
-        body = b''
-        remaining = content_length
-        while remaining > 0:
-            chunk = self.rfile.read(min(remaining, 65536))
-            if not chunk:
-                break
-            body += chunk
-            remaining -= len(chunk)
-
-        if len(body) != content_length:
-            print(f"⚠️ Body incompleto: esperado {content_length} bytes, recebido {len(body)} bytes")
-
-        return body
-
-    def _send_json_headers(self):
-        """Envia headers padrão para resposta JSON"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+        self._enviar_json(response)
+
+    def _read_full_body(self, limite=LIMITE_BODY_PADRAO):
+        """Lê o corpo completo do POST num buffer pré-alocado (respeitando o limite da rota)"""
+        content_length = obter_content_length(self.headers, limite)
+        return ler_body_completo(self.rfile, content_length)
+
+    def _abrir_body_stream(self, limite=LIMITE_BODY_PADRAO):
+        """Retorna um leitor incremental do body (para handlers que não precisam dele inteiro)"""
+        content_length = obter_content_length(self.headers, limite)
+        return LeitorBodyStream(self.rfile, content_length)
+
+    def _stream_eventos_pendencias(self, equipe):
+        """text/event-stream com as pendências de aferição da equipe (adicionado/removido)"""
+        if not equipe or equipe == 'SEM_EQUIPE':
+            self._enviar_json({"error": True, "message": "Parâmetro 'equipe' é obrigatório"}, status=400)
+            return
+        try:
+            assinatura = BARRAMENTO_PENDENCIAS.assinar(equipe)
+        except LimiteAssinantes as e:
+            print(f"⚠️ Conexão de eventos recusada ({equipe}): {e}")
+            self._enviar_json({"error": True, "message": str(e)}, status=503)
+            return
+
+        print(f"📡 Eventos de pendências: equipe {equipe} conectada")
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')  # Proxies não devem segurar os eventos
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(f'retry: {SSE_RETRY_MS}\n\n'.encode('ascii'))
+            self.wfile.flush()
+
+            while True:
+                mensagem = assinatura.proxima(SSE_HEARTBEAT)
+                if mensagem == FIM or assinatura.transbordou:
+                    break
+                # Sem eventos no intervalo: comentário SSE mantém a conexão viva e detecta cliente que saiu
+                self.wfile.write(mensagem if mensagem is not None else b': heartbeat\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass  # Cliente fechou a aba / perdeu a rede
+        finally:
+            BARRAMENTO_PENDENCIAS.cancelar(assinatura)
+            self.close_connection = True
+            print(f"📡 Eventos de pendências: equipe {equipe} desconectada")
+
+    def _exportar_pedidos(self, query_params):
+        """CSV/NDJSON de PEDIDOS num período, enviado em pedaços conforme o banco devolve as linhas
+
+        ?gzip=1 baixa um arquivo .gz; sem ele, o gzip é negociado pelo Accept-Encoding (transparente
+        para navegador e curl --compressed).
+        """
+        try:
+            query, params, campos, formato = montar_consulta_exportacao(query_params)
+        except ConsultaHistoricoInvalida as e:
+            self._enviar_json({"error": True, "message": f"Parâmetro inválido: {e}"}, status=400)
+            return
+
+        # Conexão própria: o cursor fica aberto durante todo o download
+        conn = conectar_azure_sql()
+        if not conn:
+            self._enviar_json({"error": True, "message": "Erro de conexão com banco de dados"}, status=503)
+            return
+
+        arquivo_gz = query_params.get('gzip', [''])[0] in ('1', 'true', 'sim')
+        content_encoding = None if arquivo_gz else negociar_encoding(self.headers.get('Accept-Encoding'), ('gzip',))
+        arquivo = nome_arquivo(query_params, formato) + ('.gz' if arquivo_gz else '')
+        print(f"📤 Exportação {arquivo}: iniciando")
+        try:
+            # Sem Content-Length (tamanho desconhecido): o fim do corpo é o fechamento da conexão
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/gzip' if arquivo_gz else FORMATOS[formato][0])
+            self.send_header('Content-Disposition', f'attachment; filename="{arquivo}"')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Vary', 'Accept-Encoding')
+            if content_encoding:
+                self.send_header('Content-Encoding', content_encoding)
+            self.end_headers()
+
+            def escrever(dados):
+                self.wfile.write(dados)
+                self.wfile.flush()
+
+            total = exportar(conn.cursor(), query, params, campos, formato, escrever,
+                             gzip=arquivo_gz or content_encoding == 'gzip')
+            print(f"📤 Exportação {arquivo}: {total} pedido(s) enviados")
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            print(f"⚠️ Exportação {arquivo}: cliente desconectou")
+        except Exception as e:
+            # Os headers já foram enviados: o arquivo termina truncado e o erro fica no log
+            print(f"❌ Erro na exportação {arquivo}: {e}")
+        finally:
+            conn.close()
+
+    def _enviar_json(self, response, status=200):
+        """Serializa e envia a resposta JSON, comprimida se o cliente aceitar (gzip/br)"""
+        corpo = json.dumps(response, ensure_ascii=False, default=decimal_default).encode('utf-8')
+        corpo, content_encoding = comprimir_resposta(corpo, self.headers.get('Accept-Encoding'))
+
+        try:
+            self.send_response(status)
+            self.send_header('Content-type', 'application/json; charset=utf-8')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Idempotency-Key')
+            # Resposta varia conforme Accept-Encoding (caches intermediários/SW precisam saber)
+            self.send_header('Vary', 'Accept-Encoding')
+            if content_encoding:
+                self.send_header('Content-Encoding', content_encoding)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+        except BrokenPipeError:
+            # Cliente desconectou antes de receber a resposta completa - ignorar
+            pass
 
     def do_POST(self):
-        # Parse da URL
+        # Parse da URL (decodificado: /api/aferição-temperatura chega como %C3%A7%C3%A3o)
         parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
+        path = urllib.parse.unquote(parsed_path.path)
 
         # Ler body ANTES de enviar response headers (evita truncamento)
+        limite_body = limite_para_rota(path)
+        post_body = None
+        body_stream = None
         try:
-            post_body = self._read_full_body()
+            if path in ROTAS_BODY_STREAMING or (path in ROTAS_AFERICAO
+                                                 and extrair_boundary(self.headers.get('Content-Type', ''))):
+                body_stream = self._abrir_body_stream(limite_body)
+            else:
+                post_body = self._read_full_body(limite_body)
+        except BodyMuitoGrande as e:
+            print(f"❌ Body muito grande no POST {path}: {e}")
+            # Não vamos ler o body - fechar a conexão para não misturar com a próxima requisição
+            self.close_connection = True
+            response = {"error": True, "message": f"Dados muito grandes: limite de {e.limite // 1024}KB para esta rota"}
+            self._enviar_json(response, status=413)
+            return
         except Exception as e:
             print(f"❌ Erro ao ler body do POST {path}: {e}")
-            self._send_json_headers()
             response = {"error": True, "message": f"Erro ao ler dados: {str(e)}"}
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+            self._enviar_json(response)
             return
 
-        # Agora enviar headers
-        self._send_json_headers()
-        
+        # Headers são enviados em _enviar_json, junto com a resposta já serializada
         if path == '/api/salvar-pedido':
             # Usar body já lido
             try:
@@ -785,7 +1756,7 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                 if len(post_body) == 0:
                     print("❌ Erro: Body está vazio")
                     response = {"error": True, "message": "Dados vazios recebidos"}
-                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                    self._enviar_json(response)
                     return
 
                 print(f"📦 Dados brutos recebidos ({len(post_body)} bytes): {post_body[:200]}...")
@@ -797,7 +1768,7 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                 if not post_data_str.strip():
                     print("❌ Erro: String decodificada está vazia")
                     response = {"error": True, "message": "Dados decodificados estão vazios"}
-                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                    self._enviar_json(response)
                     return
 
                 # Parse JSON
@@ -808,194 +1779,33 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                 print(f"❌ Erro ao fazer parse do JSON: {e}")
                 print(f"❌ Dados problemáticos: {post_body[:500]}")
                 response = {"error": True, "message": f"Erro no formato JSON: {str(e)}"}
-                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                self._enviar_json(response)
                 return
             except Exception as e:
                 print(f"❌ Erro geral no processamento: {e}")
                 response = {"error": True, "message": f"Erro no servidor: {str(e)}"}
-                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                self._enviar_json(response)
                 return
             
             try:
-                print(f"📋 Dados do pedido: {pedido_data}")
-                
-                # Verificar estrutura da tabela PEDIDOS primeiro
-                check_table_query = """
-                SELECT COLUMN_NAME, DATA_TYPE 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = 'PEDIDOS'
-                ORDER BY ORDINAL_POSITION
-                """
-                
-                colunas = executar_query(check_table_query, [])
-                if colunas:
-                    print("🔍 Estrutura da tabela PEDIDOS:")
-                    coluna_aferiu_existe = False
-                    for col in colunas:
-                        print(f"   - {col['COLUMN_NAME']} ({col['DATA_TYPE']})")
-                        if col['COLUMN_NAME'] == 'AFERIU_TEMPERATURA':
-                            coluna_aferiu_existe = True
-                    
-                    # Verificar se coluna AFERIU_TEMPERATURA existe e tem tamanho adequado
-                    if not coluna_aferiu_existe:
-                        print("⚠️ Coluna AFERIU_TEMPERATURA não existe! Criando...")
-                        try:
-                            alter_query = "ALTER TABLE PEDIDOS ADD AFERIU_TEMPERATURA NVARCHAR(50) NULL"
-                            resultado_alter = executar_query(alter_query, [])
-                            print(f"✅ Coluna AFERIU_TEMPERATURA criada: {resultado_alter}")
-                        except Exception as e:
-                            print(f"❌ Erro ao criar coluna AFERIU_TEMPERATURA: {e}")
-                    else:
-                        print("✅ Coluna AFERIU_TEMPERATURA já existe")
-                        # Verificar tamanho da coluna
-                        try:
-                            size_query = """
-                            SELECT CHARACTER_MAXIMUM_LENGTH 
-                            FROM INFORMATION_SCHEMA.COLUMNS 
-                            WHERE TABLE_NAME = 'PEDIDOS' AND COLUMN_NAME = 'AFERIU_TEMPERATURA'
-                            """
-                            size_result = executar_query(size_query, [])
-                            if size_result and len(size_result) > 0:
-                                current_size = size_result[0]['CHARACTER_MAXIMUM_LENGTH']
-                                print(f"🔍 Tamanho atual da coluna AFERIU_TEMPERATURA: {current_size}")
-                                
-                                if current_size < 20:  # Precisa de pelo menos 20 para 'NAO_NECESSITA'
-                                    print(f"⚠️ Coluna muito pequena ({current_size}), aumentando para 50...")
-                                    alter_size_query = "ALTER TABLE PEDIDOS ALTER COLUMN AFERIU_TEMPERATURA NVARCHAR(50)"
-                                    resultado_size = executar_query(alter_size_query, [])
-                                    print(f"✅ Tamanho da coluna alterado: {resultado_size}")
-                                else:
-                                    print(f"✅ Tamanho da coluna adequado: {current_size}")
-                        except Exception as e:
-                            print(f"❌ Erro ao verificar/alterar tamanho da coluna: {e}")
+                # Write-behind: confirma após gravar no diário local; o INSERT acontece em segundo plano
+                salvar = salvar_pedido_write_behind if DIARIO_PEDIDOS is not None else salvar_pedido
+                chave = (self.headers.get('Idempotency-Key') or pedido_data.get('idempotency_key') or '').strip()
+                if chave:
+                    # Retry da fila offline/background sync: devolve o resultado original sem novo INSERT
+                    response, repetida = REGISTRO_IDEMPOTENCIA.executar(
+                        chave, impressao_pedido(pedido_data), lambda: salvar(pedido_data))
+                    if repetida:
+                        print(f"♻️ Idempotency-Key repetida ({chave[:40]}) - pedido {response.get('pedido_id')} já salvo")
+                        response = dict(response, repetido=True)
                 else:
-                    print("⚠️ Não foi possível obter estrutura da tabela")
-                
-                # Query COMPLETA com todos os campos disponíveis + APROVADO_POR + AFERIU_TEMPERATURA
-                # ✅ FECHAMENTO removido - será preenchido pela TRIGGER do SQL
-                query = """
-                INSERT INTO PEDIDOS (
-                    DATA_RETIRADA, DATA_ENVIO1, PROJETO, COORDENADOR, SUPERVISOR, 
-                    LIDER, NOME_LIDER, FAZENDA, TIPO_REFEICAO, CIDADE_PRESTACAO_DO_SERVICO,
-                    FORNECEDOR, VALOR_PAGO, COLABORADORES, TOTAL_COLABORADORES, A_CONTRATAR,
-                    RESPONSAVEL_PELO_CARTAO, PAGCORP, HOSPEDADO, NOME_DO_HOTEL, VALOR_DIARIA,
-                    TOTAL_PAGAR, APROVADO_POR, OBSERVACOES, AFERIU_TEMPERATURA
-                ) VALUES (%s, DATEADD(hour, -6, GETUTCDATE()), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                # Extrair TODOS os dados do pedido com MAPEAMENTO CORRETO
-                data_retirada = pedido_data.get('data_retirada')
-                projeto = pedido_data.get('projeto', '')
-                coordenador = pedido_data.get('coordenador', '')
-                supervisor = pedido_data.get('supervisor', '')
-                
-                # LIDER = EQUIPE digitada (ex: 700AA)
-                lider = pedido_data.get('equipe', '')  # Equipe digitada
-                
-                # NOME_LIDER = Nome do líder da equipe (do organograma)
-                nome_lider = pedido_data.get('nome_lider_organograma', pedido_data.get('solicitante', 'N/A'))
-                
-                # FAZENDA = APENAS o que o usuário digitou no campo
-                fazenda = pedido_data.get('fazenda_digitada', '').strip()
-                
-                tipo_refeicao = pedido_data.get('tipo_refeicao', 'N/A')
-                cidade = pedido_data.get('cidade_prestacao_servico', '')
-                fornecedor = pedido_data.get('fornecedor', 'N/A')
-                valor_pago = float(pedido_data.get('valor_pago', 0))
-                
-                # COLABORADORES = Limpar ícones, manter só texto
-                colaboradores_nomes = pedido_data.get('colaboradores_nomes_limpos', '')
-                
-                # Limpeza adicional de caracteres Unicode problemáticos
-                import re
-                if colaboradores_nomes:
-                    # Remover surrogates e caracteres problemáticos
-                    colaboradores_nomes = re.sub(r'[\uD800-\uDFFF]', '', colaboradores_nomes)
-                    # Remover emojis e símbolos
-                    colaboradores_nomes = re.sub(r'[^\x00-\x7F\u00C0-\u017F\u0020-\u007E]', '', colaboradores_nomes)
-                    # Limpar espaços extras
-                    colaboradores_nomes = re.sub(r'\s+', ' ', colaboradores_nomes).strip()
-                
-                total_colaboradores = int(pedido_data.get('total_colaboradores', 1))
-                a_contratar = int(pedido_data.get('a_contratar', 0))
-                responsavel_cartao = pedido_data.get('responsavel_cartao', '')
+                    response = salvar(pedido_data)
                 
-                # PAGCORP = Número digitado pelo usuário
-                pagcorp = pedido_data.get('pagcorp_numero', '')
-                
-                # HOSPEDAGEM = Dados corretos do formulário
-                hospedado = pedido_data.get('hospedado_real', 'NÃO')
-                nome_hotel = pedido_data.get('nome_hotel_real', '')
-                valor_diaria = float(pedido_data.get('valor_diaria_real', 0))
-                
-                # APROVADO_POR = Texto fixo
-                aprovado_por = 'ELAINE KLUG'
-                
-                # ✅ FECHAMENTO removido - será preenchido pela TRIGGER do SQL
-                
-                # 🎯 CAPTURAR AFERIU_TEMPERATURA DO FRONTEND
-                aferiu_temperatura_frontend = pedido_data.get('aferiu_temperatura', '')
-                
-                observacoes = pedido_data.get('observacoes', '')
-                
-                # Calcular total a pagar: APENAS VALOR_PAGO × TOTAL_COLABORADORES (SEM DIÁRIA)
-                total_pessoas = total_colaboradores  # Já inclui selecionados + a_contratar + outros
-                total_refeicao = valor_pago * total_pessoas
-                # NÃO INCLUIR valor da diária no total_pagar
-                total_pagar = total_refeicao
-                
-                print(f"💰 Cálculo CORRIGIDO:")
-                print(f"   Total colaboradores (já incluindo tudo): {total_colaboradores}")
-                print(f"   A contratar (não soma mais): {a_contratar}")
-                print(f"   Total pessoas: {total_pessoas}")
-                print(f"   Refeição: R$ {valor_pago} x {total_pessoas} pessoas = R$ {total_refeicao}")
-                print(f"   HOSPEDADO: {hospedado}")
-                print(f"   Hotel: R$ {valor_diaria} (NÃO incluído no total)")
-                print(f"   TOTAL FINAL: R$ {total_pagar} (apenas refeições)")
-                print(f"🔧 DADOS CORRIGIDOS:")
-                print(f"   LIDER (equipe): {lider}")
-                print(f"   NOME_LIDER (do organograma): {nome_lider}")
-                print(f"   FAZENDA: {fazenda}")
-                print(f"   PAGCORP: {pagcorp}")
-                print(f"   RESPONSÁVEL CARTÃO: {responsavel_cartao}")
-                print(f"   HOSPEDADO: {hospedado}")
-                print(f"   NOME HOTEL: {nome_hotel}")
-                print(f"   VALOR DIÁRIA: R$ {valor_diaria}")
-                # ✅ FECHAMENTO removido - será preenchido pela TRIGGER do SQL
-                
-                resultado = executar_query(query, [
-                    data_retirada, projeto, coordenador, supervisor, lider, nome_lider,
-                    fazenda, tipo_refeicao, cidade, fornecedor, valor_pago, 
-                    colaboradores_nomes, total_colaboradores, a_contratar,
-                    responsavel_cartao, pagcorp, hospedado, nome_hotel, valor_diaria,
-                    total_pagar, aprovado_por, observacoes, aferiu_temperatura_frontend
-                    # ✅ fechamento removido - será preenchido pela TRIGGER
-                ])
-                
-                if resultado is not None and isinstance(resultado, dict) and 'inserted_id' in resultado:
-                    # Sucesso - retornar o ID real do banco
-                    pedido_id_real = resultado['inserted_id']
-                    print(f"✅ Pedido salvo com ID real: {pedido_id_real}")
-                    
-                    # ✅ AFERIU_TEMPERATURA JÁ FOI INSERIDO DIRETAMENTE NA QUERY PRINCIPAL
-                    # ✅ AFERIU_TEMPERATURA JÁ FOI INSERIDO DIRETAMENTE NA QUERY PRINCIPAL
-                    
-                    response = {
-                        "error": False,
-                        "message": "Pedido salvo com sucesso!",
-                        "pedido_id": pedido_id_real,
-                        "tipo_refeicao": tipo_refeicao,
-                        "total_pagar": total_pagar,
-                        "aferiu_temperatura": aferiu_temperatura_frontend
-                    }
-                else:
-                    print(f"❌ Falha ao inserir - resultado: {resultado}")
-                    response = {
-                        "error": True,
-                        "message": "Erro ao salvar pedido no banco de dados",
-                        "debug": str(resultado)
-                    }
-                    
+            except ConflitoIdempotencia as e:
+                print(f"❌ {e}")
+                response = {"error": True, "message": str(e)}
+                self._enviar_json(response, status=422)
+                return
             except Exception as e:
                 print(f"❌ Erro detalhado: {e}")
                 response = {
@@ -1003,62 +1813,68 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     "message": f"Erro ao processar pedido: {str(e)}"
                 }
                 
+        elif path == '/api/salvar-pedidos':
+            # Lote de pedidos (ex: café, almoço e jantar da equipe) num único INSERT
+            try:
+                dados = json.loads(post_body.decode('utf-8'))
+                pedidos = dados.get('pedidos') if isinstance(dados, dict) else dados
+                if not isinstance(pedidos, list) or not pedidos:
+                    response = {"error": True, "message": "Envie uma lista de pedidos (ou {\"pedidos\": [...]})"}
+                elif len(pedidos) > LOTE_MAX_PEDIDOS:
+                    response = {"error": True, "message": f"Lote muito grande: máximo de {LOTE_MAX_PEDIDOS} pedidos"}
+                else:
+                    response = salvar_pedidos_lote(pedidos)
+            except json.JSONDecodeError as e:
+                response = {"error": True, "message": f"Erro no formato JSON: {str(e)}"}
+            except Exception as e:
+                print(f"❌ Erro ao processar lote de pedidos: {e}")
+                response = {"error": True, "message": f"Erro ao processar lote: {str(e)}"}
+
+        elif path == '/api/afericoes-temperatura':
+            # Lote de aferições (supervisor limpando vários MARMITEX pendentes de uma vez)
+            try:
+                dados = json.loads(post_body.decode('utf-8'))
+                afericoes = dados.get('afericoes') if isinstance(dados, dict) else dados
+                if not isinstance(afericoes, list) or not afericoes:
+                    response = {"error": True, "message": "Envie uma lista de aferições (ou {\"afericoes\": [...]})"}
+                elif len(afericoes) > LOTE_MAX_AFERICOES:
+                    response = {"error": True, "message": f"Lote muito grande: máximo de {LOTE_MAX_AFERICOES} aferições"}
+                else:
+                    response = registrar_afericoes_lote(afericoes)
+            except json.JSONDecodeError as e:
+                response = {"error": True, "message": f"Erro no formato JSON: {str(e)}"}
+            except Exception as e:
+                print(f"❌ Erro ao processar lote de aferições: {e}")
+                response = {"error": True, "message": f"Erro ao processar lote de aferições: {str(e)}"}
+
         elif path == '/upload-blob':
             # Endpoint para upload de imagens do problema para Azure Blob
+            # Body lido em streaming: a parte do arquivo vai direto para upload_bytes_blob (sem base64)
             print("📸 Recebendo upload de imagem para blob...")
             try:
-                # Ler o conteúdo como multipart/form-data manualmente
-                import tempfile
-                
-                # Usar body já lido
-                raw_data = post_body
-                
-                # Procurar pelo boundary no Content-Type
-                content_type = self.headers.get('Content-Type', '')
-                if 'boundary=' not in content_type:
+                boundary = extrair_boundary(self.headers.get('Content-Type', ''))
+                if not boundary:
                     response = {
                         "error": True,
                         "message": "Content-Type boundary não encontrado"
                     }
                 else:
-                    boundary = content_type.split('boundary=')[1].strip()
-                    boundary_bytes = ('--' + boundary).encode()
-                    
-                    # Dividir os dados pelo boundary
-                    parts = raw_data.split(boundary_bytes)
-                    
                     file_data = None
                     filename = None
-                    
-                    for part in parts:
-                        if b'Content-Disposition' in part and b'filename=' in part:
-                            # Extrair o nome do arquivo
-                            lines = part.split(b'\r\n')
-                            for line in lines:
-                                if b'filename=' in line:
-                                    # Extrair filename
-                                    filename_part = line.decode().split('filename=')[1]
-                                    filename = filename_part.strip('"').strip()
-                                    break
-                            
-                            # Encontrar onde começam os dados do arquivo (após \r\n\r\n)
-                            data_start = part.find(b'\r\n\r\n')
-                            if data_start != -1:
-                                file_data = part[data_start + 4:]  # +4 para pular \r\n\r\n
-                                # Remover possível trailing boundary
-                                if file_data.endswith(b'\r\n'):
-                                    file_data = file_data[:-2]
-                                break
-                    
+                    file_content_type = None
+
+                    for parte in ParserMultipart(body_stream, boundary):
+                        if parte.eh_arquivo and file_data is None and parte.filename:
+                            filename = parte.filename
+                            file_content_type = parte.content_type
+                            file_data = parte.ler_tudo()
+
                     if file_data and filename:
                         print(f"📤 Upload recebido: {filename} ({len(file_data)} bytes)")
-                        
-                        # Converter para base64 para usar a função existente
-                        import base64
-                        file_base64 = base64.b64encode(file_data).decode('utf-8')
-                        
-                        # Fazer upload para blob usando função existente
-                        blob_url = upload_imagem_blob(file_base64, filename)
+
+                        if not file_content_type.startswith('image/'):
+                            file_content_type = 'image/jpeg'
+                        blob_url = upload_bytes_blob(file_data, filename, file_content_type)
                         
                         if blob_url and not blob_url.startswith('local_'):
                             response = {
@@ -1087,172 +1903,59 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     "error": True,
                     "message": f"Erro no upload: {str(e)}"
                 }
+            finally:
+                # Body pode ter sobrado (erro no parse) - consumir antes de responder
+                body_stream.descartar()
                 
-        elif path == '/api/aferição-temperatura' or path == '/api/afericao-temperatura':
+        elif path in ROTAS_AFERICAO and body_stream is not None:
+            # Variante multipart: campos de texto + imagens binárias (sem base64 e sem JSON de megabytes)
+            try:
+                boundary = extrair_boundary(self.headers.get('Content-Type', ''))
+                campos, arquivos = ler_formulario(body_stream, boundary)
+                print(f"📏 Aferição multipart: {len(campos)} campo(s), "
+                      f"{sum(len(dados) for dados, _, _ in arquivos.values())} bytes de imagem")
+
+                afericao_data = {
+                    'pedido_id': int(campos['pedido_id']),
+                    'temperatura_retirada': campos.get('temperatura_retirada'),
+                    'temperatura_consumo': campos.get('temperatura_consumo'),
+                    'hora_retirada': campos.get('hora_retirada') or None,
+                    'hora_consumo': campos.get('hora_consumo') or None,
+                    'observacoes': campos.get('observacoes', ''),
+                }
+                img_retirada = arquivos.get('img_retirada', (None,))[0]
+                img_consumo = arquivos.get('img_consumo', (None,))[0]
+
+                response = registrar_afericao(afericao_data, img_retirada, img_consumo)
+
+            except MultipartInvalido as e:
+                print(f"❌ Multipart inválido na aferição: {e}")
+                response = {
+                    "error": True,
+                    "message": f"Erro no formato multipart da aferição: {str(e)}"
+                }
+            except (KeyError, ValueError) as e:
+                print(f"❌ Campo inválido na aferição multipart: {e}")
+                response = {
+                    "error": True,
+                    "message": f"Campo obrigatório ausente ou inválido: {str(e)}"
+                }
+            except Exception as e:
+                print(f"❌ Erro ao processar aferição: {e}")
+                response = {
+                    "error": True,
+                    "message": f"Erro ao processar aferição: {str(e)}"
+                }
+            finally:
+                body_stream.descartar()
+
+        elif path in ROTAS_AFERICAO:
             # Endpoint para aferição de temperatura com imagens (suporte a URLs com e sem acentos)
             try:
                 print(f"📏 Afericao body: {len(post_body)} bytes")
                 aferição_data = json.loads(post_body.decode('utf-8'))
                 
-                pedido_id = aferição_data['pedido_id']
-                temperatura_retirada = aferição_data['temperatura_retirada']
-                temperatura_consumo = aferição_data['temperatura_consumo']
-                hora_retirada = aferição_data.get('hora_retirada')
-                hora_consumo = aferição_data.get('hora_consumo')
-                img_retirada_base64 = aferição_data.get('img_retirada')
-                img_consumo_base64 = aferição_data.get('img_consumo')
-                observacoes = aferição_data.get('observacoes', '')
-                
-                print(f"️ Salvando temperaturas - Pedido: {pedido_id}, Retirada: {temperatura_retirada}°C, Consumo: {temperatura_consumo}°C")
-                
-                # Verificar/criar colunas de temperatura se necessário
-                check_columns_query = """
-                SELECT COLUMN_NAME 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = 'PEDIDOS' 
-                AND COLUMN_NAME IN ('TEMPERATURA_RETIRADA', 'TEMPERATURA_CONSUMO', 'OBSERVACOES_TEMP')
-                """
-                
-                colunas_existentes = executar_query(check_columns_query, [])
-                
-                if not colunas_existentes or len(colunas_existentes) < 3:
-                    alter_queries = [
-                        "ALTER TABLE PEDIDOS ADD TEMPERATURA_RETIRADA FLOAT NULL",
-                        "ALTER TABLE PEDIDOS ADD TEMPERATURA_CONSUMO FLOAT NULL", 
-                        "ALTER TABLE PEDIDOS ADD OBSERVACOES_TEMP NVARCHAR(500) NULL"
-                    ]
-                    
-                    for alter_query in alter_queries:
-                        try:
-                            executar_query(alter_query, [])
-                        except:
-                            pass  # Coluna já existe
-                
-                # Atualizar temperaturas no banco
-                query_temp = """
-                UPDATE PEDIDOS 
-                SET TEMPERATURA_RETIRADA = %s, 
-                    TEMPERATURA_CONSUMO = %s,
-                    HORA_RETIRADA = %s,
-                    HORA_CONSUMO = %s,
-                    OBSERVACOES_TEMP = %s
-                WHERE ID = %s
-                """
-                
-                # Processar horas
-                from datetime import datetime, date
-                hora_retirada_dt = None
-                hora_consumo_dt = None
-                
-                # Buscar data do pedido
-                query_data = "SELECT DATA_RETIRADA FROM PEDIDOS WHERE ID = %s"
-                resultado_data = executar_query(query_data, [pedido_id])
-                
-                if resultado_data and len(resultado_data) > 0:
-                    data_retirada_pedido = resultado_data[0]['DATA_RETIRADA']
-                    if hasattr(data_retirada_pedido, 'date'):
-                        data_retirada_pedido = data_retirada_pedido.date()
-                else:
-                    data_retirada_pedido = date.today()
-                
-                # Converter horas para datetime
-                if hora_retirada:
-                    try:
-                        hora_obj = datetime.strptime(hora_retirada, '%H:%M').time()
-                        hora_retirada_dt = datetime.combine(data_retirada_pedido, hora_obj)
-                    except:
-                        pass
-                
-                if hora_consumo:
-                    try:
-                        hora_obj = datetime.strptime(hora_consumo, '%H:%M').time()
-                        hora_consumo_dt = datetime.combine(data_retirada_pedido, hora_obj)
-                    except:
-                        pass
-                
-                resultado_temp = executar_query(query_temp, [
-                    temperatura_retirada,
-                    temperatura_consumo,
-                    hora_retirada_dt,
-                    hora_consumo_dt,
-                    observacoes,
-                    pedido_id
-                ])
-                
-                print(f"✅ Temperaturas salvas: {resultado_temp} linhas afetadas")
-                
-                # 🔥 ATUALIZAR CAMPO AFERIU_TEMPERATURA PARA "SIM"
-                query_status = "UPDATE PEDIDOS SET AFERIU_TEMPERATURA = 'SIM' WHERE ID = %s"
-                resultado_status = executar_query(query_status, [pedido_id])
-                print(f"✅ AFERIU_TEMPERATURA atualizado para 'SIM': {resultado_status} linhas afetadas")
-                
-                # Upload das imagens em background
-                import threading
-
-                def upload_async(pid, img_ret, img_con):
-                    url_ret = None
-                    url_con = None
-
-                    try:
-                        if img_ret:
-                            url_ret = upload_imagem_blob(img_ret, f"retirada_pedido_{pid}.jpg")
-                            print(f"📷 Upload retirada concluído: {url_ret[:80] if url_ret else 'FALHA'}...")
-
-                        if img_con:
-                            url_con = upload_imagem_blob(img_con, f"consumo_pedido_{pid}.jpg")
-                            print(f"📷 Upload consumo concluído: {url_con[:80] if url_con else 'FALHA'}...")
-
-                        # Atualizar URLs no banco - salvar cada uma independentemente
-                        updates = []
-                        params = []
-                        if url_ret and not url_ret.startswith('local_'):
-                            updates.append("IMG_RETIRADA = %s")
-                            params.append(url_ret)
-                        if url_con and not url_con.startswith('local_'):
-                            updates.append("IMG_CONSUMO = %s")
-                            params.append(url_con)
-
-                        if updates:
-                            params.append(pid)
-                            query_img = f"UPDATE PEDIDOS SET {', '.join(updates)} WHERE ID = %s"
-                            resultado_img = executar_query(query_img, params)
-                            print(f"✅ URLs das imagens salvas no banco para pedido {pid}: {resultado_img}")
-                        else:
-                            print(f"⚠️ Nenhuma URL válida para salvar no banco (pedido {pid})")
-
-                    except Exception as e:
-                        print(f"❌ Erro no upload assíncrono de imagens (pedido {pid}): {e}")
-
-                # Iniciar upload em thread separada - passar dados como argumentos
-                if img_retirada_base64 or img_consumo_base64:
-                    upload_thread = threading.Thread(
-                        target=upload_async,
-                        args=(pedido_id, img_retirada_base64, img_consumo_base64)
-                    )
-                    upload_thread.daemon = True
-                    upload_thread.start()
-                
-                # Resposta imediata
-                if resultado_temp is not None and resultado_temp > 0:
-                    response = {
-                        "error": False,
-                        "message": f"✅ Temperaturas salvas instantaneamente! Upload das imagens em andamento...",
-                        "pedido_id": pedido_id,
-                        "temperaturas": {
-                            "retirada": temperatura_retirada,
-                            "consumo": temperatura_consumo
-                        },
-                        "status_upload": "em_andamento",
-                        "urls_imagens": {
-                            "retirada": "upload_iniciado",
-                            "consumo": "upload_iniciado"
-                        }
-                    }
-                else:
-                    response = {
-                        "error": True,
-                        "message": f"❌ Erro ao salvar temperaturas no banco (ID {pedido_id})"
-                    }
+                response = registrar_afericao(aferição_data)
                     
             except json.JSONDecodeError as e:
                 print(f"❌ Erro JSON na aferição: {e}")
@@ -1261,6 +1964,12 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
                     "error": True,
                     "message": f"Erro no formato JSON da aferição: {str(e)}"
                 }
+            except (KeyError, ValueError) as e:
+                print(f"❌ Campo inválido na aferição: {e}")
+                response = {
+                    "error": True,
+                    "message": f"Campo obrigatório ausente ou inválido: {str(e)}"
+                }
             except Exception as e:
                 print(f"❌ Erro ao processar aferição: {e}")
                 response = {
@@ -1270,19 +1979,21 @@ class RefeicaoHandler(http.server.BaseHTTPRequestHandler):
         else:
             response = {"error": True, "message": "Endpoint POST não encontrado"}
         
-        self.wfile.write(json.dumps(response, ensure_ascii=False, default=decimal_default).encode('utf-8'))
+        self._enviar_json(response)
 
     def do_OPTIONS(self):
         # Responder ao preflight CORS
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Idempotency-Key')
         self.end_headers()
 
 def main():
     import os
+    import signal
     import sys
+    import threading
     
     # Railway fornece a porta via variável de ambiente PORT
     port = int(os.environ.get('PORT', 8082))
@@ -1304,6 +2015,10 @@ def main():
     print("=" * 60)
     sys.stdout.flush()  # Forçar output imediato para logs do Railway
     
+    # Carregar arquivos estáticos principais na memória (demais entram no primeiro acesso)
+    total_assets = CACHE_ASSETS.precarregar()
+    print(f"📦 {total_assets} arquivos estáticos carregados em memória")
+
     try:
         # Permitir reuso do endereço para evitar "Address already in use"
         socketserver.ThreadingTCPServer.allow_reuse_address = True
@@ -1311,10 +2026,38 @@ def main():
         with socketserver.ThreadingTCPServer(("", port), RefeicaoHandler) as httpd:
             print(f"✅ Servidor escutando na porta {port}")
             sys.stdout.flush()
+
+            # Railway envia SIGTERM no redeploy - parar de aceitar conexões e drenar os uploads
+            def encerrar_servidor(signum, frame):
+                print("\n🛑 SIGTERM recebido - encerrando servidor...")
+                threading.Thread(target=httpd.shutdown, daemon=True).start()
+            signal.signal(signal.SIGTERM, encerrar_servidor)
+
+            # Reenvio dos uploads que ficaram no spool (inclusive de execuções anteriores)
+            SPOOL_UPLOADS.iniciar(reenviar_upload_spool, gravar_url_imagem_pedido)
+            if DIARIO_PEDIDOS is not None:
+                DIARIO_PEDIDOS.iniciar(gravar_lote_diario)
+            AGREGADOS_FECHAMENTO.iniciar(executar_query)
+            PEDIDOS_RECENTES.iniciar(executar_query)
+
             try:
                 httpd.serve_forever()
             except KeyboardInterrupt:
                 print("\n🛑 Servidor parado.")
+            finally:
+                # Conexões SSE ficam abertas indefinidamente - liberar antes do server_close esperar as threads
+                BARRAMENTO_PENDENCIAS.encerrar()
+                print(f"⏳ Aguardando uploads pendentes: {POOL_UPLOADS.estatisticas()['fila']} na fila...")
+                if POOL_UPLOADS.encerrar(timeout=UPLOAD_TIMEOUT_ENCERRAMENTO):
+                    print("✅ Uploads pendentes concluídos")
+                else:
+                    print("⚠️ Tempo esgotado - alguns uploads não foram concluídos")
+                SPOOL_UPLOADS.encerrar()
+                if DIARIO_PEDIDOS is not None:
+                    DIARIO_PEDIDOS.encerrar()
+                AGREGADOS_FECHAMENTO.encerrar()
+                PEDIDOS_RECENTES.encerrar()
+                sys.stdout.flush()
     except Exception as e:
         print(f"❌ ERRO FATAL ao iniciar servidor: {e}")
         import traceback
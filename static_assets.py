@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Cache em memória dos arquivos estáticos (HTML, JS, JSON, CSS, ícones)
+
+- Bytes carregados uma vez (na inicialização ou no primeiro acesso) e recarregados se o mtime mudar
+- Binários (PNG etc.) não passam pela memória: enviados com sendfile, com suporte a Range/If-Range
+- Variantes gzip/brotli pré-comprimidas para arquivos de texto
+- ETag forte (hash do conteúdo) para respostas 304
+- Cache-Control longo para arquivos com fingerprint no nome (ex: app-modules.3f2a9c1b.js)
+"""
+import hashlib
+import json
+import os
+import re
+import stat
+import threading
+from email.utils import formatdate
+
+from compression import ENCODINGS_SUPORTADOS, comprimir, COMPRESSAO_MIN_BYTES
+
+# Diretório raiz servido (mesmo diretório do server.py)
+RAIZ_ESTATICOS = os.path.dirname(os.path.abspath(__file__))
+
+# Saída do build_assets.py (nomes com hash + sw.js com precache), servida antes dos fontes.
+# Só com STATIC_BUILD_DIR definido (Dockerfile/nixpacks): localmente um dist/ antigo esconderia
+# as edições em index.html, sw.js e js/. Caminho relativo = relativo à raiz do projeto.
+_STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', '').strip()
+RAIZ_BUILD = os.path.join(RAIZ_ESTATICOS, _STATIC_BUILD_DIR) if _STATIC_BUILD_DIR else None
+
+# Manifesto gerado pelo build (mapa de nomes com hash + preloads por página)
+MANIFESTO_BUILD = 'asset-manifest.json'
+
+# Arquivos carregados já na inicialização
+ASSETS_PRECARREGADOS = [
+    ('index.html', 'text/html'),
+    ('sistema-pedidos.html', 'text/html'),
+    ('js/app-modules.js', 'application/javascript'),
+    ('manifest.json', 'application/json'),
+    ('sw.js', 'application/javascript'),
+]
+
+# Nome com hash de conteúdo: nome.<8+ hex>.ext
+PADRAO_FINGERPRINT = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+CACHE_CONTROL_IMUTAVEL = 'public, max-age=31536000, immutable'
+# Sem fingerprint: o navegador pode guardar, mas precisa revalidar (barato com ETag/304)
+CACHE_CONTROL_REVALIDAR = 'no-cache'
+
+# Leitura em blocos para calcular o ETag de binários
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+TIPOS_TEXTO = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+               'application/manifest+json')
+
+
+def eh_tipo_texto(content_type):
+    return content_type.startswith(TIPOS_TEXTO)
+
+
+def tem_fingerprint(caminho):
+    return PADRAO_FINGERPRINT.search(caminho) is not None
+
+
+class AssetEstatico:
+    """Conteúdo de um arquivo estático de texto, em memória e pronto para envio"""
+
+    # Texto fica em memória; binários (AssetBinario) são enviados do disco via sendfile
+    em_memoria = True
+
+    def __init__(self, caminho, content_type, conteudo, mtime):
+        self.caminho = caminho
+        self.mtime = mtime
+        self.content_type = f'{content_type}; charset=utf-8' if eh_tipo_texto(content_type) else content_type
+        self.etag = '"' + hashlib.sha256(conteudo).hexdigest()[:32] + '"'
+        self.cache_control = CACHE_CONTROL_IMUTAVEL if tem_fingerprint(caminho) else CACHE_CONTROL_REVALIDAR
+
+        # Variantes por Content-Encoding (None = identity)
+        self.variantes = {None: conteudo}
+        if eh_tipo_texto(content_type) and len(conteudo) >= COMPRESSAO_MIN_BYTES:
+            for encoding in ENCODINGS_SUPORTADOS:
+                comprimido = comprimir(conteudo, encoding)
+                if len(comprimido) < len(conteudo):
+                    self.variantes[encoding] = comprimido
+
+    @property
+    def comprimivel(self):
+        return len(self.variantes) > 1
+
+    def corresponde_etag(self, if_none_match):
+        """Verifica o header If-None-Match (lista de ETags ou *)"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == self.etag:
+                return True
+        return False
+
+
+class AssetBinario(AssetEstatico):
+    """Arquivo binário (PNG etc.): só metadados em memória, conteúdo enviado do disco"""
+
+    em_memoria = False
+    comprimivel = False
+
+    def __init__(self, caminho, content_type, caminho_disco, info, mtime):
+        self.caminho = caminho
+        self.mtime = mtime
+        self.content_type = content_type
+        self.caminho_disco = caminho_disco
+        self.tamanho = info.st_size
+        self.ultima_modificacao = formatdate(info.st_mtime, usegmt=True)
+        self.cache_control = CACHE_CONTROL_IMUTAVEL if tem_fingerprint(caminho) else CACHE_CONTROL_REVALIDAR
+        self.variantes = None
+
+        # ETag pelo conteúdo, lendo em blocos (sem carregar o arquivo inteiro)
+        sha = hashlib.sha256()
+        with open(caminho_disco, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+                sha.update(bloco)
+        self.etag = '"' + sha.hexdigest()[:32] + '"'
+
+    def range_valido_para(self, if_range):
+        """If-Range: o Range só vale se o validador ainda corresponder ao arquivo atual"""
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == self.etag  # comparação forte
+        return if_range == self.ultima_modificacao
+
+
+class RangeInvalido(Exception):
+    """Range fora do arquivo (responder 416)"""
+
+
+def interpretar_range(header_range, tamanho):
+    """Interpreta o header Range (um único intervalo em bytes)
+
+    Retorna (inicio, fim) inclusivos, ou None para ignorar o Range e enviar o arquivo inteiro
+    (formato desconhecido ou múltiplos intervalos). Levanta RangeInvalido se não satisfazível.
+    """
+    if not header_range:
+        return None
+    unidade, _, intervalos = header_range.strip().partition('=')
+    if unidade.strip().lower() != 'bytes' or ',' in intervalos:
+        return None
+
+    inicio_txt, separador, fim_txt = intervalos.strip().partition('-')
+    if not separador:
+        return None
+    if tamanho == 0:
+        # Arquivo vazio não tem nenhum byte para atender (evita "bytes 0--1/0")
+        raise RangeInvalido(header_range)
+    try:
+        if inicio_txt == '':
+            # Sufixo: últimos N bytes
+            sufixo = int(fim_txt)
+            if sufixo <= 0:
+                raise RangeInvalido(header_range)
+            return max(0, tamanho - sufixo), tamanho - 1
+        inicio = int(inicio_txt)
+        fim = int(fim_txt) if fim_txt else tamanho - 1
+    except ValueError:
+        return None
+
+    if inicio >= tamanho:
+        raise RangeInvalido(header_range)
+    if inicio < 0 or fim < inicio:
+        return None
+    return inicio, min(fim, tamanho - 1)
+
+
+class CacheAssets:
+    """Cache thread-safe de AssetEstatico/AssetBinario, indexado pelo caminho relativo"""
+
+    def __init__(self, raizes=(RAIZ_BUILD, RAIZ_ESTATICOS)):
+        # Raízes consultadas em ordem (build primeiro, se configurado, depois os fontes)
+        self.raizes = [os.path.realpath(raiz) for raiz in raizes if raiz]
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._manifesto = (None, {})  # (asset do manifesto, preloads já formatados)
+
+    def resolver_caminho(self, caminho):
+        """Localiza o arquivo nas raízes, recusando caminhos que saiam delas
+
+        Retorna (caminho absoluto, os.stat) ou (None, None) se não existir.
+        """
+        caminho = caminho.lstrip('/')
+        for raiz in self.raizes:
+            absoluto = os.path.realpath(os.path.join(raiz, caminho))
+            if absoluto != raiz and not absoluto.startswith(raiz + os.sep):
+                return None, None
+            try:
+                info = os.stat(absoluto)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if stat.S_ISREG(info.st_mode):
+                return absoluto, info
+        return None, None
+
+    def obter(self, caminho, content_type):
+        """Retorna o asset (recarregando se o arquivo mudou) ou None se não existir"""
+        absoluto, info = self.resolver_caminho(caminho)
+        if absoluto is None:
+            with self._lock:
+                self._assets.pop(caminho, None)
+            return None
+        # Inclui o caminho absoluto: se o arquivo passar a vir de outra raiz (novo build), recarrega
+        mtime = (absoluto, info.st_mtime_ns)
+
+        asset = self._assets.get(caminho)
+        if asset is not None and asset.mtime == mtime:
+            return asset
+
+        if eh_tipo_texto(content_type):
+            with open(absoluto, 'rb') as arquivo:
+                conteudo = arquivo.read()
+            asset = AssetEstatico(caminho, content_type, conteudo, mtime)
+        else:
+            asset = AssetBinario(caminho, content_type, absoluto, info, mtime)
+        with self._lock:
+            self._assets[caminho] = asset
+        return asset
+
+    def link_preload(self, caminho):
+        """Header Link com os preloads da página (CSS/JS extraídos pelo build) ou None"""
+        manifesto = self.obter(MANIFESTO_BUILD, 'application/json')
+        if manifesto is None:
+            return None
+
+        asset_anterior, links = self._manifesto
+        if manifesto is not asset_anterior:
+            try:
+                preloads = json.loads(manifesto.variantes[None]).get('preloads', {})
+            except ValueError:
+                preloads = {}
+            links = {
+                pagina: ', '.join(f'<{url}>; rel=preload; as={tipo}' for url, tipo in itens)
+                for pagina, itens in preloads.items() if itens
+            }
+            self._manifesto = (manifesto, links)
+        return links.get(caminho.lstrip('/'))
+
+    def precarregar(self, assets=ASSETS_PRECARREGADOS):
+        """Carrega os assets principais na memória (chamado na inicialização)"""
+        carregados = 0
+        for caminho, content_type in assets:
+            try:
+                if self.obter(caminho, content_type) is not None:
+                    carregados += 1
+            except OSError as e:
+                print(f"⚠️ Não foi possível pré-carregar {caminho}: {e}")
+        return carregados
+
+
+# Instância global usada pelo servidor
+CACHE_ASSETS = CacheAssets()
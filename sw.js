@@ -4,13 +4,54 @@ console.log('🚀 Service Worker carregado');
 // 🎯 CACHE PARA PERSISTÊNCIA DE LOGIN iOS PWA
 let loginDataCache = null;
 
-const CACHE_NAME = 'refeicoes-pwa-v4'; // 🔥 v4.0.0 - ATUALIZAÇÃO OBRIGATÓRIA (FECHAMENTO corrigido)
-const urlsToCache = [
-    '/sistema-pedidos.html',
-    '/js/app-modules.js', // 🎯 NOVO ARQUIVO
-    '/api/teste-conexao',
-    '/manifest.json'
+// 📦 PRECACHE - gerado por build_assets.py (dist/sw.js); a versão do repositório usa revisão null
+// Arquivos com hash no nome não precisam de revisão (a URL já muda quando o conteúdo muda)
+/* PRECACHE:INICIO */
+const CACHE_NAME = 'refeicoes-pwa-v4';
+const PRECACHE_MANIFEST = [
+    { url: '/sistema-pedidos.html', revision: null },
+    { url: '/js/app-modules.js', revision: null },
+    { url: '/api/teste-conexao', revision: null },
+    { url: '/manifest.json', revision: null }
 ];
+/* PRECACHE:FIM */
+
+// Chave no cache: URL + revisão (mesma URL com conteúdo novo vira outra chave)
+function chavePrecache(entrada) {
+    return entrada.revision ? `${entrada.url}?__rev=${entrada.revision}` : entrada.url;
+}
+
+const MAPA_PRECACHE = new Map(PRECACHE_MANIFEST.map(entrada => [entrada.url, chavePrecache(entrada)]));
+
+// Baixa apenas o que mudou: entradas já presentes em caches antigos são copiadas sem rede
+async function precacheArquivos() {
+    const cache = await caches.open(CACHE_NAME);
+    const cachesAntigos = (await caches.keys()).filter(nome => nome !== CACHE_NAME);
+    let baixados = 0;
+
+    for (const entrada of PRECACHE_MANIFEST) {
+        const chave = chavePrecache(entrada);
+        if (await cache.match(chave)) continue;
+
+        let resposta = null;
+        if (entrada.revision || /\.[0-9a-f]{8,}\.[A-Za-z0-9]+$/.test(entrada.url)) {
+            for (const nome of cachesAntigos) {
+                resposta = await (await caches.open(nome)).match(chave);
+                if (resposta) break;
+            }
+        }
+        if (!resposta) {
+            resposta = await fetch(entrada.url, { cache: 'no-cache' });
+            if (!resposta.ok) {
+                console.log('⚠️ Precache falhou para', entrada.url, resposta.status);
+                continue;
+            }
+            baixados++;
+        }
+        await cache.put(chave, resposta);
+    }
+    console.log(`💾 Precache pronto: ${baixados} de ${PRECACHE_MANIFEST.length} arquivos baixados`);
+}
 
 // Detectar se é iOS (sem usar navigator/window no SW)
 const isIOS = false; // Simplificado para Service Worker
@@ -80,11 +121,7 @@ self.addEventListener('activate', event => {
 self.addEventListener('install', event => {
     console.log('📦 Service Worker instalando...');
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => {
-                console.log('💾 Cache criado');
-                return cache.addAll(urlsToCache);
-            })
+        precacheArquivos()
             .catch(err => console.log('❌ Erro no cache:', err))
     );
     
@@ -118,8 +155,12 @@ self.addEventListener('activate', event => {
 
 // Interceptar requests
 self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    const chave = event.request.method === 'GET' && url.origin === self.location.origin
+        ? MAPA_PRECACHE.get(url.pathname) : undefined;
+
     event.respondWith(
-        caches.match(event.request)
+        caches.match(chave || event.request)
             .then(response => {
                 // Cache hit - retorna response do cache
                 if (response) {
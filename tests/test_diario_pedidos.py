@@ -0,0 +1,110 @@
+import pytest
+
+import diario_pedidos
+from diario_pedidos import STATUS_FALHOU, STATUS_GRAVADO, STATUS_PENDENTE, BancoIndisponivel, DiarioPedidos
+
+
+@pytest.fixture
+def diario(tmp_path):
+    return DiarioPedidos(str(tmp_path / 'diario.sqlite3'), intervalo=0, lote=20)
+
+
+def vencer(diario):
+    """Ignora o backoff: todos os pendentes entram na próxima varredura"""
+    diario._conn.execute("UPDATE pedidos SET proxima_tentativa = 0")
+
+
+class GravarLoteFalso:
+    """gravar_lote de server.py: um comando por chamada; 'recusar' derruba o lote inteiro"""
+
+    def __init__(self, recusar=(), indisponivel=False):
+        self.recusar = set(recusar)
+        self.indisponivel = indisponivel
+        self.chamadas = []
+        self.proximo_id = 100
+
+    def __call__(self, pedidos):
+        self.chamadas.append([p['n'] for p in pedidos])
+        if self.indisponivel:
+            raise BancoIndisponivel("timeout")
+        if any(p['n'] in self.recusar for p in pedidos):
+            return [{"error": True, "message": "Erro ao salvar lote no banco de dados"}] * len(pedidos)
+        resultados = []
+        for _ in pedidos:
+            self.proximo_id += 1
+            resultados.append({"error": False, "pedido_id": self.proximo_id})
+        return resultados
+
+
+def test_lote_gravado_com_id_provisorio_como_chave(diario):
+    provisorios = [diario.registrar({'n': n}) for n in range(3)]
+    recebidos = []
+
+    def gravar_lote(pedidos):
+        recebidos.extend(pedidos)
+        return [{"error": False, "pedido_id": 100 + i} for i in range(len(pedidos))]
+
+    assert diario.gravar_pendentes(gravar_lote) == 3
+    assert [p['idempotency_key'] for p in recebidos] == provisorios
+    status = diario.obter(provisorios[1])
+    assert (status['status'], status['pedido_id']) == (STATUS_GRAVADO, 101)
+
+
+def test_linha_recusada_nao_segura_as_outras(diario, monkeypatch):
+    monkeypatch.setattr(diario_pedidos, 'DIARIO_MAX_TENTATIVAS', 3)
+    provisorios = [diario.registrar({'n': n}) for n in range(4)]
+    gravar_lote = GravarLoteFalso(recusar={2})
+
+    assert diario.gravar_pendentes(gravar_lote) == 3
+    assert gravar_lote.chamadas == [[0, 1, 2, 3], [0], [1], [2], [3]]
+    assert diario.obter(provisorios[2])['status'] == STATUS_PENDENTE
+
+    for _ in range(2):
+        vencer(diario)
+        diario.gravar_pendentes(gravar_lote)
+    assert diario.obter(provisorios[2])['status'] == STATUS_FALHOU
+    assert diario.estatisticas()['falharam'] == 1
+    assert diario.estatisticas()['pendentes'] == 0
+
+
+def test_banco_indisponivel_adia_o_lote_inteiro(diario, monkeypatch):
+    monkeypatch.setattr(diario_pedidos, 'DIARIO_MAX_TENTATIVAS', 3)
+    provisorios = [diario.registrar({'n': n}) for n in range(4)]
+    gravar_lote = GravarLoteFalso(indisponivel=True)
+
+    for _ in range(5):
+        vencer(diario)
+        assert diario.gravar_pendentes(gravar_lote) == 0
+    # Uma chamada por varredura, sem refazer item a item; queda do banco não leva a 'falhou'
+    assert gravar_lote.chamadas == [[0, 1, 2, 3]] * 5
+    status = diario.obter(provisorios[0])
+    assert (status['status'], status['tentativas']) == (STATUS_PENDENTE, 5)
+
+    gravar_lote.indisponivel = False
+    vencer(diario)
+    assert diario.gravar_pendentes(gravar_lote) == 4
+
+
+def test_banco_cai_durante_item_a_item(diario):
+    provisorios = [diario.registrar({'n': n}) for n in range(4)]
+    gravar_lote = GravarLoteFalso(recusar={0})
+
+    def gravar_e_cair(pedidos):
+        if len(pedidos) == 1 and pedidos[0]['n'] == 2:
+            gravar_lote.indisponivel = True
+        return gravar_lote(pedidos)
+
+    assert diario.gravar_pendentes(gravar_e_cair) == 1
+    # Depois da queda o item 3 não é tentado
+    assert gravar_lote.chamadas == [[0, 1, 2, 3], [0], [1], [2]]
+    assert [diario.obter(p)['status'] for p in provisorios] == [
+        STATUS_PENDENTE, STATUS_GRAVADO, STATUS_PENDENTE, STATUS_PENDENTE]
+
+
+def test_backoff_segura_pendentes(diario):
+    diario.intervalo = 60
+    diario.registrar({'n': 0})
+    diario.gravar_pendentes(GravarLoteFalso(recusar={0}))
+    gravar_lote = GravarLoteFalso()
+    assert diario.gravar_pendentes(gravar_lote) == 0
+    assert gravar_lote.chamadas == []
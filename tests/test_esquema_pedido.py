@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+import pytest
+
+from bench_esquema_pedido import PEDIDO_EXEMPLO, montar_pedido_antigo
+from esquema_pedido import APROVADO_POR, ESQUEMA_PEDIDO
+
+
+def parametros_por_coluna(pedido):
+    parametros, resumo = ESQUEMA_PEDIDO.montar(pedido)
+    return dict(zip(ESQUEMA_PEDIDO.colunas, parametros)), resumo
+
+
+@pytest.mark.parametrize('pedido', [
+    PEDIDO_EXEMPLO,
+    {'data_retirada': '2026-10-19'},
+    dict(PEDIDO_EXEMPLO, nome_lider_organograma=None),
+    {k: v for k, v in PEDIDO_EXEMPLO.items() if k != 'nome_lider_organograma'},
+])
+def test_mesmos_parametros_da_montagem_antiga(pedido):
+    with contextlib.redirect_stdout(io.StringIO()):
+        antigos, resumo_antigo = montar_pedido_antigo(pedido)
+    assert ESQUEMA_PEDIDO.montar(pedido) == (tuple(antigos), resumo_antigo)
+
+
+def test_conversoes_e_calculados():
+    colunas, resumo = parametros_por_coluna(PEDIDO_EXEMPLO)
+
+    assert colunas['VALOR_PAGO'] == 23.5
+    assert colunas['TOTAL_COLABORADORES'] == 12
+    assert colunas['TOTAL_PAGAR'] == 23.5 * 12          # diária do hotel não entra
+    assert colunas['FAZENDA'] == 'FAZENDA SANTA RITA'
+    assert colunas['COLABORADORES'] == 'JOÃO DA SILVA, MARIA SOUZA , JOSÉ PEREIRA'
+    assert colunas['APROVADO_POR'] == APROVADO_POR
+    assert resumo == {'tipo_refeicao': 'MARMITEX', 'total_pagar': 282.0, 'aferiu_temperatura': 'NAO'}
+
+
+def test_padroes_e_alternativas():
+    colunas, _ = parametros_por_coluna({'data_retirada': '2026-10-19', 'solicitante': 'FULANO'})
+
+    assert colunas['NOME_LIDER'] == 'FULANO'
+    assert colunas['TIPO_REFEICAO'] == 'N/A'
+    assert colunas['HOSPEDADO'] == 'NÃO'
+    assert colunas['TOTAL_COLABORADORES'] == 1
+    assert colunas['TOTAL_PAGAR'] == 0
+    # Constante não pode ser sobrescrita pelo JSON
+    colunas, _ = parametros_por_coluna({'data_retirada': '2026-10-19', 'APROVADO_POR': 'OUTRO'})
+    assert colunas['APROVADO_POR'] == APROVADO_POR
+
+
+@pytest.mark.parametrize('pedido, mensagem', [
+    ({}, 'data_retirada é obrigatória'),
+    ({'data_retirada': ''}, 'data_retirada é obrigatória'),
+    ({'data_retirada': '2026-10-19', 'valor_pago': 'dez'}, 'valor_pago inválido'),
+    ({'data_retirada': '2026-10-19', 'total_colaboradores': None}, 'total_colaboradores inválido'),
+    (['não', 'é', 'objeto'], 'objeto JSON'),
+])
+def test_pedido_invalido(pedido, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        ESQUEMA_PEDIDO.montar(pedido)
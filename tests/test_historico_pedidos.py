@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs
+
+import pytest
+
+from historico_pedidos import (
+    CAMPOS_PADRAO, HISTORICO_LIMITE_MAX, ConsultaHistoricoInvalida, codificar_cursor,
+    decodificar_cursor, montar_consulta_historico, paginar,
+)
+
+
+def consulta(url):
+    return montar_consulta_historico(parse_qs(url))
+
+
+def test_cursor_ida_e_volta():
+    token = codificar_cursor(datetime(2026, 10, 19, 7, 30), 1234)
+    assert '=' not in token
+    assert decodificar_cursor(token) == (datetime(2026, 10, 19, 7, 30), 1234)
+    # DATA_RETIRADA como date também serve
+    assert decodificar_cursor(codificar_cursor(date(2026, 10, 19), 5)) == (datetime(2026, 10, 19), 5)
+
+
+@pytest.mark.parametrize('token', [
+    'zzz',                       # base64 que não decodifica como UTF-8
+    'e30',                       # {}
+    'W10',                       # []
+    'bnVsbA',                    # null
+    'WyJvbnRlbSIsMV0',           # ["ontem",1]
+    'WyIyMDI2LTEwLTE5IiwieCJd',  # ["2026-10-19","x"]
+    '!!!',
+])
+def test_cursor_invalido_tem_mensagem_fixa(token):
+    with pytest.raises(ConsultaHistoricoInvalida) as erro:
+        decodificar_cursor(token)
+    assert str(erro.value) == 'cursor inválido'
+
+
+def test_consulta_com_filtros_e_cursor():
+    token = codificar_cursor(datetime(2026, 10, 1), 99)
+    query, params, campos, limite = consulta(
+        f'equipe=700AA&data_inicio=2026-09-01&data_fim=2026-09-30&limite=20&cursor={token}'
+        '&campos=total_pagar,id')
+
+    assert campos == ('DATA_RETIRADA', 'ID', 'TOTAL_PAGAR')
+    assert limite == 20
+    assert 'TOP (21)' in query
+    assert params == ['700AA', date(2026, 9, 1), date(2026, 10, 1),
+                      datetime(2026, 10, 1), datetime(2026, 10, 1), 99]
+
+
+def test_consulta_padrao():
+    query, params, campos, limite = consulta('equipe=SEM_EQUIPE&limite=100000')
+    assert campos == CAMPOS_PADRAO
+    assert limite == HISTORICO_LIMITE_MAX
+    assert params == []
+
+
+@pytest.mark.parametrize('url', [
+    'campos=id,senha', 'limite=dez', 'data_inicio=19/10/2026', 'cursor=zzz',
+])
+def test_consulta_invalida(url):
+    with pytest.raises(ConsultaHistoricoInvalida):
+        consulta(url)
+
+
+def test_paginas_cobrem_tudo_sem_repetir():
+    # Vários pedidos por data: a ordem (DATA_RETIRADA DESC, ID DESC) desempata pelo ID
+    linhas = [{'DATA_RETIRADA': datetime(2026, 10, 1) + timedelta(days=i // 3), 'ID': 100 + i}
+              for i in range(20)]
+    ordenadas = sorted(linhas, key=lambda l: (l['DATA_RETIRADA'], l['ID']), reverse=True)
+
+    vistos, cursor = [], None
+    while True:
+        restantes = ordenadas
+        if cursor:
+            data_cursor, id_cursor = decodificar_cursor(cursor)
+            # Mesma condição que montar_consulta_historico põe no WHERE
+            restantes = [l for l in ordenadas if l['DATA_RETIRADA'] < data_cursor
+                         or (l['DATA_RETIRADA'] == data_cursor and l['ID'] < id_cursor)]
+        pagina, cursor = paginar(restantes[:7 + 1], 7)
+        vistos.extend(pagina)
+        if cursor is None:
+            break
+
+    assert vistos == ordenadas
+
+
+def test_paginar_ultima_pagina_e_erro():
+    assert paginar([{'DATA_RETIRADA': datetime(2026, 1, 1), 'ID': 1}], 5)[1] is None
+    assert paginar(None, 5) == (None, None)
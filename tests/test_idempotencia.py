@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from idempotencia import ConflitoIdempotencia, RegistroIdempotencia, impressao_pedido
+
+PEDIDO = {'data_retirada': '2026-10-19', 'tipo_refeicao': 'MARMITEX', 'valor_pago': 23.5}
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    return str(tmp_path / 'idempotencia.jsonl')
+
+
+def test_impressao_ignora_a_chave_e_a_ordem():
+    assert impressao_pedido(dict(PEDIDO, idempotency_key='a')) == impressao_pedido(
+        dict(reversed(list(PEDIDO.items())), idempotency_key='b'))
+    assert impressao_pedido(PEDIDO) != impressao_pedido(dict(PEDIDO, valor_pago=30))
+
+
+def test_repeticao_devolve_a_mesma_resposta(arquivo):
+    registro = RegistroIdempotencia(arquivo)
+    impressao = impressao_pedido(PEDIDO)
+    chamadas = []
+
+    def salvar():
+        chamadas.append(1)
+        return {"error": False, "pedido_id": 7}
+
+    assert registro.executar('chave-1', impressao, salvar) == ({"error": False, "pedido_id": 7}, False)
+    assert registro.executar('chave-1', impressao, salvar) == ({"error": False, "pedido_id": 7}, True)
+    assert len(chamadas) == 1
+    # Recarregado do arquivo depois de um reinício
+    assert RegistroIdempotencia(arquivo).obter('chave-1', impressao) == {"error": False, "pedido_id": 7}
+
+
+def test_erro_nao_fica_registrado(arquivo):
+    registro = RegistroIdempotencia(arquivo)
+    impressao = impressao_pedido(PEDIDO)
+    registro.executar('chave-1', impressao, lambda: {"error": True, "message": "banco fora"})
+    resposta, repetida = registro.executar('chave-1', impressao, lambda: {"error": False, "pedido_id": 8})
+    assert (resposta['pedido_id'], repetida) == (8, False)
+
+
+def test_conflito_com_pedido_diferente(arquivo):
+    registro = RegistroIdempotencia(arquivo)
+    registro.executar('chave-1', impressao_pedido(PEDIDO), lambda: {"error": False, "pedido_id": 7})
+    outra = impressao_pedido(dict(PEDIDO, valor_pago=99))
+
+    with pytest.raises(ConflitoIdempotencia):
+        registro.executar('chave-1', outra, lambda: {"error": False, "pedido_id": 8})
+    with pytest.raises(ConflitoIdempotencia):
+        registro.obter('chave-1', outra)
+    # Também vale para o que veio do arquivo
+    with pytest.raises(ConflitoIdempotencia):
+        RegistroIdempotencia(arquivo).obter('chave-1', outra)
+
+
+def test_conflito_durante_execucao_em_andamento(arquivo):
+    registro = RegistroIdempotencia(arquivo)
+    liberar, iniciou = threading.Event(), threading.Event()
+
+    def lenta():
+        iniciou.set()
+        liberar.wait(5)
+        return {"error": False, "pedido_id": 7}
+
+    resultado = {}
+    dona = threading.Thread(target=lambda: resultado.update(r=registro.executar('k', 'a', lenta)))
+    dona.start()
+    iniciou.wait(5)
+    try:
+        with pytest.raises(ConflitoIdempotencia):
+            registro.executar('k', 'b', lenta)
+        # Mesma impressão em paralelo espera a primeira e recebe o mesmo resultado
+        esperando = {}
+        paralela = threading.Thread(target=lambda: esperando.update(r=registro.executar('k', 'a', lenta)))
+        paralela.start()
+    finally:
+        liberar.set()
+    dona.join(5)
+    paralela.join(5)
+
+    assert resultado['r'] == ({"error": False, "pedido_id": 7}, False)
+    assert esperando['r'] == ({"error": False, "pedido_id": 7}, True)
+
+
+def test_registro_expirado_libera_a_chave(arquivo):
+    registro = RegistroIdempotencia(arquivo, ttl=-1)
+    registro.registrar('k', 'a', {"error": False, "pedido_id": 1})
+    assert registro.obter('k', 'b') is None
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+
+from multipart_stream import MultipartInvalido, ParserMultipart, extrair_boundary, ler_formulario
+
+BOUNDARY = '----form7MA4YWxk'
+# Conteúdo binário com um começo de delimitador que não chega a ser o boundary
+FOTO = b'\xff\xd8\xff\xe0' + b'\r\n--' + BOUNDARY[:-1].encode() + b'x' + bytes(range(256)) * 4
+
+
+def montar_body(partes, preambulo=b''):
+    body = bytearray(preambulo)
+    for nome, valor, filename in partes:
+        disposicao = f'form-data; name="{nome}"'
+        if filename is not None:
+            disposicao += f'; filename="{filename}"\r\nContent-Type: image/jpeg'
+        body += f'--{BOUNDARY}\r\nContent-Disposition: {disposicao}\r\n\r\n'.encode()
+        body += valor + b'\r\n'
+    body += f'--{BOUNDARY}--\r\n'.encode()
+    return bytes(body)
+
+
+@pytest.mark.parametrize('tamanho_bloco', [1, 3, 7, 64, 64 * 1024])
+def test_partes_com_qualquer_tamanho_de_bloco(tamanho_bloco):
+    body = montar_body([('pedido_id', b'42', None), ('foto', FOTO, 'termometro.jpg')],
+                       preambulo=b'preambulo ignorado\r\n')
+    partes = []
+    for parte in ParserMultipart(io.BytesIO(body), BOUNDARY, tamanho_bloco):
+        partes.append((parte.nome, parte.filename, parte.content_type, bytes(parte.ler_tudo())))
+
+    assert partes == [
+        ('pedido_id', None, 'application/octet-stream', b'42'),
+        ('foto', 'termometro.jpg', 'image/jpeg', FOTO),
+    ]
+
+
+def test_parte_nao_consumida_e_descartada():
+    body = montar_body([('foto', FOTO, 'a.jpg'), ('obs', 'sem leitura'.encode(), None), ('fim', b'ok', None)])
+    nomes = []
+    for parte in ParserMultipart(io.BytesIO(body), BOUNDARY, 5):
+        nomes.append(parte.nome)
+        if parte.nome == 'fim':
+            assert parte.ler_tudo() == b'ok'
+    assert nomes == ['foto', 'obs', 'fim']
+
+
+def test_ler_formulario():
+    body = montar_body([
+        ('temperatura_retirada', '65,5'.encode(), None),
+        ('temperatura_retirada', b'99', None),          # repetido: vale o primeiro
+        ('observacoes', 'Marmitex ok ção'.encode(), None),
+        ('imagem_retirada', FOTO, 'r.jpg'),
+        ('imagem_consumo', b'', 'vazia.jpg'),           # arquivo vazio não entra
+    ])
+    campos, arquivos = ler_formulario(io.BytesIO(body), BOUNDARY)
+
+    assert campos == {'temperatura_retirada': '65,5', 'observacoes': 'Marmitex ok ção'}
+    assert list(arquivos) == ['imagem_retirada']
+    dados, filename, content_type = arquivos['imagem_retirada']
+    assert (bytes(dados), filename, content_type) == (FOTO, 'r.jpg', 'image/jpeg')
+
+
+def test_limite_do_arquivo():
+    body = montar_body([('foto', FOTO, 'a.jpg')])
+    with pytest.raises(MultipartInvalido):
+        ler_formulario(io.BytesIO(body), BOUNDARY, limite_arquivo=100)
+
+
+@pytest.mark.parametrize('body', [
+    b'sem boundary nenhum',
+    f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="x"\r\n\r\nvalor sem fim'.encode(),
+    f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="x"'.encode(),
+])
+def test_body_malformado(body):
+    with pytest.raises(MultipartInvalido):
+        ler_formulario(io.BytesIO(body), BOUNDARY)
+
+
+@pytest.mark.parametrize('content_type, esperado', [
+    (f'multipart/form-data; boundary={BOUNDARY}', BOUNDARY),
+    (f'Multipart/Form-Data; charset=utf-8; boundary="{BOUNDARY}"', BOUNDARY),
+    ('multipart/form-data', None),
+    ('multipart/form-data; boundary=', None),
+    (f'application/json; boundary={BOUNDARY}', None),
+    (None, None),
+])
+def test_extrair_boundary(content_type, esperado):
+    assert extrair_boundary(content_type) == esperado
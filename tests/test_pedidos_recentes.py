@@ -0,0 +1,97 @@
+from datetime import date, datetime
+
+from pedidos_recentes import IndicePedidosRecentes, chave_equipe, precisa_afericao
+
+HOJE = date(2026, 10, 19)
+
+
+def linha(pedido_id, dia, lider='700AA', tipo='MARMITEX', aferiu='NAO', fechamento='S1'):
+    return {'ID': pedido_id, 'DATA_RETIRADA': datetime(2026, 10, dia), 'DATA_ENVIO1': datetime(2026, 10, dia, 6),
+            'LIDER': lider, 'TIPO_REFEICAO': tipo, 'AFERIU_TEMPERATURA': aferiu, 'FECHAMENTO': fechamento}
+
+
+def carregado(linhas):
+    indice = IndicePedidosRecentes(dias=10)
+    assert indice.reconciliar(lambda query, params: [dict(l) for l in linhas], hoje=HOJE)
+    return indice
+
+
+def ids(pedidos):
+    return [p['ID'] for p in pedidos]
+
+
+def test_precisa_afericao_como_o_sql():
+    assert precisa_afericao('MARMITEX', None)
+    assert precisa_afericao('Marmita P', '')
+    assert precisa_afericao('MARMITEX', 'nao ')
+    assert precisa_afericao('MARMITEX', 'Nao')
+    assert not precisa_afericao('MARMITEX', 'SIM')
+    assert not precisa_afericao('MARMITEX', 'NAO_NECESSITA')
+    assert not precisa_afericao('CAFÉ DA MANHÃ', 'NAO')
+
+
+def test_chave_equipe():
+    assert chave_equipe(' 700aa  ') == ' 700AA'
+    assert chave_equipe(None) == ''
+
+
+def test_pendentes_e_do_dia():
+    indice = carregado([
+        linha(1, 15), linha(2, 17), linha(3, 17, tipo='ALMOÇO'), linha(4, 18, aferiu='sim'),
+        linha(5, 18, lider='800BB'), linha(6, 2),   # 6: fora da janela de 10 dias
+    ])
+
+    assert ids(indice.pendentes('700aa ', datetime(2026, 10, 12))) == [2, 1]
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 16))) == [2]
+    assert ids(indice.do_dia('700AA', date(2026, 10, 17))) == [3, 2]
+    assert indice.do_dia('700AA', date(2026, 10, 16)) == []
+    assert indice.cobre(date(2026, 10, 9)) and not indice.cobre(date(2026, 10, 8))
+
+
+def test_registrar_e_marcar_aferido():
+    indice = carregado([linha(1, 15)])
+    indice.registrar(10, {'DATA_RETIRADA': '2026-10-18', 'LIDER': '700AA', 'TIPO_REFEICAO': 'MARMITEX',
+                          'AFERIU_TEMPERATURA': 'NAO'})
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 12))) == [10, 1]
+    # FECHAMENTO ainda não veio da TRIGGER: o dia vai para o banco
+    assert indice.do_dia('700AA', date(2026, 10, 18)) is None
+
+    indice.marcar_aferido(1)
+    indice.marcar_aferido(999)   # fora do índice: ignorado
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 12))) == [10]
+
+
+def test_reconciliar_reaplica_operacoes_feitas_durante_a_carga():
+    indice = carregado([linha(1, 15), linha(2, 16)])
+
+    def consultar(query, params):
+        # Enquanto o SELECT roda: um pedido novo é gravado e o 1 é aferido
+        indice.registrar(20, {'DATA_RETIRADA': '2026-10-19', 'LIDER': '700AA', 'TIPO_REFEICAO': 'MARMITEX'})
+        indice.marcar_aferido(1)
+        # O SELECT já tinha lido o 1 sem a aferição e não vê o 20
+        return [linha(1, 15), linha(2, 16)]
+
+    assert indice.reconciliar(consultar, hoje=HOJE)
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 12))) == [20, 2]
+    assert indice.ultima_divergencia == 0
+
+
+def test_reconciliar_conta_divergencias_do_banco():
+    indice = carregado([linha(1, 15), linha(2, 16), linha(3, 17)])
+    indice.registrar(30, {'DATA_RETIRADA': '2026-10-18', 'LIDER': '700AA', 'TIPO_REFEICAO': 'MARMITEX'})
+
+    # 1 aferido direto no SQL, 3 excluído, 4 inserido por fora; 30 (nosso) já está no banco
+    assert indice.reconciliar(lambda q, p: [linha(1, 15, aferiu='SIM'), linha(2, 16), linha(4, 17),
+                                            linha(30, 18)], hoje=HOJE)
+    assert indice.ultima_divergencia == 3
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 12))) == [30, 4, 2]
+    assert indice.do_dia('700AA', date(2026, 10, 18)) is not None
+
+
+def test_consulta_com_falha_mantem_o_indice():
+    indice = carregado([linha(1, 15)])
+    assert indice.reconciliar(lambda q, p: None, hoje=HOJE) is False
+    assert ids(indice.pendentes('700AA', datetime(2026, 10, 12))) == [1]
+    # Operações feitas durante a tentativa que falhou não ficam pendentes de replay
+    indice.marcar_aferido(1)
+    assert indice.pendentes('700AA', datetime(2026, 10, 12)) == []
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from static_assets import AssetBinario, RangeInvalido, interpretar_range
+
+
+@pytest.mark.parametrize('header, esperado', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=990-5000', (990, 999)),       # fim além do arquivo é cortado
+    ('bytes=-5000', (0, 999)),            # sufixo maior que o arquivo = arquivo inteiro
+    ('BYTES = 0-0', (0, 0)),
+])
+def test_interpretar_range_validos(header, esperado):
+    assert interpretar_range(header, 1000) == esperado
+
+
+@pytest.mark.parametrize('header', [
+    None, '', 'items=0-10', 'bytes=0-10,20-30', 'bytes=abc', 'bytes=a-b', 'bytes=50-10',
+])
+def test_interpretar_range_ignorados(header):
+    # Formato desconhecido, múltiplos intervalos ou malformado: envia o arquivo inteiro
+    assert interpretar_range(header, 1000) is None
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=5000-6000', 'bytes=-0'])
+def test_interpretar_range_nao_satisfazivel(header):
+    with pytest.raises(RangeInvalido):
+        interpretar_range(header, 1000)
+
+
+@pytest.mark.parametrize('header', ['bytes=0-', 'bytes=0-0', 'bytes=-1', 'bytes=-500'])
+def test_interpretar_range_arquivo_vazio(header):
+    with pytest.raises(RangeInvalido):
+        interpretar_range(header, 0)
+
+
+def test_range_valido_para(tmp_path):
+    caminho = tmp_path / 'icone.png'
+    caminho.write_bytes(b'\x89PNG' + b'\x00' * 100)
+    info = os.stat(caminho)
+    asset = AssetBinario('icone.png', 'image/png', str(caminho), info, (str(caminho), info.st_mtime_ns))
+
+    assert asset.range_valido_para(None)
+    assert asset.range_valido_para(asset.etag)
+    assert asset.range_valido_para(f'  {asset.etag} ')
+    assert asset.range_valido_para(asset.ultima_modificacao)
+    assert not asset.range_valido_para('"outro-etag"')
+    assert not asset.range_valido_para('W/' + asset.etag)   # If-Range exige comparação forte
+    assert not asset.range_valido_para('Mon, 01 Jan 2001 00:00:00 GMT')
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Deduplicação de uploads por conteúdo
+
+Os blobs passam a ser nomeados pelo SHA-256 dos bytes (img_<hash>.jpg): a mesma foto enviada
+de novo (retry da fila offline do PWA, reenvio pelo usuário) gera o mesmo nome. Um índice local
+hash -> URL evita qualquer tráfego de rede para conteúdo já conhecido; para hashes fora do
+índice o upload é condicional (If-None-Match: *) e um 409 conta como conteúdo já enviado. O HEAD
+antes do upload (que um SAS só de escrita nunca responde com 200) fica para quando o índice se
+perdeu: com UPLOAD_VERIFICAR_HEAD=auto, só nos primeiros UPLOAD_JANELA_HEAD segundos depois de
+uma inicialização sem o arquivo (redeploy sem volume, quando a fila offline reenvia fotos antigas).
+
+O índice fica em memória (LRU limitado) e num arquivo append-only recarregado na inicialização.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_INDICE_ARQUIVO = os.getenv('UPLOAD_INDICE_ARQUIVO', os.path.join(RAIZ_PROJETO, 'indice_uploads.jsonl'))
+UPLOAD_INDICE_MAX = int(os.getenv('UPLOAD_INDICE_MAX', 50000))
+# HEAD antes do upload: auto (só logo depois de perder o índice), 1 (sempre) ou 0 (nunca)
+UPLOAD_VERIFICAR_HEAD = os.getenv('UPLOAD_VERIFICAR_HEAD', 'auto').lower()
+UPLOAD_JANELA_HEAD = float(os.getenv('UPLOAD_JANELA_HEAD', 600))
+# Tamanho do hash no nome do blob (hex) - 32 caracteres = 128 bits
+TAMANHO_HASH_NOME = 32
+
+
+def hash_conteudo(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+def nome_blob_por_conteudo(hash_hex, nome_arquivo):
+    """Nome do blob derivado do conteúdo, mantendo a extensão do arquivo original"""
+    extensao = os.path.splitext(nome_arquivo)[1].lower() or '.jpg'
+    return f'img_{hash_hex[:TAMANHO_HASH_NOME]}{extensao}'
+
+
+class IndiceConteudo:
+    """Índice hash -> URL (thread-safe), persistido em JSON Lines"""
+
+    def __init__(self, arquivo=UPLOAD_INDICE_ARQUIVO, maximo=UPLOAD_INDICE_MAX):
+        self.arquivo = arquivo
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._linhas_arquivo = 0
+        self.acertos = 0
+        self.consultas = 0
+        # Sem arquivo para recarregar (1ª execução ou disco efêmero): o índice pode não conhecer blobs existentes
+        self.perdido = True
+        self._iniciado_em = time.monotonic()
+        self._carregar()
+
+    @property
+    def verificar_com_head(self):
+        """HEAD no blob antes do upload só vale a ida extra quando o índice não é confiável"""
+        if UPLOAD_VERIFICAR_HEAD in ('1', 'true', 'sim'):
+            return True
+        if UPLOAD_VERIFICAR_HEAD != 'auto':
+            return False
+        return self.perdido and time.monotonic() - self._iniciado_em < UPLOAD_JANELA_HEAD
+
+    def _carregar(self):
+        if not self.arquivo or not os.path.exists(self.arquivo):
+            return
+        self.perdido = False
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    self._linhas_arquivo += 1
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        continue  # Linha incompleta (processo morto no meio da escrita)
+                    self._entradas[registro['hash']] = registro['url']
+                    self._entradas.move_to_end(registro['hash'])
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+            print(f"🔑 Índice de uploads carregado: {len(self._entradas)} hash(es)")
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar índice de uploads: {e}")
+
+    def obter(self, hash_hex):
+        """URL já enviada para este conteúdo (ou None)"""
+        with self._lock:
+            self.consultas += 1
+            url = self._entradas.get(hash_hex)
+            if url is not None:
+                self.acertos += 1
+                self._entradas.move_to_end(hash_hex)
+            return url
+
+    def registrar(self, hash_hex, url):
+        with self._lock:
+            if self._entradas.get(hash_hex) == url:
+                return
+            self._entradas[hash_hex] = url
+            self._entradas.move_to_end(hash_hex)
+            if len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+            self._persistir(hash_hex, url)
+
+    def _persistir(self, hash_hex, url):
+        """Acrescenta ao arquivo; reescreve só as entradas vivas quando ele cresce demais"""
+        if not self.arquivo:
+            return
+        try:
+            if self._linhas_arquivo >= 2 * self.maximo:
+                temporario = self.arquivo + '.tmp'
+                with open(temporario, 'w', encoding='utf-8') as arquivo:
+                    for chave, valor in self._entradas.items():
+                        arquivo.write(json.dumps({"hash": chave, "url": valor}) + '\n')
+                os.replace(temporario, self.arquivo)
+                self._linhas_arquivo = len(self._entradas)
+                return
+            os.makedirs(os.path.dirname(self.arquivo) or '.', exist_ok=True)
+            with open(self.arquivo, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps({"hash": hash_hex, "url": url}) + '\n')
+            self._linhas_arquivo += 1
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar índice de uploads: {e}")
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "hashes": len(self._entradas),
+                "consultas": self.consultas,
+                "acertos": self.acertos,
+                "indice_perdido": self.perdido,
+            }
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Pool de trabalhadores para uploads em segundo plano
+
+Substitui a thread criada por requisição: número fixo de trabalhadores, fila limitada,
+métricas (fila, em andamento, latências) e drenagem da fila no desligamento do servidor.
+Com a fila cheia, a tarefa roda na própria thread da requisição (backpressure em vez de perda).
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+UPLOAD_TRABALHADORES = int(os.getenv('UPLOAD_TRABALHADORES', 2))
+UPLOAD_FILA_MAX = int(os.getenv('UPLOAD_FILA_MAX', 50))
+# Quanto tempo esperar por espaço na fila antes de executar na thread da requisição
+UPLOAD_ESPERA_FILA = float(os.getenv('UPLOAD_ESPERA_FILA', 2))
+# Tempo máximo para drenar a fila no desligamento (Railway mata o processo ~30s após o SIGTERM)
+UPLOAD_TIMEOUT_ENCERRAMENTO = float(os.getenv('UPLOAD_TIMEOUT_ENCERRAMENTO', 25))
+HISTORICO_LATENCIAS = 200
+
+_FIM = object()
+
+
+def _percentil(valores, fracao):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+class PoolUploads:
+    """Executor com fila limitada e trabalhadores fixos"""
+
+    def __init__(self, trabalhadores=UPLOAD_TRABALHADORES, tamanho_fila=UPLOAD_FILA_MAX, nome='upload'):
+        self.nome = nome
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._lock = threading.Lock()
+        self._aceitando = True
+        self._em_andamento = 0
+        self.concluidas = 0
+        self.falhas = 0
+        self.executadas_na_requisicao = 0
+        self._espera_ms = deque(maxlen=HISTORICO_LATENCIAS)
+        self._execucao_ms = deque(maxlen=HISTORICO_LATENCIAS)
+
+        self._threads = []
+        for indice in range(max(1, trabalhadores)):
+            thread = threading.Thread(target=self._trabalhar, name=f'{nome}-{indice}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submeter(self, funcao, *args, descricao=''):
+        """Enfileira a tarefa; se a fila continuar cheia, executa aqui mesmo (backpressure)
+
+        Retorna True se enfileirou, False se executou na thread chamadora.
+        """
+        tarefa = (funcao, args, descricao or getattr(funcao, '__name__', 'tarefa'), time.monotonic())
+        if self._aceitando:
+            try:
+                self._fila.put(tarefa, timeout=UPLOAD_ESPERA_FILA)
+                return True
+            except queue.Full:
+                print(f"⚠️ Fila de {self.nome} cheia ({self._fila.maxsize}) - executando {tarefa[2]} na requisição")
+        else:
+            print(f"⚠️ Pool de {self.nome} encerrando - executando {tarefa[2]} na requisição")
+
+        with self._lock:
+            self.executadas_na_requisicao += 1
+        self._executar(tarefa)
+        return False
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self._fila.get()
+            try:
+                if tarefa is _FIM:
+                    return
+                self._executar(tarefa)
+            finally:
+                self._fila.task_done()
+
+    def _executar(self, tarefa):
+        funcao, args, descricao, enfileirada_em = tarefa
+        inicio = time.monotonic()
+        with self._lock:
+            self._em_andamento += 1
+            self._espera_ms.append((inicio - enfileirada_em) * 1000)
+        sucesso = False
+        try:
+            funcao(*args)
+            sucesso = True
+        except Exception as e:
+            print(f"❌ Erro na tarefa {descricao} ({self.nome}): {e}")
+        finally:
+            duracao = (time.monotonic() - inicio) * 1000
+            with self._lock:
+                self._em_andamento -= 1
+                self._execucao_ms.append(duracao)
+                if sucesso:
+                    self.concluidas += 1
+                else:
+                    self.falhas += 1
+
+    def estatisticas(self):
+        with self._lock:
+            espera = list(self._espera_ms)
+            execucao = list(self._execucao_ms)
+            return {
+                "fila": self._fila.qsize(),
+                "fila_max": self._fila.maxsize,
+                "em_andamento": self._em_andamento,
+                "trabalhadores": len(self._threads),
+                "concluidas": self.concluidas,
+                "falhas": self.falhas,
+                "executadas_na_requisicao": self.executadas_na_requisicao,
+                "espera_ms_p50": _percentil(espera, 0.5),
+                "espera_ms_p95": _percentil(espera, 0.95),
+                "execucao_ms_p50": _percentil(execucao, 0.5),
+                "execucao_ms_p95": _percentil(execucao, 0.95),
+            }
+
+    def encerrar(self, timeout=30):
+        """Para de aceitar tarefas e espera a fila esvaziar (até `timeout` segundos)
+
+        Retorna True se tudo foi processado a tempo.
+        """
+        self._aceitando = False
+        limite = time.monotonic() + timeout
+        while self._fila.unfinished_tasks and time.monotonic() < limite:
+            time.sleep(0.1)
+        drenou = self._fila.unfinished_tasks == 0
+
+        for _ in self._threads:
+            try:
+                self._fila.put_nowait(_FIM)
+            except queue.Full:
+                break
+        return drenou
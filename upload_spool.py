@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Spool em disco para uploads de imagem que falharam
+
+Quando o upload para o Blob falha (timeout, erro, imagem grande), os bytes são gravados em
+UPLOAD_SPOOL_DIR junto com um arquivo de metadados (.json) - o "diário" do que falta enviar.
+Um trabalhador em segundo plano reenvia as entradas com backoff exponencial, inclusive as que
+sobraram de uma execução anterior do servidor, e só apaga a entrada depois que a URL foi
+gravada no pedido.
+
+Entradas que falham SPOOL_MAX_TENTATIVAS vezes, ou ainda falham depois de SPOOL_IDADE_MAX,
+vão para o subdiretório descartados/ (ex: credenciais do Blob erradas) e deixam de ser tentadas;
+a contagem aparece nas estatísticas. Reprocessar = mover os arquivos de volta para UPLOAD_SPOOL_DIR.
+
+Layout:
+    <id>.bin   bytes da imagem
+    <id>.json  metadados (nome do blob, pedido, coluna, tentativas, próxima tentativa...)
+    descartados/<id>.bin, descartados/<id>.json
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+# No Railway, apontar para um volume persistente para sobreviver a redeploys
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', os.path.join(RAIZ_PROJETO, 'spool_uploads'))
+SPOOL_INTERVALO = float(os.getenv('SPOOL_INTERVALO', 15))           # segundos entre varreduras
+SPOOL_BACKOFF_BASE = float(os.getenv('SPOOL_BACKOFF_BASE', 30))     # segundos
+SPOOL_BACKOFF_MAX = float(os.getenv('SPOOL_BACKOFF_MAX', 3600))
+# Limites de uma entrada antes de ir para descartados/ (com o backoff acima, 20 tentativas ~ 14h)
+SPOOL_MAX_TENTATIVAS = int(os.getenv('SPOOL_MAX_TENTATIVAS', 20))
+SPOOL_IDADE_MAX = float(os.getenv('SPOOL_IDADE_MAX', 3 * 24 * 3600))   # segundos
+SUBDIRETORIO_DESCARTADOS = 'descartados'
+
+
+def calcular_proxima_tentativa(tentativas, agora=None):
+    """Backoff exponencial por entrada: base * 2^(tentativas-1), limitado a SPOOL_BACKOFF_MAX"""
+    agora = time.time() if agora is None else agora
+    espera = min(SPOOL_BACKOFF_MAX, SPOOL_BACKOFF_BASE * (2 ** max(0, tentativas - 1)))
+    return agora + espera
+
+
+def _gravar_atomico(caminho, conteudo):
+    """Grava em arquivo temporário e renomeia (nunca deixa um arquivo pela metade)"""
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+
+
+class SpoolUploads:
+    """Fila persistente de uploads pendentes + trabalhador de reenvio
+
+    enviar(dados, nome_blob, content_type) -> URL pública (levanta exceção em caso de falha)
+    aplicar(pedido_id, coluna, url) -> True se a URL foi gravada no banco
+    """
+
+    def __init__(self, diretorio=UPLOAD_SPOOL_DIR, intervalo=SPOOL_INTERVALO,
+                 max_tentativas=SPOOL_MAX_TENTATIVAS, idade_max=SPOOL_IDADE_MAX):
+        self.diretorio = diretorio
+        self.diretorio_descartados = os.path.join(diretorio, SUBDIRETORIO_DESCARTADOS)
+        self.intervalo = intervalo
+        self.max_tentativas = max_tentativas
+        self.idade_max = idade_max
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self.reenviados = 0
+        self.falhas_reenvio = 0
+
+    def _caminhos(self, id_entrada):
+        base = os.path.join(self.diretorio, id_entrada)
+        return base + '.bin', base + '.json'
+
+    def guardar(self, dados, nome_blob, content_type, pedido_id=None, coluna=None, motivo=''):
+        """Grava a imagem e os metadados no spool; retorna o id da entrada (ou None se falhar)"""
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            id_entrada = uuid.uuid4().hex
+            caminho_dados, caminho_meta = self._caminhos(id_entrada)
+            metadados = {
+                "id": id_entrada,
+                "nome_blob": nome_blob,
+                "content_type": content_type,
+                "pedido_id": pedido_id,
+                "coluna": coluna,
+                "bytes": len(dados),
+                "criado_em": time.time(),
+                "tentativas": 0,
+                "proxima_tentativa": calcular_proxima_tentativa(1),
+                "ultimo_erro": motivo,
+                "url": None,
+            }
+            # Dados primeiro: metadados só existem se a imagem já está inteira no disco
+            _gravar_atomico(caminho_dados, bytes(dados))
+            _gravar_atomico(caminho_meta, json.dumps(metadados).encode('utf-8'))
+            print(f"💾 Upload {nome_blob} guardado no spool ({len(dados)/1024:.1f}KB) - reenvio em segundo plano")
+            return id_entrada
+        except Exception as e:
+            print(f"❌ Erro ao gravar upload no spool: {e}")
+            return None
+
+    def _ler_metadados(self, caminho_meta):
+        try:
+            with open(caminho_meta, 'rb') as arquivo:
+                return json.loads(arquivo.read().decode('utf-8'))
+        except Exception as e:
+            print(f"⚠️ Metadados inválidos no spool ({os.path.basename(caminho_meta)}): {e}")
+            return None
+
+    def pendentes(self):
+        """Lista os metadados de todas as entradas do spool (mais antigas primeiro)"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith('.json'):
+                metadados = self._ler_metadados(os.path.join(self.diretorio, nome))
+                if metadados:
+                    entradas.append(metadados)
+        entradas.sort(key=lambda m: m['criado_em'])
+        return entradas
+
+    def _remover(self, id_entrada):
+        for caminho in self._caminhos(id_entrada):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def _descartar(self, id_entrada):
+        """Move a entrada para descartados/ (metadados por último, como em guardar)"""
+        os.makedirs(self.diretorio_descartados, exist_ok=True)
+        for caminho in self._caminhos(id_entrada):
+            try:
+                os.replace(caminho, os.path.join(self.diretorio_descartados, os.path.basename(caminho)))
+            except FileNotFoundError:
+                pass
+
+    def descartados(self):
+        if not os.path.isdir(self.diretorio_descartados):
+            return 0
+        return sum(1 for nome in os.listdir(self.diretorio_descartados) if nome.endswith('.json'))
+
+    def processar_entrada(self, metadados, enviar, aplicar):
+        """Tenta concluir uma entrada; True se ela saiu do spool"""
+        id_entrada = metadados['id']
+        caminho_dados, caminho_meta = self._caminhos(id_entrada)
+        try:
+            # Blob já enviado numa tentativa anterior - falta só gravar no banco
+            if not metadados.get('url'):
+                with open(caminho_dados, 'rb') as arquivo:
+                    dados = arquivo.read()
+                metadados['url'] = enviar(dados, metadados['nome_blob'], metadados['content_type'])
+
+            if metadados.get('pedido_id') is not None and metadados.get('coluna'):
+                if not aplicar(metadados['pedido_id'], metadados['coluna'], metadados['url']):
+                    raise RuntimeError("falha ao gravar URL no pedido")
+
+            self._remover(id_entrada)
+            with self._lock:
+                self.reenviados += 1
+            print(f"✅ Spool: {metadados['nome_blob']} enviado na tentativa {metadados['tentativas'] + 1}")
+            return True
+        except FileNotFoundError:
+            print(f"⚠️ Spool: dados de {metadados['nome_blob']} não encontrados - descartando entrada")
+            self._remover(id_entrada)
+            return True
+        except Exception as e:
+            metadados['tentativas'] += 1
+            metadados['ultimo_erro'] = str(e)[:300]
+            metadados['proxima_tentativa'] = calcular_proxima_tentativa(metadados['tentativas'] + 1)
+            _gravar_atomico(caminho_meta, json.dumps(metadados).encode('utf-8'))
+            with self._lock:
+                self.falhas_reenvio += 1
+            if (metadados['tentativas'] >= self.max_tentativas
+                    or time.time() - metadados['criado_em'] >= self.idade_max):
+                self._descartar(id_entrada)
+                print(f"🗑️ Spool: {metadados['nome_blob']} desistido após {metadados['tentativas']} tentativa(s)"
+                      f" ({e}) - movido para {SUBDIRETORIO_DESCARTADOS}/")
+                return False
+            espera = metadados['proxima_tentativa'] - time.time()
+            print(f"⏳ Spool: falha ao reenviar {metadados['nome_blob']} ({e}) - nova tentativa em {espera:.0f}s")
+            return False
+
+    def processar_vencidas(self, enviar, aplicar):
+        """Processa as entradas cuja próxima tentativa já venceu; retorna quantas foram concluídas"""
+        agora = time.time()
+        concluidas = 0
+        for metadados in self.pendentes():
+            if self._parar.is_set():
+                break
+            if metadados['proxima_tentativa'] <= agora:
+                concluidas += self.processar_entrada(metadados, enviar, aplicar)
+        return concluidas
+
+    def iniciar(self, enviar, aplicar):
+        """Inicia o trabalhador de reenvio (entradas de execuções anteriores entram já na 1ª varredura)"""
+        if self._thread is not None:
+            return
+        pendentes = len(self.pendentes())
+        if pendentes:
+            print(f"💾 Spool: {pendentes} upload(s) pendente(s) de execuções anteriores")
+
+        def trabalhar():
+            while not self._parar.is_set():
+                try:
+                    self.processar_vencidas(enviar, aplicar)
+                except Exception as e:
+                    print(f"❌ Erro no trabalhador do spool: {e}")
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+
+        self._thread = threading.Thread(target=trabalhar, name='spool-uploads', daemon=True)
+        self._thread.start()
+
+    def acordar(self):
+        """Antecipa a próxima varredura (ex: depois de reconfigurar o Blob)"""
+        self._acordar.set()
+
+    def encerrar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def estatisticas(self):
+        entradas = self.pendentes()
+        return {
+            "diretorio": self.diretorio,
+            "pendentes": len(entradas),
+            "bytes_pendentes": sum(m.get('bytes', 0) for m in entradas),
+            "mais_antigo": min((m['criado_em'] for m in entradas), default=None),
+            "reenviados": self.reenviados,
+            "falhas_reenvio": self.falhas_reenvio,
+            "descartados": self.descartados(),
+        }